@@ -0,0 +1,127 @@
+# async_database.py
+# Moteurs asynchrones (asyncpg / aiosqlite) : importés par l'API uniquement,
+# le cron n'utilise que les moteurs synchrones de database.py
+import asyncio
+import os
+import time
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from config import Config
+from database import _engines, engine_options
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Pilotes asynchrones par backend (routers de lecture de l'API)
+ASYNC_DRIVERS = {
+    'postgresql': 'postgresql+asyncpg',
+    'sqlite': 'sqlite+aiosqlite',
+}
+
+
+def async_database_url(url: str):
+    """URL asynchrone (asyncpg / aiosqlite) dérivée de DATABASE_URL"""
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"Pas de pilote asynchrone pour {backend}")
+
+    url = url.set(drivername=ASYNC_DRIVERS[backend])
+    # asyncpg n'accepte pas le paramètre libpq sslmode
+    if 'sslmode' in url.query:
+        sslmode = url.query['sslmode']
+        url = url.difference_update_query(['sslmode']).update_query_dict({'ssl': sslmode})
+    return url
+
+
+# Moteur asynchrone des routers de lecture : les requêtes ne bloquent plus la boucle d'événements
+_async_url = async_database_url(os.getenv("DATABASE_URL"))
+async_engine = create_async_engine(_async_url, **engine_options('api', _async_url, 'api_async', is_async=True))
+_engines['api_async'] = async_engine.sync_engine
+
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+# Réplique en lecture seule des agrégats (statistiques, marché, opportunités)
+replica_engine = None
+ReplicaSessionLocal = None
+if Config.DATABASE_REPLICA_URL:
+    _replica_url = async_database_url(Config.DATABASE_REPLICA_URL)
+    replica_engine = create_async_engine(
+        _replica_url, **engine_options('api', _replica_url, 'replica_async', is_async=True, read_only=True)
+    )
+    _engines['replica_async'] = replica_engine.sync_engine
+    ReplicaSessionLocal = async_sessionmaker(replica_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+# Retard de la réplique en secondes (0 hors réplication ou WAL entièrement rejoué)
+REPLICA_LAG_SQL = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+_replica_state = {'checked_at': None, 'usable': None, 'lag_s': None, 'error': None}
+
+
+async def get_async_db():
+    """Générateur de session asynchrone pour FastAPI"""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+async def _check_replica() -> None:
+    try:
+        async with replica_engine.connect() as connection:
+            lag = float((await connection.execute(REPLICA_LAG_SQL)).scalar())
+    except Exception as e:
+        if _replica_state['error'] is None:
+            logger.warning(f"Réplique indisponible, lectures sur le primaire: {e}")
+        _replica_state.update(usable=False, lag_s=None, error=str(e))
+        return
+
+    usable = lag <= Config.REPLICA_MAX_LAG
+    if usable != _replica_state['usable']:
+        if usable:
+            logger.info(f"Réplique utilisée pour les lectures (retard {lag:.1f}s)")
+        else:
+            logger.warning(f"Retard de la réplique {lag:.1f}s > {Config.REPLICA_MAX_LAG}s, lectures sur le primaire")
+    _replica_state.update(usable=usable, lag_s=lag, error=None)
+
+
+async def replica_usable() -> bool:
+    """True si la réplique répond avec un retard acceptable (vérifié au plus toutes les REPLICA_CHECK_INTERVAL s)"""
+    if replica_engine is None:
+        return False
+
+    checked_at = _replica_state['checked_at']
+    if checked_at is None or time.monotonic() - checked_at >= Config.REPLICA_CHECK_INTERVAL:
+        # Les requêtes concurrentes gardent l'état précédent pendant la vérification
+        _replica_state['checked_at'] = time.monotonic()
+        try:
+            await asyncio.wait_for(_check_replica(), Config.REPLICA_CHECK_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning("Réplique sans réponse, lectures sur le primaire")
+            _replica_state.update(usable=False, lag_s=None, error='timeout')
+
+    return bool(_replica_state['usable'])
+
+
+def replica_status() -> dict:
+    """État de la réplique pour /health"""
+    if replica_engine is None:
+        return {'configured': False}
+    return {
+        'configured': True,
+        'usable': bool(_replica_state['usable']),
+        'lag_s': _replica_state['lag_s'],
+        'error': _replica_state['error'],
+    }
+
+
+async def get_read_db():
+    """Session de lecture : réplique si disponible et à jour, sinon primaire"""
+    session_factory = ReplicaSessionLocal if await replica_usable() else AsyncSessionLocal
+    async with session_factory() as db:
+        yield db
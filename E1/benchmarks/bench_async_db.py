@@ -0,0 +1,169 @@
+"""Benchmark : débit des lectures rapides pendant des agrégats lents
+
+Usage : DATABASE_URL=postgresql://... python benchmarks/bench_async_db.py [--seconds 10] [--slow 4] [--fast 8]
+
+Pour chaque mode, une petite API tourne dans un sous-processus uvicorn sur la
+base de DATABASE_URL (PostgreSQL, transactions déjà chargées). Des threads
+enchaînent un agrégat lent (pg_sleep puis statistiques d'un département)
+pendant que d'autres enchaînent une page de GET /transactions.
+
+- sync  : Session synchrone dans un endpoint async (comportement initial)
+- async : AsyncSession (asyncpg), comme les routers de lecture
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+
+import requests
+
+ROOT = Path(__file__).resolve().parent.parent
+MODES = ['sync', 'async']
+PAGE_SIZE = 20
+
+
+def serve(mode: str, port: int, delay: float, departement: str) -> None:
+    """Démarre l'API de mesure (appelé dans le sous-processus)"""
+    os.environ.setdefault('SECRET_KEY', 'benchmark')
+    sys.path.insert(0, str(ROOT))
+
+    import uvicorn
+    from fastapi import FastAPI
+    from sqlalchemy import text
+    from async_database import AsyncSessionLocal
+    from database import SessionLocal
+    from models import DVFTransaction
+    from routers.stats import DEPARTMENT_STATS_SQL, department_params
+    from routers.transactions import transactions_query
+    from schemas import TRANSACTION_FIELD_SETS
+
+    sleep_sql = text("SELECT pg_sleep(:delay)")
+    stats_sql = text(DEPARTMENT_STATS_SQL)
+    params = department_params(departement)
+    columns = [getattr(DVFTransaction, column) for column in TRANSACTION_FIELD_SETS['base'].values()]
+    page = transactions_query(columns).limit(PAGE_SIZE)
+    app = FastAPI()
+
+    if mode == 'sync':
+        @app.get('/slow')
+        async def slow_sync():
+            with SessionLocal() as db:
+                db.execute(sleep_sql, {'delay': delay})
+                return len(db.execute(stats_sql, params).all())
+
+        @app.get('/fast')
+        async def fast_sync():
+            with SessionLocal() as db:
+                return len(db.execute(page).all())
+    else:
+        @app.get('/slow')
+        async def slow_async():
+            async with AsyncSessionLocal() as db:
+                await db.execute(sleep_sql, {'delay': delay})
+                return len((await db.execute(stats_sql, params)).all())
+
+        @app.get('/fast')
+        async def fast_async():
+            async with AsyncSessionLocal() as db:
+                return len((await db.execute(page)).all())
+
+    uvicorn.run(app, host='127.0.0.1', port=port, log_level='error')
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _wait_ready(base_url: str, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            requests.get(f"{base_url}/fast", timeout=1)
+            return
+        except requests.ConnectionError:
+            time.sleep(0.2)
+    raise RuntimeError("L'API n'a pas démarré")
+
+
+def run_mixed(base_url: str, seconds: float, nb_slow: int, nb_fast: int) -> dict:
+    """Requêtes lentes et rapides simultanées pendant `seconds`"""
+    stop = threading.Event()
+    fast_latencies = []
+    slow_done = []
+    errors = []
+
+    def client(path: str, latencies: list):
+        session = requests.Session()
+        while not stop.is_set():
+            start = time.perf_counter()
+            response = session.get(f"{base_url}{path}")
+            if response.status_code != 200:
+                errors.append(response.status_code)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    threads = [threading.Thread(target=client, args=('/slow', slow_done)) for _ in range(nb_slow)]
+    threads += [threading.Thread(target=client, args=('/fast', fast_latencies)) for _ in range(nb_fast)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    fast_latencies.sort()
+    return {
+        'fast_per_s': len(fast_latencies) / seconds,
+        'p50_ms': statistics.median(fast_latencies),
+        'p99_ms': fast_latencies[int(len(fast_latencies) * 0.99) - 1],
+        'slow_per_s': len(slow_done) / seconds,
+        'errors': len(errors),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--slow', type=int, default=4, help="Threads d'agrégats lents")
+    parser.add_argument('--fast', type=int, default=8, help="Threads de lectures rapides")
+    parser.add_argument('--delay', type=float, default=0.5, help="Durée du pg_sleep des agrégats (s)")
+    parser.add_argument('--departement', default='75')
+    parser.add_argument('--serve', choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.port, args.delay, args.departement)
+        return
+
+    if not os.getenv('DATABASE_URL', '').startswith('postgresql'):
+        print("❌ DATABASE_URL doit pointer vers PostgreSQL (pg_sleep)")
+        return
+
+    print(f"{'mode':<6} {'rapides/s':>10} {'p50 (ms)':>9} {'p99 (ms)':>9} {'lentes/s':>9} {'erreurs':>8}")
+    for mode in MODES:
+        port = _free_port()
+        server = subprocess.Popen([
+            sys.executable, __file__, '--serve', mode, '--port', str(port),
+            '--delay', str(args.delay), '--departement', args.departement
+        ])
+        try:
+            base_url = f"http://127.0.0.1:{port}"
+            _wait_ready(base_url)
+            result = run_mixed(base_url, args.seconds, args.slow, args.fast)
+        finally:
+            server.terminate()
+            server.wait()
+
+        print(f"{mode:<6} {result['fast_per_s']:>10.1f} {result['p50_ms']:>9.1f} {result['p99_ms']:>9.1f} "
+              f"{result['slow_per_s']:>9.1f} {result['errors']:>8}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+"""Benchmark du lecteur CSV DVF : converters Python vs schéma typé vs pyarrow
+
+Usage : python benchmarks/bench_csv_reader.py [--rows 500000] [--chunksize 10000]
+
+Chaque lecteur tourne dans un sous-processus pour mesurer son pic de RSS.
+"""
+import argparse
+import json
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.data_loader import DVF_DTYPES, load_csv_safe  # noqa: E402
+
+# Appel du lecteur tel qu'il était avant le schéma typé
+LEGACY_CONVERTERS = {
+    'Nature culture': str,
+    'Nature culture speciale': str,
+    'Type de voie': str,
+    'Code postal': str,
+    '1er lot': str,
+    '2eme lot': str,
+    '3eme lot': str,
+    '4eme lot': str,
+    'Section': str,
+    'Voie': str,
+    'Commune': str,
+    'B/T/Q': str
+}
+
+READERS = ['legacy', 'typed', 'pyarrow']
+
+
+def generate_dvf_file(path: Path, rows: int) -> None:
+    """Génère un fichier DVF synthétique (séparateur |, décimales à virgule)"""
+    random.seed(42)
+    columns = list(DVF_DTYPES)
+    types_local = ['Maison', 'Appartement', 'Dépendance', 'Local industriel. commercial ou assimilé', '']
+    natures = ['Vente', 'Vente en l\'état futur d\'achèvement', 'Echange', 'Adjudication']
+    voies = ['RUE', 'AV', 'BD', 'CHE', 'RTE', 'IMP', '']
+
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write('|'.join(columns) + '\n')
+        for i in range(rows):
+            departement = random.choice(['01', '13', '2A', '33', '59', '69', '75', '971'])
+            values = {
+                'No disposition': '000001',
+                'Date mutation': f"{random.randint(1, 28):02d}/{random.randint(1, 12):02d}/2023",
+                'Nature mutation': random.choice(natures),
+                'Valeur fonciere': f"{random.randint(20000, 900000)},00",
+                'No voie': str(random.randint(1, 200)),
+                'Type de voie': random.choice(voies),
+                'Code voie': f"{random.randint(0, 9999):04d}",
+                'Voie': f"DES LILAS {i % 1000}",
+                'Code postal': f"{random.randint(1000, 95999):05d}",
+                'Commune': f"COMMUNE {i % 3000}",
+                'Code departement': departement,
+                'Code commune': str(random.randint(1, 700)),
+                'Section': 'AB',
+                'No plan': str(random.randint(1, 2000)),
+                '1er lot': str(random.randint(1, 300)) if i % 3 == 0 else '',
+                'Surface Carrez du 1er lot': f"{random.randint(10, 150)},{random.randint(0, 99):02d}" if i % 3 == 0 else '',
+                'Nombre de lots': str(random.randint(0, 3)),
+                'Code type local': str(random.randint(1, 4)),
+                'Type local': random.choice(types_local),
+                'Surface reelle bati': str(random.randint(9, 300)),
+                'Nombre pieces principales': str(random.randint(0, 8)),
+                'Nature culture': random.choice(['S', 'AG', 'J', '']),
+                'Surface terrain': str(random.randint(0, 5000)),
+            }
+            file.write('|'.join(values.get(column, '') for column in columns) + '\n')
+
+
+def run_reader(reader: str, path: str, chunksize: int) -> dict:
+    """Lit tout le fichier avec le lecteur demandé et mesure temps et mémoire"""
+    if reader == 'legacy':
+        chunks = load_csv_safe(path, chunksize=chunksize, sep='|', decimal=',',
+                               converters=LEGACY_CONVERTERS, low_memory=False)
+    else:
+        chunks = load_csv_safe(path, chunksize=chunksize, sep='|', decimal=',', dtype=DVF_DTYPES,
+                               engine='pyarrow' if reader == 'pyarrow' else 'c')
+
+    # Seule la lecture est chronométrée : memory_usage(deep=True) parcourt
+    # chaque chaîne et pénaliserait les lecteurs qui gardent plus de texte
+    elapsed = 0.0
+    rows = 0
+    nb_chunks = 0
+    chunk_memory = 0
+    while True:
+        start = time.perf_counter()
+        chunk = next(chunks, None)
+        elapsed += time.perf_counter() - start
+        if chunk is None:
+            break
+        rows += len(chunk)
+        nb_chunks += 1
+        chunk_memory = max(chunk_memory, chunk.memory_usage(deep=True).sum())
+
+    return {
+        'reader': reader,
+        'rows': rows,
+        'chunks': nb_chunks,
+        'seconds': round(elapsed, 3),
+        'ms_per_10k_rows': round(elapsed / rows * 10000 * 1000, 2),
+        'max_chunk_mb': round(chunk_memory / 1024 ** 2, 2),
+        'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=500000)
+    parser.add_argument('--chunksize', type=int, default=10000)
+    parser.add_argument('--run', choices=READERS, help=argparse.SUPPRESS)
+    parser.add_argument('--file', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        print(json.dumps(run_reader(args.run, args.file, args.chunksize)))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = Path(tmp_dir) / 'dvf.txt'
+        print(f"Génération de {args.rows} lignes synthétiques...")
+        generate_dvf_file(path, args.rows)
+
+        print(f"{'lecteur':<10} {'lignes':>9} {'temps (s)':>10} {'ms/10k':>8} {'chunk (Mo)':>11} {'RSS max (Mo)':>13}")
+        for reader in READERS:
+            output = subprocess.run(
+                [sys.executable, __file__, '--run', reader, '--file', str(path),
+                 '--chunksize', str(args.chunksize)],
+                check=True, capture_output=True, text=True
+            ).stdout.strip().splitlines()[-1]
+            result = json.loads(output)
+            print(f"{result['reader']:<10} {result['rows']:>9} {result['seconds']:>10} "
+                  f"{result['ms_per_10k_rows']:>8} {result['max_chunk_mb']:>11} {result['peak_rss_mb']:>13}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+"""Benchmark : latence des lectures pendant une rafale de connexions (bcrypt)
+
+Usage : python benchmarks/bench_login_burst.py [--seconds 10] [--logins 8]
+
+Pour chaque mode, l'API tourne dans un sous-processus uvicorn sur une base
+SQLite temporaire. Des threads enchaînent les POST /auth/login pendant qu'un
+autre mesure la latence de GET / (route sans base de données : seul le
+blocage de la boucle d'événements est mesuré).
+
+- legacy : vérification bcrypt synchrone dans la boucle (comportement initial)
+- pool   : vérification dans le pool bcrypt, connexions bornées par sémaphore
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import requests
+
+ROOT = Path(__file__).resolve().parent.parent
+MODES = ['legacy', 'pool']
+USERNAME = 'bench'
+PASSWORD = 'benchmark'
+
+
+def serve(mode: str, port: int, db_path: str) -> None:
+    """Démarre l'API (appelé dans le sous-processus)"""
+    os.environ['DATABASE_URL'] = f"sqlite:///{db_path}"
+    os.environ.setdefault('SECRET_KEY', 'benchmark')
+    sys.path.insert(0, str(ROOT))
+
+    import uvicorn
+    from database import SessionLocal, create_database
+    from crud.users_crud import UserCRUD
+    from schemas import UserCreate
+    import routers.auth
+    from main import app
+
+    create_database()
+    db = SessionLocal()
+    if not UserCRUD(db).get_user_by_username(USERNAME):
+        UserCRUD(db).create_user(UserCreate(username=USERNAME, password=PASSWORD))
+    db.close()
+
+    if mode == 'legacy':
+        from utils.auth import authenticate_user
+
+        async def authenticate_on_loop(db, username, password):
+            return authenticate_user(db, username, password)
+
+        routers.auth.authenticate_user_async = authenticate_on_loop
+
+    uvicorn.run(app, host='127.0.0.1', port=port, log_level='error')
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _wait_ready(base_url: str, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            requests.get(base_url, timeout=1)
+            return
+        except requests.ConnectionError:
+            time.sleep(0.2)
+    raise RuntimeError("L'API n'a pas démarré")
+
+
+def run_burst(base_url: str, seconds: float, nb_logins: int) -> dict:
+    """Rafale de connexions pendant la mesure des lectures"""
+    stop = threading.Event()
+    latencies = []
+    logins = []
+    rejected = []
+
+    def reader():
+        session = requests.Session()
+        while not stop.is_set():
+            start = time.perf_counter()
+            session.get(base_url)
+            latencies.append((time.perf_counter() - start) * 1000)
+            time.sleep(0.01)
+
+    def login():
+        session = requests.Session()
+        while not stop.is_set():
+            response = session.post(f"{base_url}/auth/login", json={'username': USERNAME, 'password': PASSWORD})
+            (logins if response.status_code == 200 else rejected).append(response.status_code)
+
+    threads = [threading.Thread(target=reader)] + [threading.Thread(target=login) for _ in range(nb_logins)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    latencies.sort()
+    return {
+        'reads': len(latencies),
+        'p50_ms': statistics.median(latencies),
+        'p99_ms': latencies[int(len(latencies) * 0.99) - 1],
+        'max_ms': latencies[-1],
+        'logins_per_s': len(logins) / seconds,
+        'rejected': len(rejected),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--logins', type=int, default=8, help="Threads de connexion simultanés")
+    parser.add_argument('--serve', choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--db', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.port, args.db)
+        return
+
+    print(f"{'mode':<8} {'lectures':>9} {'p50 (ms)':>9} {'p99 (ms)':>9} {'max (ms)':>9} {'logins/s':>9} {'refus':>6}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for mode in MODES:
+            port = _free_port()
+            server = subprocess.Popen([
+                sys.executable, __file__, '--serve', mode, '--port', str(port),
+                '--db', str(Path(tmp_dir) / f"{mode}.db")
+            ])
+            try:
+                base_url = f"http://127.0.0.1:{port}"
+                _wait_ready(base_url)
+                result = run_burst(base_url, args.seconds, args.logins)
+            finally:
+                server.terminate()
+                server.wait()
+
+            print(f"{mode:<8} {result['reads']:>9} {result['p50_ms']:>9.1f} {result['p99_ms']:>9.1f} "
+                  f"{result['max_ms']:>9.1f} {result['logins_per_s']:>9.1f} {result['rejected']:>6}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+"""Benchmark : recherche géographique sur un million de transactions synthétiques
+
+Usage : DATABASE_URL=postgresql://... python benchmarks/bench_nearby.py [--rows 1000000] [--queries 200] [--radius 2000]
+
+Les transactions sont générées dans une table temporaire `dvf_transactions`
+(même structure que la table réelle, qu'elle masque le temps de la
+connexion) : points groupés autour de villes sur la France métropolitaine,
+plus un fond uniforme. Pour chaque mode, seul l'index du mode existe :
+
+- btree   : rectangle latitude / longitude sur (longitude, latitude), comme idx_dvf_location
+- cell    : plages de geo_cell sur un B-tree (GET /transactions/nearby sans PostGIS)
+- postgis : colonne geography et index GiST (si l'extension est disponible)
+
+Mêmes filtres et tri par distance que le router (limit 100) ; on mesure la
+latence moyenne et le p95 autour de points tirés parmi les données.
+"""
+import argparse
+import io
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('SECRET_KEY', 'benchmark')
+
+from sqlalchemy import text  # noqa: E402
+from database import bulk_engine  # noqa: E402
+from models import DVFTransaction  # noqa: E402
+from routers.transactions import nearby_query, transactions_query  # noqa: E402
+from schemas import TRANSACTION_FIELD_SETS  # noqa: E402
+from utils.geo import bbox_around, cell_ids, haversine_m, postgis_available  # noqa: E402
+
+PAGE_SIZE = 100
+
+MODE_INDEXES = {
+    'btree': ["CREATE INDEX bench_location ON dvf_transactions (longitude, latitude)"],
+    'cell': ["CREATE INDEX bench_geo_cell ON dvf_transactions (geo_cell, latitude, longitude)"],
+    'postgis': [
+        "CREATE EXTENSION IF NOT EXISTS postgis",
+        "ALTER TABLE dvf_transactions ADD COLUMN IF NOT EXISTS geom geography(Point, 4326)",
+        "UPDATE dvf_transactions SET geom = ST_SetSRID(ST_MakePoint(longitude, latitude), 4326)::geography",
+        "CREATE INDEX bench_geom ON dvf_transactions USING GIST (geom)",
+    ],
+}
+
+
+def generate_points(rows: int, seed: int = 42) -> pd.DataFrame:
+    """Transactions synthétiques : 80 % autour de 300 villes, 20 % uniformes"""
+    rng = np.random.default_rng(seed)
+    clustered = int(rows * 0.8)
+    centers = np.column_stack([rng.uniform(43.0, 50.5, 300), rng.uniform(-1.5, 7.5, 300)])
+    weights = rng.pareto(1.2, 300) + 1
+    picked = rng.choice(300, clustered, p=weights / weights.sum())
+    lat = np.concatenate([centers[picked, 0] + rng.normal(0, 0.05, clustered),
+                          rng.uniform(42.5, 51.0, rows - clustered)])
+    lon = np.concatenate([centers[picked, 1] + rng.normal(0, 0.07, clustered),
+                          rng.uniform(-4.5, 8.0, rows - clustered)])
+
+    return pd.DataFrame({
+        'id': np.arange(1, rows + 1),
+        'date_mutation': pd.Timestamp('2020-01-01') + pd.to_timedelta(rng.integers(0, 1460, rows), unit='D'),
+        'valeur_fonciere': rng.lognormal(12.2, 0.6, rows).round(),
+        'code_commune': rng.integers(1, 900, rows).astype(str),
+        'type_local': rng.choice(['Maison', 'Appartement', 'Dépendance'], rows),
+        'surface_reelle_bati': rng.integers(15, 250, rows).astype(float),
+        'latitude': lat,
+        'longitude': lon,
+        'geo_cell': cell_ids(lat, lon),
+    })
+
+
+def load_points(connection, frame: pd.DataFrame) -> None:
+    """Table temporaire masquant dvf_transactions, chargée par COPY"""
+    connection.execute(text("CREATE TEMP TABLE dvf_transactions (LIKE public.dvf_transactions INCLUDING DEFAULTS)"))
+    buffer = io.StringIO()
+    frame.to_csv(buffer, index=False, header=False, date_format='%Y-%m-%d')
+    buffer.seek(0)
+    with connection.connection.cursor() as cursor:
+        cursor.copy_expert(f"COPY dvf_transactions ({', '.join(frame.columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+
+
+def btree_query(columns: list, lat: float, lon: float, radius_m: float, **filters):
+    """Sans index spatial : rectangle sur latitude / longitude, distance exacte, tri"""
+    min_lon, min_lat, max_lon, max_lat = bbox_around(lat, lon, radius_m)
+    distance = haversine_m(DVFTransaction.latitude, DVFTransaction.longitude, lat, lon)
+    return (transactions_query(columns, **filters).order_by(None)
+            .add_columns(distance.label('distance_m'))
+            .where(DVFTransaction.longitude.between(min_lon, max_lon),
+                   DVFTransaction.latitude.between(min_lat, max_lat),
+                   distance <= radius_m)
+            .order_by(distance, DVFTransaction.id))
+
+
+def run_mode(connection, mode: str, points: np.ndarray, radius_m: float, filters: dict) -> dict:
+    for statement in MODE_INDEXES[mode]:
+        connection.execute(text(statement))
+    connection.execute(text("ANALYZE dvf_transactions"))
+
+    columns = [getattr(DVFTransaction, column) for column in TRANSACTION_FIELD_SETS['base'].values()]
+    latencies = []
+    found = 0
+    for lat, lon in points:
+        if mode == 'btree':
+            query = btree_query(columns, lat, lon, radius_m, **filters)
+        else:
+            query = nearby_query(columns, mode, lat, lon, radius_m=radius_m, **filters)
+        start = time.perf_counter()
+        found += len(connection.execute(query.limit(PAGE_SIZE)).all())
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    # Un seul index à la fois pour le mode suivant
+    connection.execute(text("DROP INDEX IF EXISTS bench_location, bench_geo_cell, bench_geom"))
+    latencies.sort()
+    return {
+        'avg_ms': statistics.mean(latencies),
+        'p95_ms': latencies[int(len(latencies) * 0.95) - 1],
+        'rows_per_query': found / len(points),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--radius', type=float, default=2000, help="Rayon de recherche (m)")
+    parser.add_argument('--type-local', help="Filtre type_local (comme GET /transactions)")
+    args = parser.parse_args()
+
+    if bulk_engine.dialect.name != 'postgresql':
+        print("❌ DATABASE_URL doit pointer vers PostgreSQL")
+        return
+
+    print(f"🏗️  Génération de {args.rows} transactions...")
+    frame = generate_points(args.rows)
+    rng = np.random.default_rng(7)
+    points = frame[['latitude', 'longitude']].to_numpy()[rng.integers(0, len(frame), args.queries)]
+    filters = {'type_local': args.type_local} if args.type_local else {}
+
+    with bulk_engine.connect() as connection:
+        start = time.perf_counter()
+        load_points(connection, frame)
+        print(f"   chargées en {time.perf_counter() - start:.1f}s")
+
+        modes = ['btree', 'cell'] + (['postgis'] if postgis_available(connection) else [])
+        print(f"\n{'mode':<8} {'moy (ms)':>9} {'p95 (ms)':>9} {'lignes/req':>11}")
+        for mode in modes:
+            result = run_mode(connection, mode, points, args.radius, filters)
+            print(f"{mode:<8} {result['avg_ms']:>9.2f} {result['p95_ms']:>9.2f} {result['rows_per_query']:>11.1f}")
+        connection.rollback()
+
+
+if __name__ == '__main__':
+    main()
@@ -14,3 +14,53 @@ class Config:
     ALGORITHM = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES = 30
     
+
+    # Partitionnement de dvf_transactions : '' (table simple), 'year'
+    # (par année de mutation) ou 'year_departement' (année puis hash du département)
+    DVF_PARTITIONING = os.getenv('DVF_PARTITIONING', '')
+    DVF_DEPARTEMENT_PARTITIONS = int(os.getenv('DVF_DEPARTEMENT_PARTITIONS', 8))
+
+    # Recherche géographique : 'auto' (PostGIS si disponible), 'postgis' ou 'cell' (geo_cell + B-tree)
+    DVF_SPATIAL = os.getenv('DVF_SPATIAL', 'auto')
+
+    # Référentiel des communes (API Géo), upserté par lots
+    COMMUNES_API_URL = os.getenv('COMMUNES_API_URL', 'https://geo.api.gouv.fr/communes')
+    COMMUNES_BATCH_SIZE = int(os.getenv('COMMUNES_BATCH_SIZE', 2000))
+
+    # Cache des réponses (mémoire par défaut, Redis partagé si CACHE_URL)
+    CACHE_URL = os.getenv('CACHE_URL', '')
+    CACHE_MAXSIZE = int(os.getenv('CACHE_MAXSIZE', 1024))
+    CACHE_TTL = int(os.getenv('CACHE_TTL', 3600))
+    CACHE_VERSION_TTL = int(os.getenv('CACHE_VERSION_TTL', 30))
+
+    # Cache des utilisateurs authentifiés (par processus)
+    AUTH_CACHE_TTL = int(os.getenv('AUTH_CACHE_TTL', 60))
+    AUTH_CACHE_MAXSIZE = int(os.getenv('AUTH_CACHE_MAXSIZE', 1024))
+
+    # Hachage bcrypt hors de la boucle d'événements
+    PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', 2))
+    MAX_CONCURRENT_LOGINS = int(os.getenv('MAX_CONCURRENT_LOGINS', 4))
+    LOGIN_QUEUE_TIMEOUT = float(os.getenv('LOGIN_QUEUE_TIMEOUT', 5))
+
+    # Profils de connexion : 'api' (lectures courtes de l'API)
+    DB_API_POOL_SIZE = int(os.getenv('DB_API_POOL_SIZE', 10))
+    DB_API_MAX_OVERFLOW = int(os.getenv('DB_API_MAX_OVERFLOW', 10))
+    DB_API_POOL_TIMEOUT = float(os.getenv('DB_API_POOL_TIMEOUT', 10))
+    DB_API_POOL_RECYCLE = int(os.getenv('DB_API_POOL_RECYCLE', 1800))
+    DB_API_STATEMENT_TIMEOUT = int(os.getenv('DB_API_STATEMENT_TIMEOUT', 15000))  # ms, 0 = aucun
+
+    # ... et 'bulk' (cron, ingestion, DDL) : requêtes longues, écritures en masse
+    DB_BULK_POOL_SIZE = int(os.getenv('DB_BULK_POOL_SIZE', 2))
+    DB_BULK_MAX_OVERFLOW = int(os.getenv('DB_BULK_MAX_OVERFLOW', 2))
+    DB_BULK_POOL_RECYCLE = int(os.getenv('DB_BULK_POOL_RECYCLE', 3600))
+    DB_BULK_STATEMENT_TIMEOUT = int(os.getenv('DB_BULK_STATEMENT_TIMEOUT', 0))
+    DB_BULK_WORK_MEM = os.getenv('DB_BULK_WORK_MEM', '256MB')
+    DB_BULK_MAINTENANCE_WORK_MEM = os.getenv('DB_BULK_MAINTENANCE_WORK_MEM', '512MB')
+    DB_BULK_SYNCHRONOUS_COMMIT = os.getenv('DB_BULK_SYNCHRONOUS_COMMIT', 'off')
+    DB_BULK_FETCH_SIZE = int(os.getenv('DB_BULK_FETCH_SIZE', 10000))
+
+    # Réplique en lecture des agrégats, ignorée au-delà de REPLICA_MAX_LAG secondes de retard
+    DATABASE_REPLICA_URL = os.getenv('DATABASE_REPLICA_URL', '')
+    REPLICA_MAX_LAG = float(os.getenv('REPLICA_MAX_LAG', 30))
+    REPLICA_CHECK_INTERVAL = float(os.getenv('REPLICA_CHECK_INTERVAL', 5))
+    REPLICA_CHECK_TIMEOUT = float(os.getenv('REPLICA_CHECK_TIMEOUT', 2))
@@ -20,6 +20,12 @@ class UserCRUD:
         """Vérifie le mot de passe"""
         return pwd_context.verify(plain_password, hashed_password)
     
+    def _revoke_tokens(self, db_user: User) -> None:
+        """Invalide les tokens émis et le cache d'authentification de l'utilisateur"""
+        from utils.auth import invalidate_principal
+        invalidate_principal(db_user.username, db_user.token_version or 0)
+        db_user.token_version = (db_user.token_version or 0) + 1
+
     def get_user(self, user_id: int) -> Optional[User]:
         """Récupère un utilisateur par ID"""
         return self.db.query(User).filter(User.id == user_id).first()
@@ -80,6 +86,10 @@ class UserCRUD:
         
         # Mettre à jour les champs
         update_data = user_update.model_dump(exclude_unset=True)
+        # Un changement de droits ou de statut invalide les tokens en cours
+        if any(field in update_data and update_data[field] != getattr(db_user, field)
+               for field in ('is_active', 'is_admin')):
+            self._revoke_tokens(db_user)
         for field, value in update_data.items():
             if field == 'email' and value:
                 value = value.lower()
@@ -101,6 +111,7 @@ class UserCRUD:
         
         # Mettre à jour le mot de passe
         db_user.hashed_password = self.get_password_hash(new_password)
+        self._revoke_tokens(db_user)
         self.db.commit()
         return True
     
@@ -110,6 +121,7 @@ class UserCRUD:
         if not db_user:
             return False
         
+        self._revoke_tokens(db_user)
         self.db.delete(db_user)
         self.db.commit()
         return True
@@ -121,6 +133,7 @@ class UserCRUD:
             return None
         
         db_user.is_active = False
+        self._revoke_tokens(db_user)
         self.db.commit()
         self.db.refresh(db_user)
         return db_user
@@ -156,6 +169,7 @@ def update_user_password(self, user_id: int, hashed_password: str):
     
     user.hashed_password = hashed_password
     user.updated_at = func.now()
+    self._revoke_tokens(user)
     self.db.commit()
     self.db.refresh(user)
     return user
@@ -1,22 +1,134 @@
 # data_processor.py
 import pandas as pd
-import requests
+from sqlalchemy import text
 from sqlalchemy.orm import Session
 from utils.data_loader import load_dvf_data_streaming
-from models import DVFTransaction, Commune, MarketAnalysis
+from utils.bulk_loader import bulk_insert_dvf
+from utils.cache import COMMUNES_DATASET, bump_dataset_version
+from utils.communes_loader import load_communes
+from utils.parquet_stage import iter_stage, prepare_dvf_stage
+from utils.pipeline import STAT_KEYS, IngestionPipeline
+from utils.stats_cube import CUBE_MIN_TRANSACTIONS, commune_stats_cube_sql
+from utils.outliers import OUTLIER_COLUMNS, OutlierBounds, PriceSketch, price_m2
 from typing import Optional
-import numpy as np
 from utils.logger import get_logger
 
 logger = get_logger(__name__)
 
+# Agrégats par commune, mois et type de local, upsertés en une requête
+MARKET_UPSERT_SQL = """
+    INSERT INTO market_analysis (
+        code_commune, code_departement, code_insee, period, type_local,
+        avg_price_m2, median_price_m2, min_price_m2, max_price_m2,
+        transaction_count, total_volume, created_at
+    )
+    SELECT
+        t.code_commune,
+        t.code_departement,
+        MAX(t.code_insee),
+        to_char(date_trunc('month', t.date_mutation), 'YYYY-MM') AS period,
+        t.type_local,
+        AVG(t.valeur_fonciere / t.surface_reelle_bati),
+        PERCENTILE_CONT(0.5) WITHIN GROUP (ORDER BY t.valeur_fonciere / t.surface_reelle_bati),
+        MIN(t.valeur_fonciere / t.surface_reelle_bati),
+        MAX(t.valeur_fonciere / t.surface_reelle_bati),
+        COUNT(*),
+        SUM(t.valeur_fonciere),
+        now()
+    FROM dvf_transactions t
+    {scope}
+    WHERE t.valeur_fonciere IS NOT NULL
+      AND t.surface_reelle_bati > 0
+      AND t.date_mutation IS NOT NULL
+      {commune_filter}
+    GROUP BY t.code_commune, t.code_departement, date_trunc('month', t.date_mutation), t.type_local
+    ON CONFLICT (code_departement, code_commune, period, type_local) DO UPDATE SET
+        code_insee = EXCLUDED.code_insee,
+        avg_price_m2 = EXCLUDED.avg_price_m2,
+        median_price_m2 = EXCLUDED.median_price_m2,
+        min_price_m2 = EXCLUDED.min_price_m2,
+        max_price_m2 = EXCLUDED.max_price_m2,
+        transaction_count = EXCLUDED.transaction_count,
+        total_volume = EXCLUDED.total_volume,
+        created_at = EXCLUDED.created_at
+"""
+
+# Évolution par rapport à la période précédente de la même série ; seules
+# les lignes dont la valeur change sont réécrites
+MARKET_EVOLUTION_SQL = """
+    UPDATE market_analysis ma
+    SET price_evolution = e.evolution
+    FROM (
+        SELECT
+            m.id,
+            100 * (m.avg_price_m2 - LAG(m.avg_price_m2) OVER serie)
+                / NULLIF(LAG(m.avg_price_m2) OVER serie, 0) AS evolution
+        FROM market_analysis m
+        {scope}
+        WINDOW serie AS (PARTITION BY m.code_departement, m.code_commune, m.type_local ORDER BY m.period)
+    ) e
+    WHERE ma.id = e.id
+      AND ma.price_evolution IS DISTINCT FROM e.evolution
+"""
+
+# Clés à recalculer en mode incrémental, consommées dans la transaction
+MARKET_DELTA_SQL = [
+    """
+    CREATE TEMP TABLE market_delta (
+        code_departement VARCHAR(5),
+        code_commune VARCHAR(5),
+        period VARCHAR(20),
+        type_local VARCHAR(50)
+    ) ON COMMIT DROP
+    """,
+    """
+    WITH consumed AS (
+        DELETE FROM market_analysis_dirty
+        RETURNING code_departement, code_commune, period, type_local
+    )
+    INSERT INTO market_delta SELECT DISTINCT * FROM consumed
+    """,
+]
+
+MARKET_DELTA_TRANSACTIONS = """
+    JOIN market_delta k
+      ON k.code_departement = t.code_departement
+     AND k.code_commune = t.code_commune
+     AND k.type_local IS NOT DISTINCT FROM t.type_local
+     AND t.date_mutation >= to_date(k.period, 'YYYY-MM')
+     AND t.date_mutation < to_date(k.period, 'YYYY-MM') + INTERVAL '1 month'
+"""
+
+MARKET_DELTA_SERIES = """
+    WHERE EXISTS (
+        SELECT 1 FROM market_delta k
+        WHERE k.code_departement = m.code_departement
+          AND k.code_commune = m.code_commune
+          AND k.type_local IS NOT DISTINCT FROM m.type_local
+    )
+"""
+
+# Vue servant GET /market/analysis, rafraîchie sans bloquer les lectures
+MARKET_VIEW_REFRESH_SQL = "REFRESH MATERIALIZED VIEW CONCURRENTLY mv_market_analysis"
+
 
 class DataProcessor:
     def __init__(self, db_session: Session):
         self.db = db_session
 
-    def download_and_process_dvf_data(self, year: int = 2023, logger_cron = None):
-        """Télécharge et traite les données DVF"""
+    def download_and_process_dvf_data(self, year: int = 2023, logger_cron = None, staged: bool = True,
+                                      outliers: str = 'global', chunksize: int = 2000,
+                                      workers: int = 0, writers: int = 1):
+        """Télécharge et traite les données DVF
+
+        Avec `staged`, l'archive est convertie une seule fois en Parquet
+        partitionné puis relue depuis ce stage.
+        Avec `outliers='global'`, les bornes de prix au m² sont calculées en
+        une première passe par (département, type de local) ; 'chunk'
+        conserve l'ancien filtrage chunk par chunk.
+        Avec `workers > 0`, le nettoyage tourne dans un pool de processus et
+        l'écriture dans `writers` processus ayant chacun leur connexion.
+        """
 
         if not logger_cron:
             logger_cron = logger
@@ -26,44 +138,82 @@ class DataProcessor:
             url = "https://www.data.gouv.fr/fr/datasets/r/5ffa8553-0e8f-4622-add9-5c0b593ca1f8"
 
             # Lecture des données
-            count = 0
-            lendf = 0
-            for df in load_dvf_data_streaming(url, chunksize=2000):
-                # Nettoyage des données
-                df = self._clean_dvf_data(df)
-
-                # Sauvegarde en base
-                self._save_dvf_data(df)
-
-                logger_cron.info(f"Traitement en cours: {len(df)} transactions")
-                count = count + 1
-                lendf = len(df) + lendf
-
-                # if count > 3:
-                #     return lendf
-
-            return lendf
+            totals = dict.fromkeys(STAT_KEYS, 0)
+            if staged:
+                prepare_dvf_stage(url, logger_cron=logger_cron)
+
+            def read_chunks(chunksize, columns=None):
+                if staged:
+                    return iter_stage(columns=columns, batch_size=chunksize)
+                return load_dvf_data_streaming(url, chunksize=chunksize)
+
+            # Première passe : bornes de prix au m² sur tout le fichier
+            bounds = None
+            if outliers == 'global':
+                bounds = self.compute_outlier_bounds(read_chunks(100000, columns=OUTLIER_COLUMNS))
+                logger_cron.info(f"Bornes de prix au m² calculées pour {len(bounds.group_bounds)} groupes")
+
+            if workers > 0:
+                pipeline = IngestionPipeline(
+                    DataProcessor._clean_dvf_data, bounds, workers=workers,
+                    writers=writers, logger_cron=logger_cron
+                )
+                totals = pipeline.run(read_chunks(chunksize))
+
+            else:
+                for df in read_chunks(chunksize):
+                    # Nettoyage des données
+                    df = self._clean_dvf_data(df, bounds)
+
+                    # Sauvegarde en base (upsert idempotent)
+                    stats = self._save_dvf_data(df)
+                    for key in totals:
+                        totals[key] += stats[key]
+
+                    logger_cron.info(
+                        f"Traitement en cours: {stats['rows']} transactions "
+                        f"({stats['inserted']} insérées, {stats['updated']} mises à jour, "
+                        f"{stats['skipped']} inchangées, {stats['duplicates']} doublons, "
+                        f"{stats['missing_partition_key']} sans partition, {stats['rows_per_second']:.0f} lignes/s)"
+                    )
+
+            logger_cron.info(
+                f"DVF: {totals['inserted']} insérées, {totals['updated']} mises à jour, "
+                f"{totals['skipped']} inchangées, {totals['duplicates']} doublons, "
+                f"{totals['missing_partition_key']} sans partition sur {totals['rows']} transactions"
+            )
+            return totals
 
         except Exception as e:
             logger_cron.error(f"Erreur lors du traitement DVF: {e}")
             raise
 
-    def _clean_dvf_data(self, df: pd.DataFrame) -> pd.DataFrame:
+    def compute_outlier_bounds(self, chunks) -> OutlierBounds:
+        """Calcule les bornes de prix au m² par (département, type de local)"""
+        sketch = PriceSketch()
+        for df in chunks:
+            sketch.update(df)
+        return sketch.bounds()
+
+    @staticmethod
+    def _clean_dvf_data(df: pd.DataFrame, bounds: Optional[OutlierBounds] = None) -> pd.DataFrame:
         """Nettoie les données DVF"""
         df = df.copy()
 
         # Calcul du prix au m²
-        df['Prix m2'] = df['Valeur fonciere'] / \
-            df['Surface reelle bati'].replace(0, np.nan)
+        df['Prix m2'] = price_m2(df)
 
         # Filtrage des prix au m² aberrants
-        Q1 = df['Prix m2'].quantile(0.25)
-        Q3 = df['Prix m2'].quantile(0.75)
-        IQR = Q3 - Q1
-        df = df[
-            (df['Prix m2'] >= Q1 - 1.5 * IQR) &
-            (df['Prix m2'] <= Q3 + 1.5 * IQR)
-        ]
+        if bounds is not None:
+            df = df[bounds.mask(df, df['Prix m2'])]
+        else:
+            Q1 = df['Prix m2'].quantile(0.25)
+            Q3 = df['Prix m2'].quantile(0.75)
+            IQR = Q3 - Q1
+            df = df[
+                (df['Prix m2'] >= Q1 - 1.5 * IQR) &
+                (df['Prix m2'] <= Q3 + 1.5 * IQR)
+            ]
 
         # Conversion des dates
         df['Date mutation'] = pd.to_datetime(df['Date mutation'], format='%d/%m/%Y', errors='coerce')
@@ -73,162 +223,110 @@ class DataProcessor:
     def clean_value(self, value):
         return None if pd.isna(value) else value
 
-    def _save_dvf_data(self, df: pd.DataFrame):
-        """Sauvegarde les données DVF en base"""
-        for _, row in df.iterrows():
-            transaction = DVFTransaction(
-                identifiant_document=row.get('Identifiant de document'),
-                reference_document=row.get('Reference document'),
-                article_cgi_1=row.get('1 Articles CGI'),
-                article_cgi_2=row.get('2 Articles CGI'),
-                article_cgi_3=row.get('3 Articles CGI'),
-                article_cgi_4=row.get('4 Articles CGI'),
-                article_cgi_5=row.get('5 Articles CGI'),
-                no_disposition=row.get('No disposition'),
-                date_mutation=row.get('Date mutation'),
-                nature_mutation=row.get('Nature mutation'),
-                valeur_fonciere=self.clean_value(row.get('Valeur fonciere')),
-                prix_m2=self.clean_value(row.get('Prix m2')),
-                no_voie=row.get('No voie'),
-                btq=row.get('B/T/Q'),
-                type_de_voie=row.get('Type de voie'),
-                code_voie=row.get('Code voie'),
-                voie=row.get('Voie'),
-                code_postal=row.get('Code postal'),
-                commune=row.get('Commune'),
-                code_departement=row.get('Code departement'),
-                code_commune=row.get('Code commune'),
-                prefixe_de_section=row.get('Prefixe de section'),
-                section=row.get('Section'),
-                no_plan=row.get('No plan'),
-                no_volume=row.get('No Volume'),
-                lot1_numero=row.get('1er lot'),
-                lot1_surface_carrez=self.clean_value(row.get('Surface Carrez du 1er lot')),
-                lot2_numero=row.get('2eme lot'),
-                lot2_surface_carrez=self.clean_value(row.get('Surface Carrez du 2eme lot')),
-                lot3_numero=row.get('3eme lot'),
-                lot3_surface_carrez=self.clean_value(row.get('Surface Carrez du 3eme lot')),
-                lot4_numero=row.get('4eme lot'),
-                lot4_surface_carrez=self.clean_value(row.get('Surface Carrez du 4eme lot')),
-                lot5_numero=row.get('5eme lot'),
-                lot5_surface_carrez=self.clean_value(row.get('Surface Carrez du 5eme lot')),
-                nombre_lots=self.clean_value(row.get('Nombre de lots')),
-                code_type_local=row.get('Code type local'),
-                type_local=row.get('Type local'),
-                identifiant_local=row.get('Identifiant local'),
-                surface_reelle_bati=self.clean_value(row.get('Surface reelle bati')),
-                nombre_pieces_principales=self.clean_value(row.get('Nombre pieces principales')),
-                nature_culture=row.get('Nature culture'),
-                nature_culture_speciale=row.get('Nature culture speciale'),
-                surface_terrain=self.clean_value(row.get('Surface terrain')),
-                longitude=row.get('Longitude'),
-                latitude=row.get('Latitude')
-            )
-            self.db.add(transaction)
-
-        self.db.commit()
+    def _save_dvf_data(self, df: pd.DataFrame) -> dict:
+        """Sauvegarde les données DVF en base (écriture en bloc)"""
+        return bulk_insert_dvf(self.db, df)
 
-    def fetch_communes_data(self, logger_cron = None):
-        """Récupère les données des communes depuis l'API Géo"""
+    def fetch_communes_data(self, logger_cron = None, force: bool = False):
+        """Récupère les données des communes depuis l'API Géo (upsert par lots)"""
         if not logger_cron:
             logger_cron = logger
 
         try:
-            url = "https://geo.api.gouv.fr/communes"
-            params = {
-                'fields': 'nom,code,codeDepartement,codeRegion,population,surface,centre',
-                'format': 'json'
-            }
-
-            response = requests.get(url, params=params)
-            response.raise_for_status()
-
-            communes_data = response.json()
-
-            for commune_data in communes_data:
-                commune = Commune(
-                    code=commune_data['code'],
-                    nom=commune_data['nom'],
-                    code_departement=commune_data['codeDepartement'],
-                    code_region=commune_data.get('codeRegion'),
-                    population=commune_data.get('population'),
-                    surface=commune_data.get('surface'),
-                    longitude=commune_data.get('centre', {}).get(
-                        'coordinates', [None, None])[0],
-                    latitude=commune_data.get('centre', {}).get(
-                        'coordinates', [None, None])[1]
-                )
-                self.db.merge(commune)
-
-            self.db.commit()
-            logger_cron.info(f"Données de {len(communes_data)} communes récupérées")
+            totals = load_communes(self.db, force=force, logger_cron=logger_cron)
+            if totals['payload_unchanged']:
+                return totals
+
+            if totals['inserted'] or totals['updated']:
+                # Rechargement du registre des communes de l'API
+                bump_dataset_version(self.db, COMMUNES_DATASET)
+            logger_cron.info(
+                f"Données de {totals['rows']} communes récupérées ({totals['inserted']} insérées, "
+                f"{totals['updated']} mises à jour, {totals['skipped']} inchangées) en {totals['seconds']:.1f}s"
+            )
+            return totals
 
         except Exception as e:
             logger_cron.error(f"Erreur lors de la récupération des communes: {e}")
             raise
 
-    def generate_market_analysis(self, code_commune: Optional[str] = None, logger_cron = None):
-        """Génère l'analyse du marché"""
+    def generate_market_analysis(self, code_commune: Optional[str] = None, logger_cron = None,
+                                 incremental: bool = False):
+        """Génère l'analyse du marché (agrégation et upsert côté PostgreSQL)
+
+        Avec `incremental`, seules les clés (commune, mois, type) marquées
+        par l'ingestion sont recalculées, ainsi que l'évolution des séries
+        concernées.
+        """
         if not logger_cron:
             logger_cron = logger
 
         try:
-            query = self.db.query(DVFTransaction).filter(
-                DVFTransaction.valeur_fonciere.isnot(None),
-                DVFTransaction.surface_reelle_bati.isnot(None),
-                DVFTransaction.surface_reelle_bati > 0
-            )
+            params = {}
+            commune_filter = ""
+            transactions_scope = ""
+            series_scope = ""
+
+            if incremental:
+                for statement in MARKET_DELTA_SQL:
+                    self.db.execute(text(statement))
+                transactions_scope = MARKET_DELTA_TRANSACTIONS
+                series_scope = MARKET_DELTA_SERIES
+            elif code_commune:
+                commune_filter = "AND t.code_commune = :code_commune"
+                series_scope = "WHERE m.code_commune = :code_commune"
+                params['code_commune'] = code_commune
+            else:
+                # Reconstruction complète : les clés en attente sont couvertes
+                self.db.execute(text("DELETE FROM market_analysis_dirty"))
+
+            upserted = self.db.execute(text(MARKET_UPSERT_SQL.format(
+                scope=transactions_scope, commune_filter=commune_filter
+            )), params).rowcount
+            evolutions = self.db.execute(text(MARKET_EVOLUTION_SQL.format(scope=series_scope)), params).rowcount
 
-            if code_commune:
-                query = query.filter(
-                    DVFTransaction.code_commune == code_commune)
+            self.db.commit()
+            logger_cron.info(
+                f"Analyse du marché générée: {upserted} groupes recalculés, "
+                f"{evolutions} évolutions mises à jour"
+            )
 
-            transactions = query.all()
+        except Exception as e:
+            self.db.rollback()
+            logger_cron.error(f"Erreur lors de l'analyse: {e}")
+            raise
 
-            # Groupement par commune, période et type
-            analysis_data = {}
+    def refresh_market_view(self, logger_cron = None):
+        """Rafraîchit la vue matérialisée des analyses de marché"""
+        if not logger_cron:
+            logger_cron = logger
 
-            for transaction in transactions:
-                key = (
-                    transaction.code_commune,
-                    transaction.code_departement,
-                    transaction.date_mutation.strftime('%Y-%m'),
-                    transaction.type_local
-                )
+        try:
+            self.db.execute(text(MARKET_VIEW_REFRESH_SQL))
+            self.db.commit()
+            logger_cron.info("Vue mv_market_analysis rafraîchie")
+        except Exception as e:
+            self.db.rollback()
+            logger_cron.error(f"Erreur lors du rafraîchissement de la vue: {e}")
+            raise
 
-                if key not in analysis_data:
-                    analysis_data[key] = []
-
-                prix_m2 = transaction.valeur_fonciere / transaction.surface_reelle_bati
-                analysis_data[key].append({
-                    'prix_m2': prix_m2,
-                    'valeur_fonciere': transaction.valeur_fonciere
-                })
-
-            # Calcul des statistiques
-            for key, data in analysis_data.items():
-                code_commune, code_departement, period, type_local = key
-                prix_m2_list = [d['prix_m2'] for d in data]
-                valeurs_list = [d['valeur_fonciere'] for d in data]
-
-                analysis = MarketAnalysis(
-                    code_commune=code_commune,
-                    code_departement=code_departement,
-                    period=period,
-                    type_local=type_local,
-                    avg_price_m2=np.mean(prix_m2_list),
-                    median_price_m2=np.median(prix_m2_list),
-                    min_price_m2=np.min(prix_m2_list),
-                    max_price_m2=np.max(prix_m2_list),
-                    transaction_count=len(data),
-                    total_volume=sum(valeurs_list)
-                )
+    def refresh_stats_cube(self, logger_cron = None):
+        """Recalcule le cube de statistiques par commune, type de local et budget
 
-                self.db.add(analysis)
+        Le remplacement se fait dans une transaction : les lecteurs voient
+        l'ancien cube jusqu'au commit.
+        """
+        if not logger_cron:
+            logger_cron = logger
 
+        try:
+            self.db.execute(text("DELETE FROM commune_stats_cube"))
+            rows = self.db.execute(text(commune_stats_cube_sql()), {
+                'min_transactions': CUBE_MIN_TRANSACTIONS
+            }).rowcount
             self.db.commit()
-            logger_cron.info("Analyse du marché générée")
-
+            logger_cron.info(f"Cube de statistiques communes recalculé: {rows} lignes")
         except Exception as e:
-            logger_cron.error(f"Erreur lors de l'analyse: {e}")
+            self.db.rollback()
+            logger_cron.error(f"Erreur lors du calcul du cube de statistiques: {e}")
             raise
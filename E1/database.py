@@ -1,20 +1,111 @@
 # database.py
 import os
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+from config import Config
 from models import Base
+from utils.pool_metrics import PoolMetrics, pool_status, timed_pool_class
 
-# Configuration de la base de données
-engine = create_engine(os.getenv("DATABASE_URL"))
+# Profils de connexion : pool et réglages de session PostgreSQL
+ENGINE_PROFILES = {
+    'api': {
+        'pool': {
+            'pool_size': Config.DB_API_POOL_SIZE,
+            'max_overflow': Config.DB_API_MAX_OVERFLOW,
+            'pool_timeout': Config.DB_API_POOL_TIMEOUT,
+            'pool_recycle': Config.DB_API_POOL_RECYCLE,
+        },
+        'settings': {
+            'statement_timeout': Config.DB_API_STATEMENT_TIMEOUT,
+        },
+    },
+    'bulk': {
+        'pool': {
+            'pool_size': Config.DB_BULK_POOL_SIZE,
+            'max_overflow': Config.DB_BULK_MAX_OVERFLOW,
+            'pool_recycle': Config.DB_BULK_POOL_RECYCLE,
+        },
+        # synchronous_commit=off : un crash peut perdre les derniers commits,
+        # pas corrompre la base ; l'ingestion est rejouable
+        'settings': {
+            'statement_timeout': Config.DB_BULK_STATEMENT_TIMEOUT,
+            'work_mem': Config.DB_BULK_WORK_MEM,
+            'maintenance_work_mem': Config.DB_BULK_MAINTENANCE_WORK_MEM,
+            'synchronous_commit': Config.DB_BULK_SYNCHRONOUS_COMMIT,
+        },
+    },
+}
+
+# Attente au checkout par moteur, exposée par /metrics/db
+POOL_METRICS = {}
+_engines = {}
+
+
+def engine_options(profile: str, url, name: str, is_async: bool = False, read_only: bool = False) -> dict:
+    """Options create_engine d'un profil (pool et réglages PostgreSQL uniquement)"""
+    url = make_url(url)
+    if url.get_backend_name() != 'postgresql':
+        return {}
+
+    config = ENGINE_PROFILES[profile]
+    metrics = POOL_METRICS[name] = PoolMetrics()
+    settings = {key: str(value) for key, value in config['settings'].items()}
+    if read_only:
+        settings['default_transaction_read_only'] = 'on'
+    if is_async:
+        connect_args = {'server_settings': settings}
+    else:
+        connect_args = {'options': ' '.join(f"-c {key}={value}" for key, value in settings.items())}
+
+    return {
+        **config['pool'],
+        'pool_pre_ping': True,
+        'poolclass': timed_pool_class(AsyncAdaptedQueuePool if is_async else QueuePool, metrics),
+        'connect_args': connect_args,
+    }
+
+
+def create_profile_engine(profile: str, name: str = None):
+    """Moteur synchrone d'un profil ('api' ou 'bulk')"""
+    name = name or profile
+    url = os.getenv("DATABASE_URL")
+    _engines[name] = create_engine(url, **engine_options(profile, url, name))
+    return _engines[name]
+
+
+def pool_metrics() -> dict:
+    """Attente au checkout et occupation des pools de chaque moteur"""
+    return {
+        name: {**POOL_METRICS.get(name, PoolMetrics()).snapshot(), **pool_status(engine.pool)}
+        for name, engine in _engines.items()
+    }
+
+
+# Configuration de la base de données (profil API : authentification, administration)
+engine = create_profile_engine('api')
 
 # Session pour les requêtes
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Profil bulk : cron, ingestion, création des index et vues
+bulk_engine = create_profile_engine('bulk')
+
+BulkSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=bulk_engine)
+
+
+@event.listens_for(BulkSessionLocal, 'do_orm_execute')
+def _stream_bulk_selects(orm_execute_state):
+    """Curseurs serveur pour les lectures du profil bulk (résultats lus par lots)"""
+    if orm_execute_state.is_select:
+        orm_execute_state.update_execution_options(stream_results=True, max_row_buffer=Config.DB_BULK_FETCH_SIZE)
+
 
 def create_database():
     """Création de toutes les tables"""
     try:
-        Base.metadata.create_all(bind=engine)
+        Base.metadata.create_all(bind=bulk_engine)
         print("✅ Base de données créée avec succès!")
         return True
     except Exception as e:
@@ -25,7 +116,7 @@ def create_database():
 def drop_database():
     """Suppression de toutes les tables"""
     try:
-        Base.metadata.drop_all(bind=engine)
+        Base.metadata.drop_all(bind=bulk_engine)
         print("✅ Tables supprimées avec succès!")
         return True
     except Exception as e:
@@ -42,6 +133,15 @@ def get_db():
         db.close()
 
 
+def get_bulk_db():
+    """Générateur de session du profil bulk (traitements longs)"""
+    db = BulkSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
 def test_connection():
     """Test de la connexion à la base de données"""
     try:
@@ -0,0 +1,227 @@
+#!/usr/bin/env python
+"""Conseiller d'index : rejoue les requêtes des routers et crée les index adaptés
+
+Usage :
+    python index_advisor.py              # plans actuels et index manquants
+    python index_advisor.py --apply      # crée les index retenus par les plans
+    python index_advisor.py --code-commune 056 --type-local Maison --departement 75
+
+Les index candidats (QUERY_INDEXES) sont créés puis conservés seulement si
+un plan EXPLAIN ANALYZE des requêtes mesurées les utilise ; les autres sont
+supprimés. Les requêtes sont construites par les mêmes fonctions que les
+routers, avec par défaut les valeurs les plus fréquentes de la base.
+"""
+import argparse
+from datetime import timedelta
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+from database import SessionLocal, bulk_engine
+from models import DVFTransaction
+from routers.stats import DEPARTMENT_STATS_SQL, department_params
+from routers.transactions import transactions_query
+from schemas import TRANSACTION_FIELD_SETS
+from utils.partitioning import is_partitioned
+
+# limit par défaut de GET /transactions + 1 (détection de la page suivante)
+PAGE_SIZE = 101
+
+# Index candidats, composites, partiels et couvrants, calqués sur les requêtes
+# des routers ; init_db ne les crée pas, seul --apply les crée s'ils sont retenus
+QUERY_INDEXES = {
+    # GET /transactions filtré par commune et type, trié par date
+    'idx_dvf_commune_type_date': """
+        ON dvf_transactions(code_commune, type_local, date_mutation DESC, id DESC)
+        WHERE valeur_fonciere > 0
+    """,
+    # GET /transactions filtré par commune seule
+    'idx_dvf_commune_date': """
+        ON dvf_transactions(code_commune, date_mutation DESC, id DESC)
+        WHERE valeur_fonciere > 0
+    """,
+    # GET /statistics/department : lecture index-only
+    'idx_dvf_departement_stats': """
+        ON dvf_transactions(code_departement, type_local)
+        INCLUDE (valeur_fonciere, surface_reelle_bati)
+        WHERE valeur_fonciere > 0 AND surface_reelle_bati > 0
+    """,
+}
+
+
+def sample_values(db) -> dict:
+    """Commune, type de local et département les plus fréquents de la base"""
+    row = db.execute(text("""
+        SELECT code_commune, type_local, code_departement, MAX(date_mutation)
+        FROM dvf_transactions
+        WHERE valeur_fonciere > 0 AND type_local IS NOT NULL
+        GROUP BY code_commune, type_local, code_departement
+        ORDER BY COUNT(*) DESC
+        LIMIT 1
+    """)).first()
+
+    if not row:
+        return {}
+    return {'code_commune': row[0], 'type_local': row[1], 'departement': row[2], 'date_max': row[3]}
+
+
+def _compile(statement) -> tuple:
+    """SQL PostgreSQL et paramètres d'une requête SQLAlchemy"""
+    compiled = statement.compile(dialect=postgresql.dialect())
+    return str(compiled), compiled.params
+
+
+def query_shapes(db, values: dict) -> list:
+    """Requêtes des routers à mesurer : (nom, sql, paramètres)"""
+    columns = [getattr(DVFTransaction, column) for column in TRANSACTION_FIELD_SETS['base'].values()]
+
+    def transactions(**filters):
+        return _compile(transactions_query(columns, **filters).limit(PAGE_SIZE))
+
+    date_start = values['date_max'] - timedelta(days=365) if values.get('date_max') else None
+
+    return [
+        ('transactions commune+type+dates', *transactions(
+            code_commune=values['code_commune'], type_local=values['type_local'], date_start=date_start
+        )),
+        ('transactions commune', *transactions(code_commune=values['code_commune'])),
+        ('transactions récentes', *transactions()),
+        ('statistiques département', *_compile(
+            text(DEPARTMENT_STATS_SQL).bindparams(**department_params(values['departement']))
+        )),
+    ]
+
+
+def _plan_nodes(node: dict) -> list:
+    """Nœuds du plan, en profondeur"""
+    nodes = [node]
+    for child in node.get('Plans', []):
+        nodes.extend(_plan_nodes(child))
+    return nodes
+
+
+def _label(node: dict) -> str:
+    """Type de nœud, avec l'index utilisé"""
+    if node.get('Index Name'):
+        return f"{node['Node Type']} ({node['Index Name']})"
+    return node['Node Type']
+
+
+def explain(db, sql: str, params: dict, runs: int = 2) -> dict:
+    """EXPLAIN ANALYZE d'une requête ; la dernière exécution (cache chaud) est retenue"""
+    for _ in range(runs):
+        plan = db.connection().exec_driver_sql(
+            f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}", params
+        ).scalar()[0]
+
+    nodes = _plan_nodes(plan['Plan'])
+    scans = [_label(node) for node in nodes if 'Scan' in node['Node Type']]
+    return {
+        'ms': plan['Execution Time'],
+        'scans': ', '.join(scans),
+        'indexes': {node['Index Name'] for node in nodes if node.get('Index Name')},
+    }
+
+
+def existing_indexes(db) -> set:
+    result = db.execute(text("SELECT indexname FROM pg_indexes WHERE tablename = 'dvf_transactions'"))
+    return {row[0] for row in result}
+
+
+def used_indexes(results: dict) -> set:
+    """Index apparaissant dans au moins un des plans mesurés"""
+    return set().union(*(result['indexes'] for result in results.values()))
+
+
+def apply_indexes(names: list) -> None:
+    """Crée les index sans bloquer les écritures (CONCURRENTLY, hors transaction)"""
+    with bulk_engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+        # CONCURRENTLY n'est pas disponible sur une table partitionnée
+        concurrently = '' if is_partitioned(connection) else 'CONCURRENTLY '
+        for name in names:
+            print(f"   - {name}...")
+            connection.execute(text(f"CREATE INDEX {concurrently}IF NOT EXISTS {name} {QUERY_INDEXES[name]}"))
+        connection.execute(text("ANALYZE dvf_transactions"))
+
+
+def drop_indexes(names: list) -> None:
+    """Supprime les index candidats qu'aucun plan n'a retenus"""
+    with bulk_engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+        concurrently = '' if is_partitioned(connection) else 'CONCURRENTLY '
+        for name in names:
+            print(f"   - {name}...")
+            connection.execute(text(f"DROP INDEX {concurrently}IF EXISTS {name}"))
+
+
+def measure(db, shapes: list) -> dict:
+    results = {name: explain(db, sql, params) for name, sql, params in shapes}
+    db.rollback()
+    return results
+
+
+def print_report(before: dict, after: dict = None) -> None:
+    print(f"\n{'requête':<34} {'avant (ms)':>11} {'après (ms)':>11}  plan")
+    for name, result in before.items():
+        measured = after[name] if after else result
+        after_ms = f"{measured['ms']:>11.2f}" if after else f"{'-':>11}"
+        print(f"{name:<34} {result['ms']:>11.2f} {after_ms}  {measured['scans']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Conseiller d'index pour les requêtes de l'API")
+    parser.add_argument('--apply', action='store_true', help="Crée les index candidats retenus par les plans")
+    parser.add_argument('--code-commune', help="Commune utilisée pour les requêtes /transactions")
+    parser.add_argument('--type-local', help="Type de local utilisé pour les requêtes /transactions")
+    parser.add_argument('--departement', help="Département utilisé pour /statistics/department")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        values = sample_values(db)
+        if not values:
+            print("❌ Aucune transaction en base : rien à mesurer")
+            return
+        for key in ('code_commune', 'type_local', 'departement'):
+            if getattr(args, key):
+                values[key] = getattr(args, key)
+        print(f"🔎 Paramètres: commune={values['code_commune']}, type={values['type_local']}, "
+              f"département={values['departement']}")
+
+        existing = existing_indexes(db)
+        missing = [name for name in QUERY_INDEXES if name not in existing]
+        db.rollback()
+        if missing:
+            print("\n📋 Index candidats:")
+            for name in missing:
+                print(f"CREATE INDEX {name} {' '.join(QUERY_INDEXES[name].split())};")
+        else:
+            print("\n✅ Tous les index candidats existent déjà")
+
+        shapes = query_shapes(db, values)
+        before = measure(db, shapes)
+
+        unused = [name for name in QUERY_INDEXES if name in existing and name not in used_indexes(before)]
+        if unused:
+            print("\n⚠️  Index candidats existants qu'aucun plan n'utilise:")
+            for name in unused:
+                print(f"DROP INDEX {name};")
+
+        if not (args.apply and missing):
+            print_report(before)
+            return
+
+        print("\n🛠️  Création des index candidats...")
+        apply_indexes(missing)
+        after = measure(db, shapes)
+        print_report(before, after)
+
+        rejected = [name for name in missing if name not in used_indexes(after)]
+        if rejected:
+            print("\n🗑️  Suppression des index non retenus par les plans...")
+            drop_indexes(rejected)
+        kept = [name for name in missing if name not in rejected]
+        print(f"\n✅ Index retenus: {', '.join(kept) if kept else 'aucun'}")
+    finally:
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
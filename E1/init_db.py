@@ -1,7 +1,11 @@
 # init_db.py
 import sys
 from sqlalchemy import text
-from database import create_database, test_connection, engine
+from config import Config
+from database import bulk_engine, create_database, test_connection
+from utils.bulk_loader import DVF_CONFLICT_COLUMNS, DVF_KEY_VERSION, backfill_row_keys
+from utils.geo import SPATIAL_MODES, backfill_geo_cells, postgis_available
+from utils.partitioning import PARTITION_COLUMNS, is_partitioned
 
 
 def init_database():
@@ -21,13 +25,184 @@ def init_database():
         print("❌ Impossible de créer les tables")
         sys.exit(1)
 
-    # 3. Création des index pour les performances
-    print("\n3. Création des index...")
+    # Vérification du mode de partitionnement
+    check_partitioning()
+
+    # 3. Mise à jour du schéma des tables existantes
+    print("\n3. Mise à jour du schéma...")
+    upgrade_schema()
+
+    # 4. Création des index pour les performances
+    print("\n4. Création des index...")
     create_indexes()
 
+    # 5. Création des vues matérialisées
+    print("\n5. Création des vues...")
+    create_views()
+
+    # 6. Index spatial (PostGIS si disponible)
+    print("\n6. Index spatial...")
+    create_spatial_index()
+
     print("\n✅ Initialisation terminée!")
 
 
+def check_partitioning():
+    """Signale une table dvf_transactions créée dans un autre mode de partitionnement"""
+    with bulk_engine.connect() as connection:
+        partitioned = is_partitioned(connection)
+
+    if bool(PARTITION_COLUMNS) != partitioned:
+        state = "est" if partitioned else "n'est pas"
+        print(f"⚠️  dvf_transactions {state} partitionnée "
+              f"mais DVF_PARTITIONING='{Config.DVF_PARTITIONING}' : "
+              "recréer la table et relancer l'import pour changer de mode")
+        sys.exit(1)
+
+
+# Code INSEE (5 caractères) à partir des codes département et commune DVF
+INSEE_CODE_SQL = """
+    CASE WHEN length(code_departement) = 3
+         THEN code_departement || right(lpad(code_commune, 3, '0'), 2)
+         ELSE lpad(code_departement, 2, '0') || lpad(code_commune, 3, '0')
+    END
+"""
+
+
+def migration_applied(connection, name: str) -> bool:
+    """Migration de données déjà appliquée (ligne 'migration:<nom>' de dataset_versions)"""
+    return bool(connection.execute(
+        text("SELECT 1 FROM dataset_versions WHERE name = :name"), {'name': f"migration:{name}"}
+    ).scalar())
+
+
+def mark_migration(connection, name: str) -> None:
+    connection.execute(text("""
+        INSERT INTO dataset_versions (name, version, updated_at)
+        VALUES (:name, 1, now())
+        ON CONFLICT (name) DO NOTHING
+    """), {'name': f"migration:{name}"})
+    connection.commit()
+
+
+def rekey_transactions(connection) -> None:
+    """Recalcule les clés d'upsert des lignes existantes si leur définition a changé
+
+    Les lignes chargées avant l'upsert (ou avec une version antérieure de la
+    clé) seraient sinon ajoutées une seconde fois au prochain import. Les
+    doublons de clé sont supprimés (la ligne la plus récente est gardée),
+    puis l'index unique est recréé par create_indexes.
+    """
+    name = f"dvf_row_keys_v{DVF_KEY_VERSION}"
+    if migration_applied(connection, name):
+        return
+
+    connection.execute(text("DROP INDEX IF EXISTS idx_dvf_mutation_key;"))
+    connection.commit()
+
+    rekeyed = backfill_row_keys(connection)
+    same_key = " AND ".join(f"a.{column} = b.{column}" for column in DVF_CONFLICT_COLUMNS)
+    duplicates = connection.execute(text(f"""
+        DELETE FROM dvf_transactions a
+        USING dvf_transactions b
+        WHERE a.id < b.id AND {same_key};
+    """)).rowcount
+    mark_migration(connection, name)
+    print(f"   - clés d'upsert recalculées pour {rekeyed} transactions, {duplicates} doublons supprimés")
+
+
+def backfill_insee_codes(connection, table: str, batch_size: int = 50000) -> int:
+    """Code INSEE des lignes chargées avant son introduction, par plages d'id"""
+    if migration_applied(connection, f"{table}_code_insee"):
+        return 0
+
+    total = 0
+    last_id = connection.execute(text(f"SELECT COALESCE(MIN(id), 1) - 1 FROM {table}")).scalar()
+    max_id = connection.execute(text(f"SELECT COALESCE(MAX(id), 0) FROM {table}")).scalar()
+    while last_id < max_id:
+        total += connection.execute(text(f"""
+            UPDATE {table} SET code_insee = {INSEE_CODE_SQL}
+            WHERE id > :last_id AND id <= :last_id + :batch_size AND code_insee IS NULL;
+        """), {'last_id': last_id, 'batch_size': batch_size}).rowcount
+        connection.commit()
+        last_id += batch_size
+
+    mark_migration(connection, f"{table}_code_insee")
+    return total
+
+
+def deduplicate_market_analysis(connection) -> int:
+    """Supprime les analyses dupliquées par les anciennes générations
+
+    Une seule fois : l'index unique idx_market_key empêche ensuite les doublons.
+    """
+    if migration_applied(connection, 'market_analysis_dedup'):
+        return 0
+
+    # Une passe de tri (PARTITION BY regroupe aussi les NULL), la ligne la plus récente est gardée
+    deleted = connection.execute(text("""
+        DELETE FROM market_analysis
+        WHERE id IN (
+            SELECT id FROM (
+                SELECT id, ROW_NUMBER() OVER (
+                    PARTITION BY code_departement, code_commune, period, type_local
+                    ORDER BY id DESC
+                ) AS rang
+                FROM market_analysis
+            ) ranked
+            WHERE rang > 1
+        );
+    """)).rowcount
+    mark_migration(connection, 'market_analysis_dedup')
+    return deleted
+
+
+def upgrade_schema():
+    """Ajoute les colonnes manquantes aux tables déjà créées
+
+    Les reprises de données ne parcourent les tables qu'une fois : chacune
+    est marquée dans dataset_versions une fois appliquée.
+    """
+    statements = [
+        text("ALTER TABLE dvf_transactions ADD COLUMN IF NOT EXISTS mutation_key VARCHAR(16);"),
+        text("ALTER TABLE dvf_transactions ADD COLUMN IF NOT EXISTS row_hash VARCHAR(16);"),
+        text("ALTER TABLE dvf_transactions ADD COLUMN IF NOT EXISTS code_insee VARCHAR(5);"),
+        text("ALTER TABLE market_analysis ADD COLUMN IF NOT EXISTS code_insee VARCHAR(5);"),
+        text("ALTER TABLE users ADD COLUMN IF NOT EXISTS token_version INTEGER NOT NULL DEFAULT 0;"),
+        text("ALTER TABLE dvf_transactions ADD COLUMN IF NOT EXISTS geo_cell BIGINT;"),
+        text("ALTER TABLE dataset_versions ADD COLUMN IF NOT EXISTS source_hash VARCHAR(64);"),
+    ]
+
+    try:
+        with bulk_engine.connect() as connection:
+            for statement in statements:
+                connection.execute(statement)
+            connection.commit()
+
+            # Calcul du code INSEE des lignes chargées avant son introduction
+            for table in ('dvf_transactions', 'market_analysis'):
+                backfilled = backfill_insee_codes(connection, table)
+                if backfilled:
+                    print(f"   - code_insee calculé pour {backfilled} lignes de {table}")
+
+            deleted = deduplicate_market_analysis(connection)
+            if deleted:
+                print(f"   - {deleted} analyses dupliquées supprimées")
+
+            rekey_transactions(connection)
+
+            # Cellules géographiques des lignes chargées avant leur introduction
+            # (les imports suivants les calculent au chargement)
+            if not migration_applied(connection, 'dvf_geo_cells'):
+                backfilled = backfill_geo_cells(connection)
+                mark_migration(connection, 'dvf_geo_cells')
+                if backfilled:
+                    print(f"   - geo_cell calculée pour {backfilled} transactions")
+        print("✅ Schéma à jour!")
+    except Exception as e:
+        print(f"❌ Erreur lors de la mise à jour du schéma: {e}")
+
+
 def create_indexes():
     """Création des index pour optimiser les performances"""
     indexes = [
@@ -40,6 +215,15 @@ def create_indexes():
         text("CREATE INDEX IF NOT EXISTS idx_dvf_valeur_fonciere ON dvf_transactions(valeur_fonciere);"),
         text("CREATE INDEX IF NOT EXISTS idx_dvf_surface_terrain ON dvf_transactions(surface_terrain);"),
         text("CREATE INDEX IF NOT EXISTS idx_dvf_location ON dvf_transactions(longitude, latitude);"),
+        # GET /transactions/nearby sans PostGIS : plages de cellules
+        text("CREATE INDEX IF NOT EXISTS idx_dvf_geo_cell ON dvf_transactions(geo_cell, latitude, longitude);"),
+        text(f"CREATE UNIQUE INDEX IF NOT EXISTS idx_dvf_mutation_key ON dvf_transactions({', '.join(DVF_CONFLICT_COLUMNS)});"),
+        text("CREATE INDEX IF NOT EXISTS idx_dvf_code_insee ON dvf_transactions(code_insee);"),
+        # Pagination par curseur (date_mutation, id)
+        text("CREATE INDEX IF NOT EXISTS idx_dvf_date_id ON dvf_transactions(date_mutation DESC, id DESC);"),
+
+        # Les index calqués sur les requêtes des routers ne sont créés que par
+        # index_advisor.py --apply, s'ils sont retenus par les plans mesurés
 
         # Index sur Commune
         text("CREATE INDEX IF NOT EXISTS idx_commune_departement ON communes(code_departement);"),
@@ -50,10 +234,25 @@ def create_indexes():
         text("CREATE INDEX IF NOT EXISTS idx_market_commune_period ON market_analysis(code_commune, period);"),
         text("CREATE INDEX IF NOT EXISTS idx_market_type_local ON market_analysis(type_local);"),
         text("CREATE INDEX IF NOT EXISTS idx_market_period ON market_analysis(period);"),
+        text("CREATE INDEX IF NOT EXISTS idx_market_code_insee ON market_analysis(code_insee);"),
+
+        # Index sur CommuneStatsCube
+        text("""
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_cube_key
+            ON commune_stats_cube(type_local, budget_max, code_insee);
+        """),
+        text("""
+            CREATE INDEX IF NOT EXISTS idx_cube_prix_m2
+            ON commune_stats_cube(type_local, budget_max, prix_m2_moyen);
+        """),
+        text("""
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_market_key
+            ON market_analysis(code_departement, code_commune, period, type_local) NULLS NOT DISTINCT;
+        """),
     ]
 
     try:
-        with engine.connect() as connection:
+        with bulk_engine.connect() as connection:
             for index_sql in indexes:
                 connection.execute(index_sql)
             connection.commit()
@@ -61,6 +260,93 @@ def create_indexes():
     except Exception as e:
         print(f"❌ Erreur lors de la création des index: {e}")
 
+def create_views():
+    """Création de la vue matérialisée servant GET /market/analysis"""
+    statements = [
+        text("""
+            CREATE MATERIALIZED VIEW IF NOT EXISTS mv_market_analysis AS
+            SELECT
+                ma.id,
+                ma.code_commune,
+                ma.code_departement,
+                ma.code_insee,
+                ma.period,
+                ma.type_local,
+                ma.avg_price_m2,
+                ma.median_price_m2,
+                ma.min_price_m2,
+                ma.max_price_m2,
+                ma.transaction_count,
+                ma.total_volume,
+                ma.price_evolution,
+                ma.created_at,
+                c.nom AS commune_nom,
+                c.longitude AS commune_longitude,
+                c.latitude AS commune_latitude
+            FROM market_analysis ma
+            JOIN communes c ON c.code = ma.code_insee;
+        """),
+        # Index unique requis par REFRESH MATERIALIZED VIEW CONCURRENTLY
+        text("CREATE UNIQUE INDEX IF NOT EXISTS idx_mv_market_id ON mv_market_analysis(id);"),
+        # Index couvrant : la recherche par commune se fait en index-only scan
+        text("""
+            CREATE INDEX IF NOT EXISTS idx_mv_market_commune
+            ON mv_market_analysis(code_commune, period DESC)
+            INCLUDE (id, code_departement, code_insee, type_local, avg_price_m2, median_price_m2,
+                     min_price_m2, max_price_m2, transaction_count, total_volume, price_evolution,
+                     created_at, commune_nom, commune_longitude, commune_latitude);
+        """),
+    ]
+
+    try:
+        with bulk_engine.connect() as connection:
+            # Vue déjà créée : pas de recalcul (les index manquants sont ajoutés)
+            if connection.execute(text("SELECT to_regclass('mv_market_analysis')")).scalar():
+                statements = statements[1:]
+            for statement in statements:
+                connection.execute(statement)
+            connection.commit()
+        print("✅ Vues créées avec succès!")
+    except Exception as e:
+        print(f"❌ Erreur lors de la création des vues: {e}")
+
+
+def create_spatial_index():
+    """Colonne geography générée et index GiST si PostGIS est installable
+
+    Sans PostGIS (ou DVF_SPATIAL='cell'), GET /transactions/nearby utilise
+    geo_cell et son B-tree.
+    """
+    if Config.DVF_SPATIAL not in SPATIAL_MODES:
+        print(f"❌ DVF_SPATIAL invalide: {Config.DVF_SPATIAL} (valeurs possibles: {', '.join(SPATIAL_MODES)})")
+        return
+    if Config.DVF_SPATIAL == 'cell':
+        print("✅ Recherche géographique par cellules (geo_cell)")
+        return
+
+    try:
+        with bulk_engine.connect() as connection:
+            if not postgis_available(connection):
+                message = "PostGIS non disponible, recherche géographique par cellules (geo_cell)"
+                print(f"{'❌' if Config.DVF_SPATIAL == 'postgis' else '⚠️ '} {message}")
+                return
+
+            connection.execute(text("CREATE EXTENSION IF NOT EXISTS postgis;"))
+            connection.execute(text("""
+                ALTER TABLE dvf_transactions ADD COLUMN IF NOT EXISTS geom geography(Point, 4326)
+                GENERATED ALWAYS AS (
+                    CASE WHEN longitude BETWEEN -180 AND 180 AND latitude BETWEEN -90 AND 90
+                         THEN ST_SetSRID(ST_MakePoint(longitude, latitude), 4326)::geography
+                    END
+                ) STORED;
+            """))
+            connection.execute(text("CREATE INDEX IF NOT EXISTS idx_dvf_geom ON dvf_transactions USING GIST (geom);"))
+            connection.commit()
+        print("✅ Index spatial PostGIS créé!")
+    except Exception as e:
+        print(f"❌ Erreur lors de la création de l'index spatial: {e}")
+
+
 def create_default_users():
     from database import SessionLocal
     from crud.users_crud import UserCRUD
@@ -113,7 +399,7 @@ def create_default_users():
 def check_tables():
     """Vérification des tables créées"""
     try:
-        with engine.connect() as connection:
+        with bulk_engine.connect() as connection:
             # Vérification des tables
             result = connection.execute(text("""
                 SELECT table_name 
@@ -1,9 +1,13 @@
 # main.py
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from database import test_connection
+from async_database import AsyncSessionLocal, async_engine, replica_engine, replica_status
+from database import pool_metrics, test_connection
+from utils.commune_registry import load_registry
 from utils.logger import get_logger
+from utils.pagination import NEXT_CURSOR_HEADER
 
 from routers import (
     auth_router,
@@ -16,7 +20,23 @@ from routers import (
 
 logger = get_logger(__name__)
 
-app = FastAPI(title="Plateforme Immobilière", version="1.0.0")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Registre des communes chargé au démarrage (sinon à la première requête)
+    try:
+        async with AsyncSessionLocal() as db:
+            await load_registry(db)
+    except Exception as e:
+        logger.warning(f"Registre des communes non chargé au démarrage: {e}")
+    yield
+    # Connexions asyncpg liées à la boucle d'événements : fermées avec elle
+    await async_engine.dispose()
+    if replica_engine is not None:
+        await replica_engine.dispose()
+
+
+app = FastAPI(title="Plateforme Immobilière", version="1.0.0", lifespan=lifespan)
 
 
 app.add_middleware(
@@ -25,6 +45,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
 app.include_router(auth_router)
@@ -55,7 +76,8 @@ async def health_check():
         return {
             "status": "healthy",
             "service": "immobilier_api",
-            "database": "connected"
+            "database": "connected",
+            "replica": replica_status()
         }
     except Exception as e:
         logger.error(f"Connexion impossible à la bdd: {e}")
@@ -67,3 +89,9 @@ async def health_check():
                 "error": str(e)
             }
         )
+
+
+@app.get("/metrics/db")
+async def database_metrics():
+    """Attente au checkout (ms) et occupation des pools de connexions, par moteur"""
+    return pool_metrics()
@@ -1,15 +1,19 @@
 # models.py
-from sqlalchemy import Boolean, Column, Integer, String, Float, Date, DateTime, func
+from sqlalchemy import BigInteger, Boolean, Column, Integer, String, Float, Date, DateTime, func
 
 from sqlalchemy.ext.declarative import declarative_base
+from utils.partitioning import PARTITION_COLUMNS, partition_by
 
 Base = declarative_base()
 
 
 class DVFTransaction(Base):
     __tablename__ = 'dvf_transactions'
+    # Table partitionnée si DVF_PARTITIONING est défini : les colonnes de
+    # partitionnement font alors partie de la clé primaire
+    __table_args__ = {'postgresql_partition_by': partition_by()} if PARTITION_COLUMNS else {}
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     identifiant_document = Column(String(50))
     reference_document = Column(String(50))
     article_cgi_1 = Column(String(20))
@@ -18,7 +22,7 @@ class DVFTransaction(Base):
     article_cgi_4 = Column(String(20))
     article_cgi_5 = Column(String(20))
     no_disposition = Column(String(20))
-    date_mutation = Column(Date)
+    date_mutation = Column(Date, primary_key='date_mutation' in PARTITION_COLUMNS)
     nature_mutation = Column(String(100))
     valeur_fonciere = Column(Float)
     prix_m2 = Column(Float)
@@ -29,8 +33,9 @@ class DVFTransaction(Base):
     voie = Column(String(255))
     code_postal = Column(String(5))
     commune = Column(String(100))
-    code_departement = Column(String(3))
+    code_departement = Column(String(3), primary_key='code_departement' in PARTITION_COLUMNS)
     code_commune = Column(String(5))
+    code_insee = Column(String(5))  # Code INSEE normalisé (département + commune)
     prefixe_de_section = Column(String(5))
     section = Column(String(5))
     no_plan = Column(String(10))
@@ -56,6 +61,9 @@ class DVFTransaction(Base):
     surface_terrain = Column(Float)
     longitude = Column(Float)
     latitude = Column(Float)
+    geo_cell = Column(BigInteger)  # Cellule de Morton (recherche géographique, voir utils/geo.py)
+    mutation_key = Column(String(16))  # Hash de la clé naturelle de la mutation
+    row_hash = Column(String(16))  # Hash du contenu complet de la ligne
     created_at = Column(DateTime, default=func.now())
 
 class Commune(Base):
@@ -78,6 +86,7 @@ class MarketAnalysis(Base):
     id = Column(Integer, primary_key=True, index=True)
     code_commune = Column(String(5))
     code_departement = Column(String(5))
+    code_insee = Column(String(5))
     period = Column(String(20))  # YYYY-MM
     type_local = Column(String(50))
     avg_price_m2 = Column(Float)
@@ -90,6 +99,45 @@ class MarketAnalysis(Base):
     created_at = Column(DateTime, default=func.now())
 
 
+# Clés d'analyse touchées par une ingestion, en attente de recalcul
+class MarketAnalysisDirty(Base):
+    __tablename__ = 'market_analysis_dirty'
+
+    id = Column(Integer, primary_key=True)
+    code_commune = Column(String(5))
+    code_departement = Column(String(5))
+    period = Column(String(20))  # YYYY-MM
+    type_local = Column(String(50))
+    created_at = Column(DateTime, server_default=func.now())
+
+
+# Statistiques par commune, type de local et plafond de budget (cumulatives :
+# une ligne couvre toutes les ventes dont la valeur foncière est <= budget_max)
+class CommuneStatsCube(Base):
+    __tablename__ = 'commune_stats_cube'
+
+    id = Column(Integer, primary_key=True)
+    code_insee = Column(String(5))
+    type_local = Column(String(50))
+    budget_max = Column(Float)
+    nb_transactions = Column(Integer)
+    prix_m2_moyen = Column(Float)
+    prix_median = Column(Float)
+    prix_m2_median = Column(Float)
+    created_at = Column(DateTime, server_default=func.now())
+
+
+# Version des jeux de données, incrémentée après chaque chargement (cache API)
+class DatasetVersion(Base):
+    __tablename__ = 'dataset_versions'
+
+    name = Column(String(50), primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    # Hash du document source du dernier chargement (rechargement ignoré si identique)
+    source_hash = Column(String(64))
+    updated_at = Column(DateTime, server_default=func.now())
+
+
 class User(Base):
     __tablename__ = "users"
     
@@ -102,6 +150,9 @@ class User(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     last_login = Column(DateTime(timezone=True), nullable=True)
+    # Incrémenté à chaque changement de mot de passe ou de statut : les tokens
+    # émis avec une version antérieure sont refusés
+    token_version = Column(Integer, nullable=False, default=0, server_default='0')
     
     def __repr__(self):
         return f"<User(username='{self.username}', email='{self.email}')>"
\ No newline at end of file
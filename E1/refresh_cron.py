@@ -1,29 +1,69 @@
 #!/usr/bin/env python
 
+import argparse
+import os
+import time
 from data_processor import DataProcessor
-from database import get_db
+from database import get_bulk_db
+from utils.cache import bump_dataset_version
 from utils.logger import get_logger
 
 logger = get_logger(__name__)
 
-logger.info('Start CRON')
-db = next(get_db())
 
-try:
-    processor = DataProcessor(db)
+def parse_args():
+    """Paramètres d'ingestion (ligne de commande ou variables d'environnement)"""
+    parser = argparse.ArgumentParser(description="Rafraîchissement des données DVF")
+    parser.add_argument('--workers', type=int, default=int(os.getenv('DVF_WORKERS', 0)),
+                        help="Processus de nettoyage (0 = traitement séquentiel)")
+    parser.add_argument('--writers', type=int, default=int(os.getenv('DVF_WRITERS', 2)),
+                        help="Processus d'écriture en base, une connexion chacun")
+    parser.add_argument('--chunksize', type=int, default=int(os.getenv('DVF_CHUNKSIZE', 2000)),
+                        help="Nombre de lignes par chunk")
+    return parser.parse_args()
 
-    # Récupération des communes
-    processor.fetch_communes_data(logger_cron=logger)
 
-    # Traitement des données DVF
-    count = processor.download_and_process_dvf_data(logger_cron=logger)
+if __name__ == '__main__':
+    args = parse_args()
 
-    # Génération des analyses
-    #processor.generate_market_analysis(code_commune="350", logger_cron=logger)
+    logger.info('Start CRON')
+    db = next(get_bulk_db())
 
-except Exception as e:
-    logger.error(f"{'='*10} Erreur {'='*10}")
-    logger.error(e)
-    logger.error(f"{'='*10} Fin Erreur {'='*10}")
+    try:
+        processor = DataProcessor(db)
 
-logger.info('End CRON')
\ No newline at end of file
+        # Récupération des communes
+        processor.fetch_communes_data(logger_cron=logger)
+
+        # Traitement des données DVF
+        start = time.perf_counter()
+        totals = processor.download_and_process_dvf_data(
+            logger_cron=logger,
+            chunksize=args.chunksize,
+            workers=args.workers,
+            writers=args.writers
+        )
+        elapsed = time.perf_counter() - start
+        logger.info(
+            f"Ingestion DVF en {elapsed:.1f}s: {totals['rows']} lignes, {totals['inserted']} insérées, "
+            f"{totals['updated']} mises à jour, {totals['skipped']} inchangées "
+            f"({totals['rows'] / elapsed if elapsed else 0:.0f} lignes/s)"
+        )
+
+        # Génération des analyses pour les clés touchées par l'ingestion
+        processor.generate_market_analysis(incremental=True, logger_cron=logger)
+
+        # Publication des analyses pour l'API
+        processor.refresh_market_view(logger_cron=logger)
+        processor.refresh_stats_cube(logger_cron=logger)
+
+        # Invalidation des réponses en cache de l'API
+        version = bump_dataset_version(db)
+        logger.info(f"Version du jeu de données DVF: {version}")
+
+    except Exception as e:
+        logger.error(f"{'='*10} Erreur {'='*10}")
+        logger.error(e)
+        logger.error(f"{'='*10} Fin Erreur {'='*10}")
+
+    logger.info('End CRON')
@@ -6,8 +6,8 @@ from config import Config
 from utils.auth import (
     create_access_token, 
     get_current_user, 
-    authenticate_user,
-    get_password_hash
+    authenticate_user_async,
+    run_in_hash_pool
 )
 from crud.users_crud import UserCRUD 
 from schemas import (
@@ -31,7 +31,7 @@ async def login_for_access_token(
     db: Session = Depends(get_db)
 ):
     """Connexion utilisateur"""
-    user = authenticate_user(db, user_credentials.username, user_credentials.password)
+    user = await authenticate_user_async(db, user_credentials.username, user_credentials.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -41,7 +41,7 @@ async def login_for_access_token(
     
     access_token_expires = timedelta(minutes=Config.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.username}, 
+        data={"sub": user.username, "ver": user.token_version or 0}, 
         expires_delta=access_token_expires
     )
     
@@ -71,7 +71,7 @@ async def refresh_token(current_user = Depends(get_current_user)):
     """Rafraîchit le token"""
     access_token_expires = timedelta(minutes=Config.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": current_user.username}, 
+        data={"sub": current_user.username, "ver": current_user.token_version}, 
         expires_delta=access_token_expires
     )
     
@@ -104,7 +104,8 @@ async def register_user(user: UserCreate, db: Session = Depends(get_db), current
         
         # Créer l'utilisateur
         try:
-            new_user = user_crud.create_user(user)
+            # Hachage bcrypt dans le pool borné, hors de la boucle d'événements
+            new_user = await run_in_hash_pool(user_crud.create_user, user)
             return {
                 "message": "Utilisateur créé avec succès",
                 "username": new_user.username,
@@ -112,6 +113,8 @@ async def register_user(user: UserCreate, db: Session = Depends(get_db), current
                 "is_admin": False,
                 "is_active": True
             }
+        except HTTPException:
+            raise
         except Exception as e:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -141,22 +144,18 @@ async def change_password(
     db: Session = Depends(get_db)
 ):
     """Changer le mot de passe"""
-    from utils.auth import verify_password
-    
-    # Vérifier l'ancien mot de passe
-    if not verify_password(old_password, current_user.hashed_password):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Ancien mot de passe incorrect"
-        )
-    
-    # Changer le mot de passe
     user_crud = UserCRUD(db)
-    hashed_new_password = get_password_hash(new_password)
     
     try:
-        user_crud.change_password(current_user.id, old_password, hashed_new_password)
+        # Vérifie l'ancien mot de passe puis enregistre le nouveau
+        if not await run_in_hash_pool(user_crud.change_password, current_user.id, old_password, new_password):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Ancien mot de passe incorrect"
+            )
         return {"message": "Mot de passe modifié avec succès"}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
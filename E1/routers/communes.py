@@ -1,8 +1,8 @@
 from typing import Optional
-from fastapi import APIRouter, Depends, Query
-from requests import Session
-from models import Commune
-from database import get_db
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from async_database import get_read_db
+from utils.commune_registry import get_registry
 #from auth import get_current_user
 
 router = APIRouter(
@@ -15,14 +15,23 @@ router = APIRouter(
 @router.get("/")
 async def get_communes(
     departement: Optional[str] = None,
+    q: Optional[str] = Query(None, description="Début du nom, sans tenir compte des accents"),
     limit: int = Query(100, le=1000),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
-    """Récupère la liste des communes"""
-    query = db.query(Commune)
+    """Récupère la liste des communes (registre en mémoire)"""
+    registry = await get_registry(db)
 
-    if departement:
-        query = query.filter(Commune.code_departement == departement)
+    if q:
+        return registry.search(q, departement=departement, limit=limit)
 
-    communes = query.limit(limit).all()
-    return communes
\ No newline at end of file
+    return registry.by_departement(departement, limit=limit)
+
+
+@router.get("/{code}")
+async def get_commune(code: str, db: AsyncSession = Depends(get_read_db)):
+    """Commune par code INSEE"""
+    commune = (await get_registry(db)).get(code)
+    if commune is None:
+        raise HTTPException(status_code=404, detail="Commune inconnue")
+    return commune
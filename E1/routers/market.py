@@ -1,13 +1,17 @@
 from typing import Optional
 from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from data_processor import DataProcessor
-from database import get_db
+from async_database import get_read_db
+from database import get_bulk_db
 from utils.auth import get_current_user
+from utils.cache import bump_dataset_version
+from utils.http_cache import cached_json
 
 from models import MarketAnalysis
 from schemas import MaketAnalysis, UserResponse
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 
 
 router = APIRouter(
@@ -16,14 +20,8 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
-@router.get("/analysis")
-async def get_market_analysis(
-    market_params: MaketAnalysis,
-    db: Session = Depends(get_db),
-    current_user: UserResponse = Depends(get_current_user)
-):
-    """Analyse du marché pour une commune"""
-
+async def market_analysis(db: AsyncSession, market_params: MaketAnalysis) -> list:
+    """Lignes de mv_market_analysis correspondant aux critères"""
     sql_conditions = ["ma.code_commune = :code_commune"]
     params = {"code_commune": market_params.code_commune}
     
@@ -46,18 +44,13 @@ async def get_market_analysis(
     where_clause = " AND ".join(sql_conditions)
     
     sql_query = f"""
-        SELECT 
-            ma.*,
-            c.nom as commune_nom,
-            c.longitude as commune_longitude,
-            c.latitude as commune_latitude
-        FROM market_analysis ma
-        JOIN communes c ON c.code = LPAD(ma.code_departement::text, 2, '0') || LPAD(ma.code_commune::text, 3, '0')
+        SELECT ma.*
+        FROM mv_market_analysis ma
         WHERE {where_clause}
         ORDER BY ma.period DESC
     """
     
-    results = db.execute(text(sql_query), params).fetchall()
+    results = (await db.execute(text(sql_query), params)).fetchall()
     
     if not results:
         raise HTTPException(status_code=404, detail="Aucune analyse trouvée")
@@ -67,11 +60,30 @@ async def get_market_analysis(
     
     return analysis
 
+
+@router.get("/analysis")
+async def get_market_analysis(
+    market_params: MaketAnalysis,
+    request: Request,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: UserResponse = Depends(get_current_user)
+):
+    """Analyse du marché pour une commune"""
+    return await cached_json(
+        request, db, 'market_analysis', market_params.model_dump(),
+        lambda: market_analysis(db, market_params)
+    )
+
 @router.post('/generate')
-def generate(db: Session = Depends(get_db),
+def generate(db: Session = Depends(get_bulk_db),
     code_commune: str = None,
+    incremental: bool = False,
     current_user: UserResponse = Depends(get_current_user)):
     processor = DataProcessor(db)
-    processor.generate_market_analysis(code_commune)
+    processor.generate_market_analysis(code_commune, incremental=incremental)
+    processor.refresh_market_view()
+
+    # Les analyses ont changé : invalidation des réponses en cache
+    bump_dataset_version(db)
 
     return True
\ No newline at end of file
@@ -1,9 +1,10 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, Request
+from sqlalchemy.ext.asyncio import AsyncSession
 import sqlalchemy
-from database import get_db
+from async_database import get_read_db
 from schemas import UserResponse
 from utils.auth import get_current_user
+from utils.http_cache import cached_json
 from utils.logger import get_logger
 
 logger = get_logger(__name__)
@@ -15,34 +16,36 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
-@router.get("/department/{code_departement}")
-async def get_department_statistics(
-    code_departement: str,
-    db: Session = Depends(get_db),
-    current_user: UserResponse = Depends(get_current_user)
-):
-    """Statistiques par département"""
+# Statistiques agrégées d'un département (réutilisée par index_advisor.py)
+DEPARTMENT_STATS_SQL = """
+    SELECT 
+        type_local,
+        COUNT(*) as transaction_count,
+        round(AVG(valeur_fonciere)::numeric, 2) as avg_price,
+        round(AVG(valeur_fonciere / NULLIF(surface_reelle_bati, 0))::numeric , 2) as avg_price_m2,
+        round(SUM(valeur_fonciere)::numeric, 2) as total_volume
+    FROM dvf_transactions 
+    WHERE code_departement IN (:dept, :dept_short)
+      AND valeur_fonciere > 0 
+      AND surface_reelle_bati > 0
+    GROUP BY type_local
+    ORDER BY transaction_count DESC
+"""
+
 
-    # Requête pour obtenir les statistiques agrégées
-    query = sqlalchemy.text("""
-        SELECT 
-            type_local,
-            COUNT(*) as transaction_count,
-            round(AVG(valeur_fonciere)::numeric, 2) as avg_price,
-            round(AVG(valeur_fonciere / NULLIF(surface_reelle_bati, 0))::numeric , 2) as avg_price_m2,
-            round(SUM(valeur_fonciere)::numeric, 2) as total_volume
-        FROM dvf_transactions 
-        WHERE code_departement = :dept
-          AND valeur_fonciere > 0 
-          AND surface_reelle_bati > 0
-        GROUP BY type_local
-        ORDER BY transaction_count DESC
-    """)
-
-    params = {
-        'dept': str(code_departement).removeprefix('0'),
+def department_params(code_departement: str) -> dict:
+    """Les codes sont stockés avec ou sans zéro initial selon l'import"""
+    return {
+        'dept': str(code_departement),
+        'dept_short': str(code_departement).removeprefix('0'),
     }
-    result = db.execute(query, params)
+
+
+async def department_statistics(db: AsyncSession, code_departement: str) -> dict:
+    """Statistiques par type de local d'un département"""
+    query = sqlalchemy.text(DEPARTMENT_STATS_SQL)
+    params = department_params(code_departement)
+    result = await db.execute(query, params)
     stats = result.fetchall()
 
     return {
@@ -57,4 +60,18 @@ async def get_department_statistics(
             }
             for row in stats
         ]
-    }
\ No newline at end of file
+    }
+
+
+@router.get("/department/{code_departement}")
+async def get_department_statistics(
+    code_departement: str,
+    request: Request,
+    db: AsyncSession = Depends(get_read_db),
+    current_user: UserResponse = Depends(get_current_user)
+):
+    """Statistiques par département"""
+    return await cached_json(
+        request, db, 'statistics_department', {'code_departement': code_departement},
+        lambda: department_statistics(db, code_departement)
+    )
@@ -1,13 +1,26 @@
-from datetime import datetime
+import csv
+import io
+import json
+import math
+from datetime import date, datetime, time
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy import and_, func, literal_column, or_, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
 import sqlalchemy
-from database import get_db
+from async_database import AsyncSessionLocal, get_async_db, get_read_db
 from models import DVFTransaction
-from schemas import TransactionResponse, UserResponse
+from schemas import TRANSACTION_FIELD_SETS, TransactionResponse, UserResponse
 from utils.auth import get_current_user
+from utils.http_cache import cached_json
+from utils.commune_registry import get_registry
+from utils.geo import bbox_around, cover_ranges, haversine_m, spatial_backend
 from utils.logger import get_logger
+from utils.pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor
+from utils.stats_cube import (
+    CUBE_COMMUNE_STATS_SQL, CUBE_MIN_TRANSACTIONS, LIVE_COMMUNE_STATS_SQL, budget_cap
+)
 
 logger = get_logger(__name__)
 
@@ -18,150 +31,396 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
-@router.get("/")
+# Nombre de lignes lues par aller-retour du curseur serveur en export
+EXPORT_BATCH_SIZE = 1000
+
+
+def _selected_fields(fields: Optional[str]) -> dict:
+    """Champs demandés (?fields=adresse,geo) : nom exposé -> colonne"""
+    selected = dict(TRANSACTION_FIELD_SETS['base'])
+    for name in filter(None, (name.strip() for name in (fields or '').split(','))):
+        if name not in TRANSACTION_FIELD_SETS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Jeu de champs inconnu: {name} (disponibles: {', '.join(TRANSACTION_FIELD_SETS)})"
+            )
+        selected.update(TRANSACTION_FIELD_SETS[name])
+    return selected
+
+
+def _json_value(value):
+    """Valeur sérialisable en JSON (dates ISO, NaN/inf -> None)"""
+    if isinstance(value, float):
+        return None if math.isnan(value) or math.isinf(value) else value
+    if isinstance(value, date):
+        # Format historique de TransactionResponse (datetime)
+        return datetime.combine(value, time()).isoformat()
+    return value
+
+
+def _row_to_dict(row, names: list) -> dict:
+    return {name: _json_value(value) for name, value in zip(names, row)}
+
+
+async def _stream_rows(statement):
+    """Lignes lues par lots via un curseur serveur
+
+    La session est propre à l'export : elle reste ouverte le temps du
+    streaming, indépendamment de celle de la requête.
+    """
+    async with AsyncSessionLocal() as db:
+        result = await db.stream(statement.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        async for row in result:
+            yield row
+
+
+async def _stream_ndjson(statement, names: list):
+    """Export NDJSON, une transaction par ligne, via un curseur serveur"""
+    async for row in _stream_rows(statement):
+        yield json.dumps(_row_to_dict(row, names)) + '\n'
+
+
+async def _stream_csv(statement, names: list):
+    """Export CSV écrit au fil de la lecture du curseur serveur"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(names)
+
+    index = 0
+    async for row in _stream_rows(statement):
+        writer.writerow([_json_value(value) for value in row])
+        index += 1
+        if index % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    yield buffer.getvalue()
+
+
+def transactions_query(columns: list, code_commune: Optional[str] = None,
+                       type_local: Optional[str] = None, date_start: Optional[date] = None,
+                       date_end: Optional[date] = None, min_price: Optional[float] = None,
+                       max_price: Optional[float] = None, after: Optional[tuple] = None):
+    """Requête SELECT de GET /transactions (réutilisée par index_advisor.py)"""
+    query = select(*columns)
+
+    # Filtrer les valeurs invalides dès la requête
+    query = query.filter(
+        DVFTransaction.valeur_fonciere.isnot(None),
+        DVFTransaction.valeur_fonciere > 0,
+        DVFTransaction.date_mutation.isnot(None)
+    )
+
+    if code_commune:
+        query = query.filter(DVFTransaction.code_commune == code_commune)
+
+    if type_local:
+        query = query.filter(DVFTransaction.type_local == type_local)
+
+    if date_start:
+        query = query.filter(DVFTransaction.date_mutation >= date_start)
+
+    if date_end:
+        query = query.filter(DVFTransaction.date_mutation <= date_end)
+
+    if min_price:
+        query = query.filter(DVFTransaction.valeur_fonciere >= min_price)
+
+    if max_price:
+        query = query.filter(DVFTransaction.valeur_fonciere <= max_price)
+
+    # Page suivante : clé (date_mutation, id) strictement inférieure au curseur
+    if after:
+        query = query.filter(tuple_(DVFTransaction.date_mutation, DVFTransaction.id) < tuple_(*after))
+
+    return query.order_by(
+        DVFTransaction.date_mutation.desc(),
+        DVFTransaction.id.desc()
+    )
+
+
+@router.get("/", response_model=None, responses={200: {"model": List[TransactionResponse]}})
 async def get_transactions(
     code_commune: Optional[str] = None,
     type_local: Optional[str] = None,
-    date_start: Optional[str] = None,
-    date_end: Optional[str] = None,
+    date_start: Optional[date] = None,
+    date_end: Optional[date] = None,
     min_price: Optional[float] = None,
     max_price: Optional[float] = None,
     limit: int = Query(100, le=1000),
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = None,
+    format: str = Query("json", pattern="^(json|ndjson|csv)$"),
+    fields: Optional[str] = Query(None, description=f"Jeux de champs en plus de base: {', '.join(TRANSACTION_FIELD_SETS)}"),
+    db: AsyncSession = Depends(get_async_db),
     current_user: UserResponse = Depends(get_current_user)
-) -> List[TransactionResponse]:
-    """Récupère les transactions"""
+):
+    """Récupère les transactions
+
+    Pagination par curseur sur (date_mutation, id) : le curseur de la page
+    suivante est renvoyé dans l'en-tête X-Next-Cursor. Les formats ndjson
+    et csv exportent toutes les lignes restantes en streaming (sans limit).
+    Seules les colonnes des jeux de champs demandés sont lues en base.
+    """
     
     try:
-        query = db.query(DVFTransaction)
+        selected = _selected_fields(fields)
+        names = list(selected)
+        after = None
+        if cursor:
+            try:
+                after = decode_cursor(cursor)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
 
-        # Filtrer les valeurs invalides dès la requête
-        query = query.filter(
-            DVFTransaction.valeur_fonciere.isnot(None),
-            DVFTransaction.valeur_fonciere > 0
+        query = transactions_query(
+            [getattr(DVFTransaction, column) for column in selected.values()],
+            code_commune=code_commune, type_local=type_local, date_start=date_start,
+            date_end=date_end, min_price=min_price, max_price=max_price, after=after
         )
 
-        if code_commune:
-            query = query.filter(DVFTransaction.code_commune == code_commune)
+        if format == "ndjson":
+            return StreamingResponse(_stream_ndjson(query, names), media_type="application/x-ndjson")
+
+        if format == "csv":
+            return StreamingResponse(
+                _stream_csv(query, names), media_type="text/csv",
+                headers={"Content-Disposition": "attachment; filename=transactions.csv"}
+            )
+
+        # Une ligne de plus pour savoir s'il existe une page suivante
+        rows = (await db.execute(query.limit(limit + 1))).all()
+        headers = {}
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            headers[NEXT_CURSOR_HEADER] = encode_cursor(last.date_mutation, last.id)
+        
+        return JSONResponse(content=[_row_to_dict(row, names) for row in rows], headers=headers)
+        
+    except HTTPException:
+        raise
 
-        if type_local:
-            query = query.filter(DVFTransaction.type_local == type_local)
+    except Exception as e:
+        logger.error(f"Erreur: {e}")
+        raise HTTPException(status_code=500, detail="Erreur lors de la récupération des transactions")
 
-        if date_start:
-            query = query.filter(DVFTransaction.date_mutation >= date_start)
 
-        if date_end:
-            query = query.filter(DVFTransaction.date_mutation <= date_end)
+def parse_bbox(bbox: str) -> tuple:
+    """Rectangle 'min_lon,min_lat,max_lon,max_lat' ; ValueError si invalide"""
+    try:
+        min_lon, min_lat, max_lon, max_lat = (float(value) for value in bbox.split(','))
+    except ValueError:
+        raise ValueError(f"bbox invalide: {bbox} (attendu: min_lon,min_lat,max_lon,max_lat)")
+    if not (-180 <= min_lon <= max_lon <= 180 and -90 <= min_lat <= max_lat <= 90):
+        raise ValueError(f"bbox invalide: {bbox}")
+    return min_lon, min_lat, max_lon, max_lat
 
-        if min_price:
-            query = query.filter(DVFTransaction.valeur_fonciere >= min_price)
 
-        if max_price:
-            query = query.filter(DVFTransaction.valeur_fonciere <= max_price)
+def nearby_query(columns: list, backend: str, lat: float, lon: float,
+                 radius_m: Optional[float] = None, bbox: Optional[tuple] = None, **filters):
+    """Requête de GET /transactions/nearby : filtres de transactions_query,
+    zone (cercle ou rectangle) et tri par distance au point"""
+    query = transactions_query(columns, **filters).order_by(None)
+
+    if backend == 'postgis':
+        geom = literal_column('dvf_transactions.geom')
+        point = func.geography(func.ST_SetSRID(func.ST_MakePoint(lon, lat), 4326))
+        distance = func.ST_Distance(geom, point)
+        if bbox:
+            area = geom.op('&&')(func.geography(func.ST_MakeEnvelope(*bbox, 4326)))
+        else:
+            area = func.ST_DWithin(geom, point, radius_m)
+        # Tri KNN servi par l'index GiST
+        order = geom.op('<->')(point)
+    else:
+        bounds = bbox or bbox_around(lat, lon, radius_m)
+        min_lon, min_lat, max_lon, max_lat = bounds
+        distance = haversine_m(DVFTransaction.latitude, DVFTransaction.longitude, lat, lon)
+        area = and_(
+            # Plages de cellules (index idx_dvf_geo_cell), puis filtre exact
+            or_(*[DVFTransaction.geo_cell.between(start, end - 1) for start, end in cover_ranges(bounds)]),
+            DVFTransaction.latitude.between(min_lat, max_lat),
+            DVFTransaction.longitude.between(min_lon, max_lon),
+        )
+        if not bbox:
+            area = and_(area, distance <= radius_m)
+        order = distance
+
+    return query.add_columns(distance.label('distance_m')).where(area).order_by(order, DVFTransaction.id)
+
+
+@router.get("/nearby", response_model=None)
+async def get_nearby_transactions(
+    lat: Optional[float] = Query(None, ge=-90, le=90),
+    lon: Optional[float] = Query(None, ge=-180, le=180),
+    radius_m: float = Query(1000, gt=0, le=50000),
+    bbox: Optional[str] = Query(None, description="min_lon,min_lat,max_lon,max_lat (remplace lat/lon/radius_m)"),
+    code_commune: Optional[str] = None,
+    type_local: Optional[str] = None,
+    date_start: Optional[date] = None,
+    date_end: Optional[date] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    limit: int = Query(100, le=1000),
+    fields: Optional[str] = Query(None, description=f"Jeux de champs en plus de base: {', '.join(TRANSACTION_FIELD_SETS)}"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: UserResponse = Depends(get_current_user)
+):
+    """Transactions autour d'un point (rayon en mètres) ou dans un rectangle
+
+    Résultats triés par distance au point (au centre du rectangle en mode
+    bbox), avec les mêmes filtres que GET /transactions.
+    """
+    try:
+        selected = _selected_fields(fields)
+        names = list(selected) + ['distance_m']
+
+        bounds = None
+        if bbox:
+            try:
+                bounds = parse_bbox(bbox)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            lon, lat = (bounds[0] + bounds[2]) / 2, (bounds[1] + bounds[3]) / 2
+        elif lat is None or lon is None:
+            raise HTTPException(status_code=400, detail="lat et lon (ou bbox) sont requis")
+
+        query = nearby_query(
+            [getattr(DVFTransaction, column) for column in selected.values()],
+            await spatial_backend(db), lat, lon, radius_m=radius_m, bbox=bounds,
+            code_commune=code_commune, type_local=type_local, date_start=date_start,
+            date_end=date_end, min_price=min_price, max_price=max_price
+        )
+
+        rows = (await db.execute(query.limit(limit))).all()
+        transactions = [_row_to_dict(row, names) for row in rows]
+        for transaction in transactions:
+            transaction['distance_m'] = round(transaction['distance_m'], 1)
+        return JSONResponse(content=transactions)
+
+    except HTTPException:
+        raise
 
-        transactions = query.order_by(
-            DVFTransaction.date_mutation.desc()
-        ).limit(limit).all()
-        
-        return [TransactionResponse.model_validate(t) for t in transactions]
-        
     except Exception as e:
         logger.error(f"Erreur: {e}")
-        raise HTTPException(status_code=500, detail="Erreur lors de la récupération des transactions")
+        raise HTTPException(status_code=500, detail="Erreur lors de la recherche géographique")
+
+
+async def investment_opportunities(db: AsyncSession, budget_max: float, type_local: str,
+                             prix_m2_max: Optional[float]) -> dict:
+    """Communes les moins chères au m² pour un budget
+
+    Un budget égal à un plafond du cube (BUDGET_CAPS) est lu dans le cube
+    précalculé ; les autres budgets sont calculés directement sur les ventes
+    <= budget. `criteria.budget_palier` indique le plafond utilisé (None
+    pour la requête directe).
+    """
+    palier = budget_cap(budget_max)
+    commune_stats = CUBE_COMMUNE_STATS_SQL if palier is not None else LIVE_COMMUNE_STATS_SQL
+
+    query = sqlalchemy.text(f"""
+        WITH commune_stats AS ({commune_stats})
+        SELECT 
+            cs.code_insee,
+            round(cs.prix_m2_moyen::numeric, 2) as prix_m2_moyen,
+            cs.nb_transactions,
+            round(cs.prix_median::numeric, 2) as prix_median,
+            round(cs.prix_m2_median::numeric, 2) as prix_m2_median,
+            cs.budget_max as budget_palier
+        FROM commune_stats cs
+        WHERE cs.prix_m2_moyen <= :prix_m2_max
+        AND cs.prix_m2_moyen >= (SELECT PERCENTILE_CONT(0.05) WITHIN GROUP (ORDER BY prix_m2_moyen) FROM commune_stats)
+        ORDER BY cs.prix_m2_moyen ASC
+        LIMIT 5;
+    """)
+
+    # Paramètres de la requête
+    params = {
+        'type_local': type_local,
+        'budget_max': budget_max,
+        'budget_palier': palier,
+        'min_transactions': CUBE_MIN_TRANSACTIONS,
+        # 'date_start': datetime.now() - timedelta(days=365),
+        'prix_m2_max': budget_max / 50 if not(prix_m2_max) else prix_m2_max  # Exemple de calcul
+    }
+
+    logger.info(f"Executing investment opportunities query with params: {params}")
+    
+    result = await db.execute(query, params)
+    opportunities = result.fetchall()
+
+    logger.info(f"Found {len(opportunities)} investment opportunities")
+    print(opportunities)
+
+    # Nom, population et coordonnées depuis le registre en mémoire (sans jointure)
+    registry = await get_registry(db)
+    communes = [registry.get(row[0]) or {} for row in opportunities]
+    return {
+        'criteria': {
+            'budget_max': budget_max,
+            'm2_max': params['prix_m2_max'],
+            'type_local': type_local,
+            'budget_palier': palier
+        },
+        'opportunities': [
+            {
+                'nom_commune': commune.get('nom'),
+                'prix_m2_moyen': row[1] if row[1] else 0,
+                'nb_transactions': int(row[2]),
+                'prix_median': row[3] if row[3] else 0,
+                'prix_m2_median': row[4] if row[3] else 0,
+                'population': commune.get('population') or 0,
+                'lat': commune.get('latitude'),
+                'lon': commune.get('longitude'),
+                'ratio_prix_budget': round((float(row[3]) / budget_max * 100), 2) if row[3] else 0,
+                'ratio_prix_m2_budget': round((float(row[4]) / params['prix_m2_max'] * 100), 2) if row[4] else 0
+            }
+            for row, commune in zip(opportunities, communes)
+        ],
+        'meta': {
+            'total_found': len(opportunities)
+        }
+    }
+
+
+def _stamp_search_date(content: dict) -> dict:
+    """Date de la recherche, ajoutée à chaque réponse (hors cache)"""
+    now = datetime.now().isoformat()
+    return {
+        **content,
+        'criteria': {**content['criteria'], 'date_recherche': now},
+        'meta': {**content['meta'], 'query_date': now}
+    }
 
 
 @router.get("/investment-opportunities")
 async def get_investment_opportunities(
+    request: Request,
     budget_max: float,
     type_local: str = "Appartement",
     prix_m2_max: float = None,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     current_user: UserResponse = Depends(get_current_user)
 ):
-    """Opportunités d'investissement"""
+    """Opportunités d'investissement
 
-    try:
-        # Validation des paramètres
-        if budget_max <= 0:
-            raise HTTPException(status_code=400, detail="Le budget doit être positif")
-        
-        # Requête complexe pour identifier les opportunités
-        query = sqlalchemy.text("""
-            WITH commune_stats AS (
-                SELECT 
-                    code_commune,
-                    commune,
-                    LPAD(code_departement::text, 2, '0') || LPAD(code_commune::text, 3, '0') as code_com,
-                    AVG(prix_m2) as prix_m2_moyen,
-                    COUNT(*) as nb_transactions,
-                    PERCENTILE_CONT(0.5) WITHIN GROUP (ORDER BY valeur_fonciere) as prix_median,
-                    PERCENTILE_CONT(0.5) WITHIN GROUP (ORDER BY prix_m2) as prix_m2_median
-                FROM dvf_transactions
-                WHERE type_local = :type_local
-                AND valeur_fonciere <= :budget_max
-                AND surface_reelle_bati > 0
-                AND valeur_fonciere > 0
-                GROUP BY code_commune, commune, code_com
-                HAVING COUNT(*) >= 5
-            )
-            SELECT 
-                c.nom,
-                round(cs.prix_m2_moyen::numeric, 2) as prix_m2_moyen,
-                cs.nb_transactions,
-                round(cs.prix_median::numeric, 2) as prix_median,
-                round(cs.prix_m2_median::numeric, 2) as prix_m2_median,
-                COALESCE(c.population, 0) as population,
-                c.latitude, c.longitude 
-            FROM commune_stats cs
-            LEFT JOIN communes c ON cs.code_com = c.code
-            WHERE cs.prix_m2_moyen <= :prix_m2_max
-            AND cs.prix_m2_moyen >= (SELECT PERCENTILE_CONT(0.05) WITHIN GROUP (ORDER BY prix_m2_moyen) FROM commune_stats)
-            ORDER BY cs.prix_m2_moyen ASC
-            LIMIT 5;
-        """)
-
-        # Paramètres de la requête
-        params = {
-            'type_local': type_local,
-            'budget_max': budget_max,
-            # 'date_start': datetime.now() - timedelta(days=365),
-            'prix_m2_max': budget_max / 50 if not(prix_m2_max) else prix_m2_max  # Exemple de calcul
-        }
+    Statistiques sur les ventes <= budget_max : lues dans le cube précalculé
+    si budget_max est l'un des plafonds (25000, 50000, ... 5000000), calculées
+    directement sinon. `criteria.budget_palier` indique le plafond utilisé.
+    """
 
-        logger.info(f"Executing investment opportunities query with params: {params}")
-        
-        result = db.execute(query, params)
-        opportunities = result.fetchall()
-
-        logger.info(f"Found {len(opportunities)} investment opportunities")
-        print(opportunities)
-        return {
-            'criteria': {
-                'budget_max': budget_max,
-                'm2_max': params['prix_m2_max'],
-                'type_local': type_local,
-                'date_recherche': datetime.now().isoformat()
-            },
-            'opportunities': [
-                {
-                    'nom_commune': row[0],
-                    'prix_m2_moyen': row[1] if row[1] else 0,
-                    'nb_transactions': int(row[2]),
-                    'prix_median': row[3] if row[3] else 0,
-                    'prix_m2_median': row[4] if row[3] else 0,
-                    'population': int(row[5]) if row[4] else 0,
-                    'lat': row[6],
-                    'lon': row[7],
-                    'ratio_prix_budget': round((float(row[3]) / budget_max * 100), 2) if row[3] else 0,
-                    'ratio_prix_m2_budget': round((float(row[4]) / params['prix_m2_max'] * 100), 2) if row[4] else 0
-                }
-                for row in opportunities
-            ],
-            'meta': {
-                'total_found': len(opportunities),
-                'query_date': datetime.now().isoformat()
-            }
-        }
+    # Validation des paramètres
+    if budget_max <= 0:
+        raise HTTPException(status_code=400, detail="Le budget doit être positif")
+
+    try:
+        return await cached_json(
+            request, db, 'investment_opportunities',
+            {'budget_max': budget_max, 'type_local': type_local, 'prix_m2_max': prix_m2_max},
+            lambda: investment_opportunities(db, budget_max, type_local, prix_m2_max),
+            stamp=_stamp_search_date
+        )
 
     except sqlalchemy.exc.SQLAlchemyError as e:
         logger.error(f"Database error in get_investment_opportunities: {e}")
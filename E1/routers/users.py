@@ -5,7 +5,7 @@ from sqlalchemy.orm import Session
 from database import get_db
 from schemas import UserCreate, UserUpdate, UserResponse, UserChangePassword
 from crud.users_crud import get_user_crud
-from utils.auth import get_current_user, get_current_admin_user
+from utils.auth import get_current_user, get_current_admin_user, run_in_hash_pool
 
 router = APIRouter(
     prefix="/users",
@@ -34,7 +34,8 @@ async def create_user(
     """Créer un nouvel utilisateur (Admin seulement)"""
     user_crud = get_user_crud(db)
     try:
-        db_user = user_crud.create_user(user)
+        # Hachage bcrypt dans le pool borné, hors de la boucle d'événements
+        db_user = await run_in_hash_pool(user_crud.create_user, user)
         return db_user
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -74,7 +75,8 @@ async def change_current_user_password(
 ):
     """Change le mot de passe de l'utilisateur actuel"""
     user_crud = get_user_crud(db)
-    success = user_crud.change_password(
+    success = await run_in_hash_pool(
+        user_crud.change_password,
         current_user.id,
         password_change.current_password,
         password_change.new_password
@@ -26,7 +26,58 @@ class TransactionResponse(BaseModel):
                 return None
             return float(v)
         return v
-        
+
+
+# Jeux de champs de GET /transactions (?fields=) : nom exposé -> colonne de
+# dvf_transactions. "base" correspond à TransactionResponse et est toujours inclus.
+TRANSACTION_FIELD_SETS = {
+    'base': {
+        'id': 'id',
+        'date_mutation': 'date_mutation',
+        'valeur_fonciere': 'valeur_fonciere',
+        'code_commune': 'code_commune',
+        'nom_commune': 'commune',
+        'type_local': 'type_local',
+        'surface_reelle_bati': 'surface_reelle_bati',
+        'nombre_pieces': 'nombre_pieces_principales',
+    },
+    'mutation': {
+        'nature_mutation': 'nature_mutation',
+        'no_disposition': 'no_disposition',
+        'prix_m2': 'prix_m2',
+    },
+    'adresse': {
+        'no_voie': 'no_voie',
+        'btq': 'btq',
+        'type_de_voie': 'type_de_voie',
+        'voie': 'voie',
+        'code_postal': 'code_postal',
+        'code_departement': 'code_departement',
+        'code_insee': 'code_insee',
+    },
+    'geo': {
+        'longitude': 'longitude',
+        'latitude': 'latitude',
+    },
+    'cadastre': {
+        'prefixe_de_section': 'prefixe_de_section',
+        'section': 'section',
+        'no_plan': 'no_plan',
+        'no_volume': 'no_volume',
+    },
+    'lots': {
+        'nombre_lots': 'nombre_lots',
+        **{f'lot{i}_numero': f'lot{i}_numero' for i in range(1, 6)},
+        **{f'lot{i}_surface_carrez': f'lot{i}_surface_carrez' for i in range(1, 6)},
+    },
+    'terrain': {
+        'nature_culture': 'nature_culture',
+        'nature_culture_speciale': 'nature_culture_speciale',
+        'surface_terrain': 'surface_terrain',
+    },
+}
+
+
 class UserBase(BaseModel):
     username: str
     email: Optional[EmailStr] = None
@@ -0,0 +1,58 @@
+"""Configuration des tests : imports depuis E1, logs dans un dossier temporaire"""
+import os
+import sys
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault('SECRET_KEY', 'test')
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+from config import Config  # noqa: E402
+
+Config.LOGS_DIR = Path(tempfile.mkdtemp(prefix='api-logs-'))
+
+
+class StubServer:
+    """Serveur HTTP local : `handler(request)` retourne (statut, en-têtes, corps)"""
+
+    def __init__(self):
+        self.handler = None
+        self.requests = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub.requests.append(self)
+                status, headers, body = stub.handler(self)
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                if 'Content-Length' not in headers:
+                    self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stub_server():
+    with StubServer() as server:
+        yield server
@@ -0,0 +1,47 @@
+import asyncio
+import threading
+
+import pytest
+from fastapi import HTTPException
+
+from utils import auth
+
+
+def test_authentication_runs_in_hash_pool(monkeypatch):
+    threads = []
+
+    def fake_authenticate(db, username, password):
+        # Recherche et vérification ensemble, hors de la boucle d'événements
+        threads.append(threading.current_thread().name)
+        return username
+
+    monkeypatch.setattr(auth, 'authenticate_user', fake_authenticate)
+    assert asyncio.run(auth.authenticate_user_async(None, 'alice', 'secret')) == 'alice'
+    assert threads[0].startswith('bcrypt')
+
+
+def test_hash_pool_refuses_when_saturated(monkeypatch):
+    monkeypatch.setattr(auth.Config, 'LOGIN_QUEUE_TIMEOUT', 0.05)
+    monkeypatch.setattr(auth, '_hash_semaphore', asyncio.Semaphore(1))
+    release = threading.Event()
+
+    async def burst():
+        blocked = asyncio.ensure_future(auth.run_in_hash_pool(release.wait))
+        await asyncio.sleep(0.01)
+        try:
+            with pytest.raises(HTTPException) as error:
+                await auth.run_in_hash_pool(auth.get_password_hash, 'secret')
+        finally:
+            release.set()
+        await blocked
+        return error.value.status_code
+
+    assert asyncio.run(burst()) == 429
+
+
+def test_hash_pool_hashes_and_verifies():
+    async def round_trip():
+        hashed = await auth.run_in_hash_pool(auth.get_password_hash, 'secret')
+        return await auth.run_in_hash_pool(auth.verify_password, 'secret', hashed)
+
+    assert asyncio.run(round_trip())
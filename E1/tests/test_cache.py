@@ -0,0 +1,154 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from starlette.requests import Request
+
+from utils import cache
+from utils.cache import MemoryCache, bump_dataset_version, cache_key, set_cache
+from utils.http_cache import cached_json
+
+
+class FakeResult:
+    def __init__(self, value):
+        self.value = value
+
+    def scalar(self):
+        return self.value
+
+
+class FakeAsyncDB:
+    """Session async : SELECT version FROM dataset_versions"""
+
+    def __init__(self, version):
+        self.version = version
+
+    async def execute(self, statement, params=None):
+        return FakeResult(self.version)
+
+
+class FakeDB:
+    """Session synchrone : incrément de version dans dataset_versions"""
+
+    def __init__(self, store):
+        self.store = store
+
+    def execute(self, statement, params=None):
+        self.store.version += 1
+        return FakeResult(self.store.version)
+
+    def commit(self):
+        pass
+
+
+@pytest.fixture(autouse=True)
+def memory_cache():
+    set_cache(MemoryCache())
+    yield
+    set_cache(None)
+
+
+def make_request(etag=None):
+    headers = [(b'if-none-match', etag.encode())] if etag else []
+    return Request({'type': 'http', 'method': 'GET', 'path': '/', 'query_string': b'', 'headers': headers})
+
+
+def serve(db, params, calls, etag=None, stamp=None):
+    async def compute():
+        calls.append(params)
+        return {'params': params}
+
+    return asyncio.run(cached_json(make_request(etag), db, 'stats', params, compute, stamp=stamp))
+
+
+class ThreadRecordingCache(MemoryCache):
+    """Backend bloquant (comme Redis) : note le thread de chaque appel"""
+
+    blocking = True
+
+    def __init__(self):
+        super().__init__()
+        self.threads = []
+
+    def get(self, key):
+        self.threads.append(threading.get_ident())
+        return super().get(key)
+
+    def set(self, key, value, ttl=None):
+        self.threads.append(threading.get_ident())
+        super().set(key, value, ttl)
+
+
+def test_cache_key_ignores_order_blanks_and_padding():
+    assert cache_key('stats', {'a': ' 1', 'b': None, 'c': ''}, 1) == cache_key('stats', {'a': '1'}, 1)
+    assert cache_key('stats', {'a': 1, 'b': 2}, 1) == cache_key('stats', {'b': 2, 'a': 1}, 1)
+
+
+def test_cache_key_depends_on_version_and_namespace():
+    assert cache_key('stats', {'a': 1}, 1) != cache_key('stats', {'a': 1}, 2)
+    assert cache_key('stats', {'a': 1}, 1) != cache_key('market', {'a': 1}, 1)
+
+
+def test_cached_response_and_not_modified():
+    db, calls = FakeAsyncDB(1), []
+
+    first = serve(db, {'departement': '75'}, calls)
+    assert first.status_code == 200
+    etag = first.headers['etag']
+
+    assert serve(db, {'departement': '75'}, calls).body == first.body
+    assert serve(db, {'departement': '75'}, calls, etag=f"W/{etag}").status_code == 304
+    assert len(calls) == 1
+
+
+def test_version_bump_invalidates_cache_and_etag():
+    db, calls = FakeAsyncDB(1), []
+    etag = serve(db, {'departement': '75'}, calls).headers['etag']
+
+    bump_dataset_version(FakeDB(db))
+
+    response = serve(db, {'departement': '75'}, calls, etag=etag)
+    assert response.status_code == 200
+    assert response.headers['etag'] != etag
+    assert len(calls) == 2
+
+
+def test_version_is_reread_only_after_ttl(monkeypatch):
+    db, calls = FakeAsyncDB(1), []
+    etag = serve(db, {'departement': '75'}, calls).headers['etag']
+
+    # Version changée par un autre processus : lue après CACHE_VERSION_TTL
+    db.version = 2
+    assert serve(db, {'departement': '75'}, calls, etag=etag).status_code == 304
+
+    expired = time.monotonic() + cache.Config.CACHE_VERSION_TTL + 1
+    monkeypatch.setattr(cache.time, 'monotonic', lambda: expired)
+    assert serve(db, {'departement': '75'}, calls, etag=etag).status_code == 200
+
+
+def test_blocking_backend_is_called_off_the_event_loop():
+    backend = ThreadRecordingCache()
+    set_cache(backend)
+    db, calls = FakeAsyncDB(1), []
+
+    serve(db, {'departement': '75'}, calls)
+    serve(db, {'departement': '75'}, calls)
+
+    assert len(calls) == 1
+    assert len(backend.threads) == 3
+    assert threading.get_ident() not in backend.threads
+
+
+def test_stamp_is_applied_after_the_cache():
+    db, calls, stamps = FakeAsyncDB(1), [], iter(['t1', 't2'])
+
+    def stamp(content):
+        return {**content, 'date': next(stamps)}
+
+    first = serve(db, {'departement': '75'}, calls, stamp=stamp)
+    second = serve(db, {'departement': '75'}, calls, stamp=stamp)
+
+    assert first.body != second.body
+    assert b'"date":"t2"' in second.body
+    assert len(calls) == 1
@@ -0,0 +1,99 @@
+import io
+import json
+
+import pytest
+
+from utils import communes_loader
+from utils.communes_loader import commune_record, iter_json_array, load_communes
+
+COMMUNES = [
+    {'code': '01001', 'nom': "L'Abergement-Clémenciat", 'codeDepartement': '01', 'codeRegion': '84',
+     'population': 832, 'surface': 1565.2, 'centre': {'type': 'Point', 'coordinates': [4.9306, 46.1517]}},
+    {'code': '2A004', 'nom': 'Ajaccio', 'codeDepartement': '2A', 'codeRegion': '94',
+     'population': 71361, 'surface': 8203.77, 'centre': {'type': 'Point', 'coordinates': [8.7376, 41.9272]}},
+    {'code': '97101', 'nom': 'Les Abymes', 'codeDepartement': '971', 'codeRegion': '01'},
+]
+PAYLOAD = json.dumps(COMMUNES, ensure_ascii=False, indent=1).encode('utf-8')
+
+
+@pytest.mark.parametrize('chunk_size', [1, 2, 7, 64 * 1024])
+def test_iter_json_array_across_chunk_boundaries(chunk_size):
+    stream = io.StringIO(PAYLOAD.decode('utf-8'))
+    assert list(iter_json_array(stream, chunk_size=chunk_size)) == COMMUNES
+
+
+@pytest.mark.parametrize('chunk_size', [1, 3])
+def test_iter_json_array_numbers_split_by_a_chunk(chunk_size):
+    stream = io.StringIO('[12.5, -3e2, 7, 1000000]')
+    assert list(iter_json_array(stream, chunk_size=chunk_size)) == [12.5, -300.0, 7, 1000000]
+
+
+def test_iter_json_array_empty_array():
+    assert list(iter_json_array(io.StringIO(' [ ] '))) == []
+
+
+@pytest.mark.parametrize('document', ['{"code": "01001"}', '[{"code": "01001"}, {"code"', ''])
+def test_iter_json_array_rejects_invalid_documents(document):
+    with pytest.raises(ValueError):
+        list(iter_json_array(io.StringIO(document), chunk_size=4))
+
+
+def test_commune_record_without_centre():
+    record = commune_record(COMMUNES[2])
+    assert record['code_departement'] == '971'
+    assert (record['longitude'], record['latitude'], record['population']) == (None, None, None)
+
+
+class FakeDB:
+    def __init__(self):
+        self.commits = 0
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        pass
+
+
+@pytest.fixture
+def communes_api(tmp_path, stub_server, monkeypatch):
+    """API Géo locale et base simulée : hash stocké et lots upsertés"""
+    stub_server.handler = lambda request: (200, {'Content-Type': 'application/json'}, PAYLOAD)
+    monkeypatch.setattr(communes_loader.Config, 'COMMUNES_API_URL', f"{stub_server.url}/communes")
+    monkeypatch.setattr(communes_loader, 'COMMUNES_PAYLOAD_PATH', tmp_path / 'communes.json')
+
+    state = {'hash': None, 'batches': []}
+    monkeypatch.setattr(communes_loader, 'stored_payload_hash', lambda db: state['hash'])
+    monkeypatch.setattr(communes_loader, '_store_payload_hash', lambda db, value: state.update(hash=value))
+
+    def fake_upsert(db, records):
+        state['batches'].append([record['code'] for record in records])
+        return len(records), 0
+
+    monkeypatch.setattr(communes_loader, 'upsert_communes', fake_upsert)
+    return state
+
+
+def test_load_communes_in_batches_then_skips_unchanged_payload(communes_api):
+    db = FakeDB()
+
+    totals = load_communes(db, batch_size=2)
+    assert communes_api['batches'] == [['01001', '2A004'], ['97101']]
+    assert totals['rows'] == totals['inserted'] == 3
+    assert communes_api['hash'] is not None
+    assert db.commits == 1
+
+    totals = load_communes(db, batch_size=2)
+    assert totals['payload_unchanged']
+    assert len(communes_api['batches']) == 2
+    assert db.commits == 1
+
+
+def test_load_communes_force_reloads_unchanged_payload(communes_api):
+    db = FakeDB()
+    load_communes(db)
+
+    totals = load_communes(db, force=True)
+    assert not totals['payload_unchanged']
+    assert totals['rows'] == 3
+    assert len(communes_api['batches']) == 2
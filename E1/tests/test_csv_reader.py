@@ -0,0 +1,52 @@
+import pandas as pd
+import pytest
+
+from utils.bulk_loader import add_row_hashes, prepare_dvf_frame
+from utils.data_loader import DVF_DTYPES, load_csv_safe
+
+ROWS = [
+    {'Date mutation': '05/01/2023', 'Valeur fonciere': '150000,00', 'Code departement': '01',
+     'Code commune': '53', 'Section': 'AB', 'No plan': '12', '1er lot': '4',
+     'Surface Carrez du 1er lot': '45,30', 'Type local': 'Appartement', 'Surface reelle bati': '45'},
+    {'Date mutation': '06/01/2023', 'Valeur fonciere': '90000,00', 'Code departement': '2A',
+     'Code commune': '4', 'Section': 'C', 'No plan': '7', 'Surface terrain': '500'},
+]
+
+
+@pytest.fixture
+def dvf_file(tmp_path):
+    path = tmp_path / 'dvf.txt'
+    columns = list(DVF_DTYPES)
+    lines = ['|'.join(columns)] + ['|'.join(row.get(column, '') for column in columns) for row in ROWS]
+    path.write_text('\n'.join(lines) + '\n', encoding='utf-8')
+    return path
+
+
+def read(path, engine):
+    chunks = load_csv_safe(str(path), chunksize=1000, sep='|', decimal=',', dtype=DVF_DTYPES, engine=engine)
+    return pd.concat(list(chunks), ignore_index=True)
+
+
+def test_pyarrow_keeps_missing_text_values_null(dvf_file):
+    frame = read(dvf_file, 'pyarrow')
+
+    assert frame['1er lot'].isna().tolist() == [False, True]
+    assert frame['Voie'].isna().all()
+    assert not frame.isin(['None', 'nan']).any().any()
+
+
+def test_readers_produce_the_same_row_keys(dvf_file):
+    hashes = {
+        engine: add_row_hashes(prepare_dvf_frame(read(dvf_file, engine)))[['mutation_key', 'row_hash']]
+        for engine in ('c', 'pyarrow')
+    }
+    pd.testing.assert_frame_equal(hashes['c'], hashes['pyarrow'])
+
+
+def test_pyarrow_returns_declared_dtypes(dvf_file):
+    frame = read(dvf_file, 'pyarrow')
+
+    assert isinstance(frame['Type local'].dtype, pd.CategoricalDtype)
+    assert frame['Nombre de lots'].dtype == 'Int16'
+    assert frame['Surface Carrez du 1er lot'].dtype == 'float32'
+    assert frame['Code commune'].tolist() == ['53', '4']
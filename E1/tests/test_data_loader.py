@@ -0,0 +1,75 @@
+import json
+
+import pytest
+
+from utils.data_loader import download_file
+
+CONTENT = bytes(range(256)) * 64
+ETAG = '"v2"'
+
+
+def dvf_endpoint(request):
+    """Fichier distant avec ETag : 304, 206 (Range + If-Range), 416 ou 200"""
+    if request.headers.get('If-None-Match') == ETAG:
+        return 304, {'ETag': ETAG}, b''
+
+    range_header = request.headers.get('Range')
+    if range_header and request.headers.get('If-Range') == ETAG:
+        start = int(range_header.split('=')[1].rstrip('-'))
+        if start >= len(CONTENT):
+            return 416, {'Content-Range': f"bytes */{len(CONTENT)}"}, b''
+        return 206, {
+            'ETag': ETAG,
+            'Content-Range': f"bytes {start}-{len(CONTENT) - 1}/{len(CONTENT)}",
+        }, CONTENT[start:]
+
+    return 200, {'ETag': ETAG}, CONTENT
+
+
+@pytest.fixture
+def target(tmp_path, stub_server):
+    stub_server.handler = dvf_endpoint
+    return tmp_path / 'dvf.zip'
+
+
+def write_partial(target, data: bytes, etag: str) -> None:
+    target.with_name(target.name + '.part').write_bytes(data)
+    target.with_name(target.name + '.meta.json').write_text(json.dumps({'partial_etag': etag}))
+
+
+def test_download_then_not_modified(target, stub_server):
+    download_file(f"{stub_server.url}/dvf.zip", str(target))
+    assert target.read_bytes() == CONTENT
+
+    download_file(f"{stub_server.url}/dvf.zip", str(target))
+    assert stub_server.requests[-1].headers['If-None-Match'] == ETAG
+    assert target.read_bytes() == CONTENT
+
+
+def test_resume_from_partial_file(target, stub_server):
+    write_partial(target, CONTENT[:5000], ETAG)
+
+    download_file(f"{stub_server.url}/dvf.zip", str(target))
+
+    assert stub_server.requests[-1].headers['Range'] == 'bytes=5000-'
+    assert target.read_bytes() == CONTENT
+    assert not target.with_name('dvf.zip.part').exists()
+
+
+def test_changed_remote_file_restarts_with_full_download(target, stub_server):
+    # If-Range ne correspond plus : le serveur renvoie le fichier entier (200)
+    write_partial(target, b'x' * 5000, '"v1"')
+
+    download_file(f"{stub_server.url}/dvf.zip", str(target))
+
+    assert target.read_bytes() == CONTENT
+
+
+def test_unsatisfiable_range_discards_partial_file(target, stub_server):
+    write_partial(target, CONTENT + b'stale', ETAG)
+
+    download_file(f"{stub_server.url}/dvf.zip", str(target))
+
+    assert [request.headers.get('Range') for request in stub_server.requests] == [f"bytes={len(CONTENT) + 5}-", None]
+    assert target.read_bytes() == CONTENT
+    assert not target.with_name('dvf.zip.part').exists()
@@ -0,0 +1,19 @@
+import pandas as pd
+
+from utils.bulk_loader import insee_codes
+
+
+def test_insee_codes_pad_metropolitan_and_overseas_codes():
+    departements = pd.Series(['6', '75', '2A', '971', '01'])
+    communes = pd.Series(['123', '56', '4', '101', '1'])
+    assert insee_codes(departements, communes).tolist() == ['06123', '75056', '2A004', '97101', '01001']
+
+
+def test_insee_codes_from_numeric_columns():
+    # Codes relus comme nombres (ex: 6.0) par un lecteur CSV sans dtype
+    assert insee_codes(pd.Series([6.0, 13.0]), pd.Series([123.0, 55.0])).tolist() == ['06123', '13055']
+
+
+def test_insee_codes_missing_values_stay_null():
+    codes = insee_codes(pd.Series(['75', None]), pd.Series([None, '056']))
+    assert codes.tolist() == [None, None]
@@ -0,0 +1,22 @@
+from datetime import date
+
+import pytest
+
+from utils.pagination import decode_cursor, encode_cursor
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor(date(2023, 7, 14), 123456)
+    assert decode_cursor(cursor) == (date(2023, 7, 14), 123456)
+
+
+def test_cursor_is_url_safe_without_padding():
+    cursor = encode_cursor(date(2023, 1, 1), 1)
+    assert '=' not in cursor
+    assert set(cursor) <= set('ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_')
+
+
+@pytest.mark.parametrize('cursor', ['', 'not-a-cursor', encode_cursor(date(2023, 1, 1), 1)[:-3], 'WyJ4Il0'])
+def test_invalid_cursor_raises_value_error(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
@@ -0,0 +1,60 @@
+import zipfile
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pytest
+
+from utils import parquet_stage
+from utils.data_loader import DVF_DTYPES
+from utils.parquet_stage import PARTITIONING, build_stage, iter_stage, stage_schema
+
+ROWS = [
+    {'Date mutation': '03/01/2023', 'Nature mutation': 'Vente', 'Valeur fonciere': '185000,50',
+     'Code departement': '75', 'Code commune': '112', 'Type local': 'Appartement',
+     'Surface reelle bati': '45,3', 'Nombre pieces principales': '2', 'Nombre de lots': '1'},
+    {'Date mutation': '15/06/2022', 'Nature mutation': 'Vente', 'Valeur fonciere': '',
+     'Code departement': '2A', 'Code commune': '004', 'Type local': 'Maison',
+     'Surface reelle bati': '120', 'Nombre pieces principales': '', 'Nombre de lots': '0'},
+]
+
+
+@pytest.fixture
+def archive(tmp_path, monkeypatch):
+    monkeypatch.setattr(parquet_stage, 'STAGE_DIR', tmp_path / 'dvf_parquet')
+    header = list(DVF_DTYPES)
+    lines = ['|'.join(header)] + ['|'.join(row.get(column, '') for column in header) for row in ROWS]
+
+    path = tmp_path / 'dvf.zip'
+    with zipfile.ZipFile(path, 'w') as zip_file:
+        zip_file.writestr('valeursfoncieres.txt', '\n'.join(lines) + '\n')
+    return path
+
+
+def test_stage_files_are_typed(archive):
+    assert build_stage(archive) is True
+
+    dataset = ds.dataset(parquet_stage.STAGE_DIR, format='parquet', partitioning=PARTITIONING)
+    schema = dataset.schema
+    assert schema.field('Valeur fonciere').type == pa.float64()
+    assert schema.field('Surface reelle bati').type == pa.float64()
+    assert schema.field('Nombre pieces principales').type == pa.int64()
+    assert schema.field('Date mutation').type == pa.date32()
+    assert schema.field('Type local').type == pa.string()
+    assert set(stage_schema().names) == set(schema.names)
+
+    frame = next(iter_stage(years=[2023]))
+    row = frame.iloc[0]
+    assert row['Valeur fonciere'] == 185000.5
+    assert row['Surface reelle bati'] == 45.3
+    assert row['Nombre pieces principales'] == 2
+    assert row['Type local'] == 'Appartement'
+    assert row['departement'] == '75'
+
+    corse = next(iter_stage(departements=['2A']))
+    assert corse['Valeur fonciere'].isna().all()
+    assert corse['Nombre pieces principales'].isna().all()
+
+
+def test_stage_is_rebuilt_only_when_archive_changes(archive):
+    assert build_stage(archive) is True
+    assert build_stage(archive) is False
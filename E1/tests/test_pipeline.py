@@ -0,0 +1,94 @@
+import queue
+
+import pandas as pd
+import pytest
+
+from utils import pipeline
+from utils.pipeline import STAT_KEYS, IngestionPipeline
+
+
+def stats(rows: int) -> dict:
+    return {'rows': rows, 'inserted': rows, 'updated': 0, 'skipped': 0, 'duplicates': 0,
+            'missing_partition_key': 0, 'rows_per_second': 1000.0}
+
+
+class FullOnceQueue:
+    """File d'un writer pleine au premier envoi"""
+
+    def __init__(self):
+        self.items = []
+        self.full = True
+
+    def put(self, item, timeout=None):
+        if self.full:
+            self.full = False
+            raise queue.Full
+        self.items.append(item)
+
+
+class Process:
+    def __init__(self, alive=True):
+        self.alive = alive
+
+    def is_alive(self):
+        return self.alive
+
+
+def test_done_message_read_while_sending_is_counted():
+    # Le writer 1 termine pendant que l'on attend de pouvoir envoyer la
+    # sentinelle au writer 2 : son rapport doit être compté
+    results = queue.Queue()
+    results.put(('done', stats(10)))
+    totals = dict.fromkeys(STAT_KEYS, 0)
+    ingestion = IngestionPipeline(None)
+
+    inbox = FullOnceQueue()
+    ingestion._put(inbox, None, Process(), results, totals)
+
+    assert inbox.items == [None]
+    assert ingestion.finished_writers == 1
+    assert totals['rows'] == 10
+
+
+def test_dead_writer_is_reported():
+    with pytest.raises(RuntimeError, match="prématurément"):
+        IngestionPipeline(None)._put(FullOnceQueue(), None, Process(alive=False), queue.Queue(),
+                                     dict.fromkeys(STAT_KEYS, 0))
+
+
+def test_writer_error_is_raised():
+    results = queue.Queue()
+    results.put(('error', 'connexion perdue'))
+
+    with pytest.raises(RuntimeError, match="connexion perdue"):
+        IngestionPipeline(None)._report(results, dict.fromkeys(STAT_KEYS, 0))
+
+
+def fake_writer(inbox, results):
+    """Writer sans base : même protocole que pipeline._writer"""
+    totals = dict.fromkeys(STAT_KEYS, 0)
+    while True:
+        frame = inbox.get()
+        if frame is None:
+            break
+        results.put(('chunk', stats(len(frame))))
+        totals['rows'] += len(frame)
+        totals['inserted'] += len(frame)
+    results.put(('done', totals))
+
+
+def identity(df, bounds):
+    return df
+
+
+def test_run_counts_every_row(monkeypatch):
+    monkeypatch.setattr(pipeline, '_writer', fake_writer)
+    chunks = [
+        pd.DataFrame({'Date mutation': ['2023-01-05'] * 50, 'Valeur fonciere': range(start, start + 50)})
+        for start in range(0, 1000, 50)
+    ]
+
+    totals = IngestionPipeline(identity, workers=2, writers=3, queue_size=1).run(iter(chunks))
+
+    assert totals == {'rows': 1000, 'inserted': 1000, 'updated': 0, 'skipped': 0,
+                      'duplicates': 0, 'missing_partition_key': 0}
@@ -0,0 +1,107 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+
+pytest.importorskip('aiosqlite')  # moteur asynchrone de DATABASE_URL=sqlite:// en test
+
+import async_database  # noqa: E402
+
+
+class FakeResult:
+    def __init__(self, value):
+        self.value = value
+
+    def scalar(self):
+        return self.value
+
+
+class FakeReplica:
+    """Moteur de réplique : retard fixé, panne ou lenteur simulées"""
+
+    def __init__(self, lag=0.0, error=None, delay=0.0):
+        self.lag = lag
+        self.error = error
+        self.delay = delay
+        self.checks = 0
+
+    @asynccontextmanager
+    async def connect(self):
+        self.checks += 1
+        if self.error:
+            raise self.error
+        await asyncio.sleep(self.delay)
+        yield self
+
+    async def execute(self, statement):
+        return FakeResult(self.lag)
+
+
+def session_factory(name):
+    @asynccontextmanager
+    async def factory():
+        yield name
+    return factory
+
+
+@pytest.fixture
+def replica(monkeypatch):
+    def configure(**kwargs):
+        engine = FakeReplica(**kwargs)
+        monkeypatch.setattr(async_database, 'replica_engine', engine)
+        return engine
+
+    monkeypatch.setattr(async_database, '_replica_state',
+                        {'checked_at': None, 'usable': None, 'lag_s': None, 'error': None})
+    monkeypatch.setattr(async_database, 'ReplicaSessionLocal', session_factory('replica'))
+    monkeypatch.setattr(async_database, 'AsyncSessionLocal', session_factory('primary'))
+    monkeypatch.setattr(async_database.Config, 'REPLICA_MAX_LAG', 5)
+    monkeypatch.setattr(async_database.Config, 'REPLICA_CHECK_INTERVAL', 60)
+    monkeypatch.setattr(async_database.Config, 'REPLICA_CHECK_TIMEOUT', 0.05)
+    return configure
+
+
+def read_session():
+    async def first():
+        generator = async_database.get_read_db()
+        db = await generator.__anext__()
+        await generator.aclose()
+        return db
+    return asyncio.run(first())
+
+
+def test_reads_go_to_replica_within_lag(replica):
+    replica(lag=1.5)
+    assert read_session() == 'replica'
+    assert async_database.replica_status() == {'configured': True, 'usable': True, 'lag_s': 1.5, 'error': None}
+
+
+def test_lagging_replica_falls_back_to_primary(replica):
+    replica(lag=30)
+    assert read_session() == 'primary'
+    assert async_database.replica_status()['lag_s'] == 30
+
+
+def test_unreachable_replica_falls_back_to_primary(replica):
+    replica(error=OSError('connection refused'))
+    assert read_session() == 'primary'
+    assert async_database.replica_status()['error'] == 'connection refused'
+
+
+def test_slow_replica_check_falls_back_to_primary(replica):
+    replica(delay=1)
+    assert read_session() == 'primary'
+    assert async_database.replica_status()['error'] == 'timeout'
+
+
+def test_replica_is_checked_once_per_interval(replica):
+    engine = replica(lag=0)
+    for _ in range(3):
+        assert read_session() == 'replica'
+    assert engine.checks == 1
+
+
+def test_without_replica_reads_go_to_primary(replica, monkeypatch):
+    monkeypatch.setattr(async_database, 'replica_engine', None)
+    assert read_session() == 'primary'
+    assert async_database.replica_status() == {'configured': False}
@@ -0,0 +1,74 @@
+import os
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from utils.stats_cube import (
+    BUDGET_CAPS, CUBE_COMMUNE_STATS_SQL, CUBE_MIN_TRANSACTIONS, LIVE_COMMUNE_STATS_SQL,
+    budget_cap, commune_stats_cube_sql
+)
+
+
+@pytest.mark.parametrize('budget', [25000, 50000.0, 1500000, 5000000])
+def test_budget_equal_to_a_cap_uses_the_cube(budget):
+    assert budget_cap(budget) == budget
+
+
+@pytest.mark.parametrize('budget', [BUDGET_CAPS[0] - 1, 49999, 1999999, 4999999, 10000000])
+def test_other_budgets_are_not_rounded(budget):
+    assert budget_cap(budget) is None
+
+
+def test_cube_sql_emits_one_tuple_per_cap():
+    sql = commune_stats_cube_sql([100, 200])
+    assert 'WHEN t.valeur_fonciere <= 100 THEN 1' in sql
+    assert '(200, g.n_2, g.moyenne_m2_2, g.mediane_2, g.mediane_m2_2)' in sql
+    assert 'unnest' not in sql
+
+
+@pytest.fixture
+def postgres():
+    url = os.getenv('DATABASE_URL', '')
+    if not url.startswith('postgresql'):
+        pytest.skip("DATABASE_URL PostgreSQL requise")
+    engine = create_engine(url)
+    with engine.connect() as connection:
+        yield connection
+        connection.rollback()
+    engine.dispose()
+
+
+def test_cube_matches_live_query_at_a_cap(postgres):
+    # Tables temporaires : masquent les tables de la base pendant le test
+    postgres.execute(text("""
+        CREATE TEMP TABLE dvf_transactions (
+            code_insee varchar(5), type_local varchar, valeur_fonciere float8,
+            surface_reelle_bati float8, prix_m2 float8
+        ) ON COMMIT DROP
+    """))
+    postgres.execute(text("""
+        CREATE TEMP TABLE commune_stats_cube (
+            code_insee varchar(5), type_local varchar, budget_max float8, nb_transactions integer,
+            prix_m2_moyen float8, prix_median float8, prix_m2_median float8, created_at timestamp
+        ) ON COMMIT DROP
+    """))
+    postgres.execute(text("""
+        INSERT INTO dvf_transactions
+        SELECT lpad((i % 40)::text, 5, '0'), CASE WHEN i % 3 = 0 THEN 'Maison' ELSE 'Appartement' END,
+               v, s, CASE WHEN i % 17 = 0 THEN NULL ELSE round((v / s)::numeric, 2) END
+        FROM generate_series(1, 4000) AS i,
+             LATERAL (SELECT (i * 7919 % 3000) * 500 + 1000 AS v, 20 + i % 130 AS s) AS x
+    """))
+    postgres.execute(text(commune_stats_cube_sql()), {'min_transactions': CUBE_MIN_TRANSACTIONS})
+
+    columns = "code_insee, nb_transactions, prix_m2_moyen, prix_median, prix_m2_median"
+    for type_local in ('Maison', 'Appartement'):
+        params = {'type_local': type_local, 'budget_max': 500000, 'budget_palier': 500000,
+                  'min_transactions': CUBE_MIN_TRANSACTIONS}
+        cube = postgres.execute(text(f"SELECT {columns} FROM ({CUBE_COMMUNE_STATS_SQL}) s ORDER BY 1"), params).all()
+        live = postgres.execute(text(f"SELECT {columns} FROM ({LIVE_COMMUNE_STATS_SQL}) s ORDER BY 1"), params).all()
+
+        assert cube and len(cube) == len(live)
+        for cube_row, live_row in zip(cube, live):
+            assert cube_row[:2] == live_row[:2]
+            assert cube_row[2:] == pytest.approx(live_row[2:], rel=1e-9)
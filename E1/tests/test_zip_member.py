@@ -0,0 +1,44 @@
+import zipfile
+
+import pytest
+
+from utils import data_loader
+from utils.data_loader import open_zip_member
+
+
+@pytest.fixture
+def archive(tmp_path):
+    path = tmp_path / 'dvf.zip'
+    with zipfile.ZipFile(path, 'w') as zip_file:
+        zip_file.writestr('valeursfoncieres-2023.txt', 'a|b\n1|2\n')
+    return path
+
+
+@pytest.fixture
+def opened_archives(monkeypatch):
+    """ZipFile ouverts par open_zip_member"""
+    archives = []
+
+    class TrackedZipFile(zipfile.ZipFile):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            archives.append(self)
+
+    monkeypatch.setattr(data_loader.zipfile, 'ZipFile', TrackedZipFile)
+    return archives
+
+
+def test_reads_first_member_and_closes_archive(archive, opened_archives):
+    with open_zip_member(archive) as stream:
+        assert stream.read() == b'a|b\n1|2\n'
+
+    assert stream.closed
+    assert opened_archives[0].fp is None
+
+
+def test_missing_member_closes_archive(archive, opened_archives):
+    with pytest.raises(KeyError):
+        with open_zip_member(archive, member='absent.txt'):
+            pass
+
+    assert opened_archives[0].fp is None
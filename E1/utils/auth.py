@@ -1,21 +1,72 @@
 # auth.py
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
 from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from database import get_db
 from models import User
 from config import Config
 from schemas import TokenData
 from crud.users_crud import UserCRUD
+from utils.cache import MemoryCache
 
 # Contexte de cryptage
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 security = HTTPBearer()
 
+# bcrypt libère le GIL : un petit pool de threads suffit à sortir le hachage
+# de la boucle d'événements ; le sémaphore borne les opérations bcrypt en attente
+_hash_executor = ThreadPoolExecutor(max_workers=Config.PASSWORD_HASH_WORKERS, thread_name_prefix='bcrypt')
+_hash_semaphore = asyncio.Semaphore(Config.MAX_CONCURRENT_LOGINS)
+
+
+@dataclass(frozen=True)
+class Principal:
+    """Utilisateur authentifié, détaché de la session (mis en cache)"""
+    id: int
+    username: str
+    email: Optional[str]
+    is_active: bool
+    is_admin: bool
+    created_at: datetime
+    last_login: Optional[datetime]
+    token_version: int
+
+    @classmethod
+    def from_user(cls, user: User) -> 'Principal':
+        return cls(
+            id=user.id,
+            username=user.username,
+            email=user.email,
+            is_active=user.is_active,
+            is_admin=user.is_admin,
+            created_at=user.created_at,
+            last_login=user.last_login,
+            token_version=user.token_version or 0
+        )
+
+
+# Utilisateurs résolus récemment, par (username, version du token)
+_principal_cache = MemoryCache(maxsize=Config.AUTH_CACHE_MAXSIZE, ttl=Config.AUTH_CACHE_TTL)
+
+
+def _principal_key(username: str, token_version: int) -> str:
+    return f"{username}:{token_version}"
+
+
+def invalidate_principal(username: str, token_version: int) -> None:
+    """Retire un utilisateur du cache (mot de passe, statut ou suppression)
+
+    Les autres processus de l'API le gardent au plus AUTH_CACHE_TTL secondes.
+    """
+    _principal_cache.delete(_principal_key(username, token_version))
+
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Crée un token d'accès JWT"""
@@ -39,6 +90,36 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+async def run_in_hash_pool(func, *args):
+    """Exécute `func` (hachage ou vérification bcrypt) dans le pool bcrypt
+
+    Au plus MAX_CONCURRENT_LOGINS opérations en parallèle ; au-delà de
+    LOGIN_QUEUE_TIMEOUT secondes d'attente, la requête est refusée (429).
+    """
+    try:
+        await asyncio.wait_for(_hash_semaphore.acquire(), timeout=Config.LOGIN_QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Trop de connexions simultanées, réessayez plus tard"
+        )
+
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_hash_executor, func, *args)
+    finally:
+        _hash_semaphore.release()
+
+
+async def authenticate_user_async(db: Session, username: str, password: str) -> Optional[User]:
+    """Authentifie un utilisateur sans bloquer la boucle d'événements
+
+    Recherche de l'utilisateur, vérification bcrypt et mise à jour de la
+    dernière connexion s'exécutent ensemble dans le pool bcrypt.
+    """
+    return await run_in_hash_pool(authenticate_user, db, username, password)
+
+
 def authenticate_user(db: Session, username: str, password: str) -> Optional[User]:
     """Authentifie un utilisateur avec le CRUD"""
     user_crud = UserCRUD(db)
@@ -63,10 +144,19 @@ def authenticate_user(db: Session, username: str, password: str) -> Optional[Use
 
 
 async def get_current_user(
+    request: Request,
     credentials: HTTPAuthorizationCredentials = Depends(security),
     db: Session = Depends(get_db)
-) -> User:
-    """Récupère l'utilisateur actuel à partir du token"""
+) -> Principal:
+    """Récupère l'utilisateur actuel à partir du token
+
+    Résolu au plus une fois par requête, puis servi depuis un cache court
+    tant que la version du token correspond à celle de l'utilisateur.
+    """
+    principal = getattr(request.state, 'principal', None)
+    if principal is not None:
+        return principal
+
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -85,26 +175,37 @@ async def get_current_user(
             raise credentials_exception
             
         token_data = TokenData(username=username)
-    except JWTError:
+        # Tokens émis avant l'introduction de la version : version 0
+        token_version = int(payload.get("ver", 0))
+    except (JWTError, TypeError, ValueError):
         raise credentials_exception
     
-    # Récupérer l'utilisateur avec le CRUD
-    user_crud = UserCRUD(db)
-    user = user_crud.get_user_by_username(token_data.username)
-    
-    if user is None:
-        raise credentials_exception
+    key = _principal_key(token_data.username, token_version)
+    principal = _principal_cache.get(key)
+
+    if principal is None:
+        # Récupérer l'utilisateur avec le CRUD
+        user_crud = UserCRUD(db)
+        user = user_crud.get_user_by_username(token_data.username)
+
+        if user is None or (user.token_version or 0) != token_version:
+            raise credentials_exception
+
+        principal = Principal.from_user(user)
+        if principal.is_active:
+            _principal_cache.set(key, principal)
     
-    if not user.is_active:
+    if not principal.is_active:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, 
             detail="Inactive user"
         )
     
-    return user
+    request.state.principal = principal
+    return principal
 
 
-async def get_current_admin_user(current_user: User = Depends(get_current_user)) -> User:
+async def get_current_admin_user(current_user: Principal = Depends(get_current_user)) -> Principal:
     """Vérifie que l'utilisateur actuel est admin"""
     if not current_user.is_admin:
         raise HTTPException(
@@ -114,7 +215,7 @@ async def get_current_admin_user(current_user: User = Depends(get_current_user))
     return current_user
 
 
-async def get_current_active_user(current_user: User = Depends(get_current_user)) -> User:
+async def get_current_active_user(current_user: Principal = Depends(get_current_user)) -> Principal:
     """Récupère l'utilisateur actuel actif"""
     if not current_user.is_active:
         raise HTTPException(
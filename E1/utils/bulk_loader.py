@@ -0,0 +1,311 @@
+# utils/bulk_loader.py
+import io
+import time
+import pandas as pd
+from sqlalchemy import Date, DateTime, Float, Integer, column, insert, table, text
+from sqlalchemy.orm import Session
+from models import DVFTransaction
+from utils.geo import geo_cells
+from utils.logger import get_logger
+from utils.partitioning import PARTITION_COLUMNS, ensure_partitions
+
+logger = get_logger(__name__)
+
+# Correspondance unique colonnes du fichier DVF -> colonnes de dvf_transactions
+DVF_COLUMN_MAPPING = {
+    'Identifiant de document': 'identifiant_document',
+    'Reference document': 'reference_document',
+    '1 Articles CGI': 'article_cgi_1',
+    '2 Articles CGI': 'article_cgi_2',
+    '3 Articles CGI': 'article_cgi_3',
+    '4 Articles CGI': 'article_cgi_4',
+    '5 Articles CGI': 'article_cgi_5',
+    'No disposition': 'no_disposition',
+    'Date mutation': 'date_mutation',
+    'Nature mutation': 'nature_mutation',
+    'Valeur fonciere': 'valeur_fonciere',
+    'Prix m2': 'prix_m2',
+    'No voie': 'no_voie',
+    'B/T/Q': 'btq',
+    'Type de voie': 'type_de_voie',
+    'Code voie': 'code_voie',
+    'Voie': 'voie',
+    'Code postal': 'code_postal',
+    'Commune': 'commune',
+    'Code departement': 'code_departement',
+    'Code commune': 'code_commune',
+    'Prefixe de section': 'prefixe_de_section',
+    'Section': 'section',
+    'No plan': 'no_plan',
+    'No Volume': 'no_volume',
+    '1er lot': 'lot1_numero',
+    'Surface Carrez du 1er lot': 'lot1_surface_carrez',
+    '2eme lot': 'lot2_numero',
+    'Surface Carrez du 2eme lot': 'lot2_surface_carrez',
+    '3eme lot': 'lot3_numero',
+    'Surface Carrez du 3eme lot': 'lot3_surface_carrez',
+    '4eme lot': 'lot4_numero',
+    'Surface Carrez du 4eme lot': 'lot4_surface_carrez',
+    '5eme lot': 'lot5_numero',
+    'Surface Carrez du 5eme lot': 'lot5_surface_carrez',
+    'Nombre de lots': 'nombre_lots',
+    'Code type local': 'code_type_local',
+    'Type local': 'type_local',
+    'Identifiant local': 'identifiant_local',
+    'Surface reelle bati': 'surface_reelle_bati',
+    'Nombre pieces principales': 'nombre_pieces_principales',
+    'Nature culture': 'nature_culture',
+    'Nature culture speciale': 'nature_culture_speciale',
+    'Surface terrain': 'surface_terrain',
+    'Longitude': 'longitude',
+    'Latitude': 'latitude',
+}
+
+# Colonnes entières de la table (pandas les lit en float à cause des NaN)
+DVF_INTEGER_COLUMNS = ['nombre_lots', 'nombre_pieces_principales']
+
+# Colonnes identifiant une ligne de mutation de façon stable d'un fichier à
+# l'autre : deux lignes réelles ne diffèrent souvent que par les lots, le
+# nombre de pièces ou la nature de culture spéciale
+DVF_NATURAL_KEY = [
+    'date_mutation', 'no_disposition', 'nature_mutation', 'valeur_fonciere',
+    'code_departement', 'code_commune', 'prefixe_de_section', 'section',
+    'no_plan', 'no_volume', 'no_voie', 'btq', 'code_voie',
+    'lot1_numero', 'lot2_numero', 'lot3_numero', 'lot4_numero', 'lot5_numero', 'nombre_lots',
+    'code_type_local', 'identifiant_local', 'surface_reelle_bati', 'nombre_pieces_principales',
+    'nature_culture', 'nature_culture_speciale', 'surface_terrain',
+]
+
+# Incrémentée à chaque changement de DVF_NATURAL_KEY ou de la normalisation
+# des valeurs hachées : init_db recalcule alors les clés des lignes existantes
+DVF_KEY_VERSION = 2
+
+# Colonne(s) de l'index unique utilisé pour l'upsert (une table partitionnée
+# impose d'y inclure les colonnes de partitionnement)
+DVF_CONFLICT_COLUMNS = ['mutation_key'] + PARTITION_COLUMNS
+
+STAGING_TABLE = 'dvf_staging'
+
+
+def insee_codes(departements: pd.Series, communes: pd.Series) -> pd.Series:
+    """Code INSEE sur 5 caractères à partir des codes département et commune DVF
+
+    Ex: ('6', '123') -> '06123', ('2A', '4') -> '2A004', ('971', '101') -> '97101'
+    """
+    def as_code(values):
+        return values.astype('string').str.strip().str.replace(r'\.0$', '', regex=True)
+
+    departement = as_code(departements)
+    commune = as_code(communes).str.zfill(3)
+
+    codes = departement.str.zfill(2) + commune
+    # Outre-mer : département sur 3 caractères, commune sur 2
+    overseas = departement.str.len() == 3
+    codes = codes.where(~overseas, departement + commune.str[-2:])
+    return codes.astype(object).where(codes.notna(), None)
+
+
+def prepare_dvf_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Renomme et ordonne les colonnes d'un chunk DVF selon la table"""
+    frame = df.reindex(columns=list(DVF_COLUMN_MAPPING)).rename(columns=DVF_COLUMN_MAPPING)
+
+    for column in DVF_INTEGER_COLUMNS:
+        frame[column] = pd.to_numeric(frame[column], errors='coerce').round().astype('Int64')
+
+    frame['code_insee'] = insee_codes(frame['code_departement'], frame['code_commune'])
+    frame['geo_cell'] = geo_cells(frame['latitude'], frame['longitude'])
+    return frame
+
+
+def _canonical_text(values: pd.Series, column_type) -> pd.Series:
+    """Texte d'une colonne indépendant de sa provenance (fichier, stage Parquet ou base)
+
+    Dates en AAAA-MM-JJ, nombres arrondis, codes sans zéros de tête ni
+    suffixe '.0' ('01' / '1' / '1.0' -> '1'), valeurs manquantes vides.
+    """
+    if isinstance(column_type, (Date, DateTime)):
+        text_values = pd.to_datetime(values, errors='coerce').dt.strftime('%Y-%m-%d')
+    elif isinstance(column_type, Integer):
+        text_values = pd.to_numeric(values, errors='coerce').round().astype('Int64').astype('string')
+    elif isinstance(column_type, Float):
+        # float32 (lecteur CSV) : passage par sa représentation la plus courte,
+        # celle écrite en base par COPY
+        if values.dtype == 'float32':
+            values = values.astype(str)
+        numbers = pd.to_numeric(values, errors='coerce').round(6)
+        text_values = numbers.map('{:.6f}'.format).where(numbers.notna())
+    else:
+        text_values = (values.astype('string').str.strip()
+                       .str.replace(r'\.0$', '', regex=True)
+                       .str.replace(r'^0+(?=\d)', '', regex=True))
+    return text_values.astype(object).where(text_values.notna(), '')
+
+
+def _hash_columns(frame: pd.DataFrame, columns: list) -> pd.Series:
+    """Hash 64 bits stable (hex) des colonnes données, ligne par ligne"""
+    table_columns = DVFTransaction.__table__.c
+    canonical = pd.DataFrame({
+        name: _canonical_text(frame[name], table_columns[name].type) for name in columns
+    }, index=frame.index)
+    hashed = pd.util.hash_pandas_object(canonical, index=False)
+    return hashed.map('{:016x}'.format)
+
+
+def add_row_hashes(frame: pd.DataFrame) -> pd.DataFrame:
+    """Ajoute la clé naturelle et le hash de contenu de chaque mutation"""
+    content_columns = list(DVF_COLUMN_MAPPING.values())
+    frame['mutation_key'] = _hash_columns(frame, DVF_NATURAL_KEY)
+    frame['row_hash'] = _hash_columns(frame, content_columns)
+    return frame
+
+
+def backfill_row_keys(connection, batch_size: int = 50000) -> int:
+    """(Re)calcule mutation_key et row_hash des lignes en base, par lots d'id
+
+    Même normalisation que l'ingestion : une ligne déjà chargée et la même
+    ligne relue dans le fichier ont la même clé.
+    """
+    content_columns = list(DVF_COLUMN_MAPPING.values())
+    total = 0
+    last_id = 0
+    while True:
+        frame = pd.read_sql_query(text(f"""
+            SELECT id, {', '.join(content_columns)} FROM dvf_transactions
+            WHERE id > :last_id
+            ORDER BY id
+            LIMIT :batch_size
+        """), connection, params={'last_id': last_id, 'batch_size': batch_size})
+        if frame.empty:
+            return total
+
+        frame = add_row_hashes(frame)
+        connection.execute(text("""
+            UPDATE dvf_transactions t SET mutation_key = v.mutation_key, row_hash = v.row_hash
+            FROM unnest(CAST(:ids AS bigint[]), CAST(:keys AS varchar[]), CAST(:hashes AS varchar[]))
+                AS v(id, mutation_key, row_hash)
+            WHERE t.id = v.id
+        """), {
+            'ids': frame['id'].tolist(),
+            'keys': frame['mutation_key'].tolist(),
+            'hashes': frame['row_hash'].tolist(),
+        })
+        connection.commit()
+        total += len(frame)
+        last_id = int(frame['id'].iloc[-1])
+
+
+def _copy_frame(db: Session, table: str, frame: pd.DataFrame) -> None:
+    """Envoie un DataFrame via COPY FROM STDIN (psycopg2)"""
+    buffer = io.StringIO()
+    frame.to_csv(buffer, index=False, header=False, date_format='%Y-%m-%d')
+    buffer.seek(0)
+
+    columns = ', '.join(frame.columns)
+    raw_connection = db.connection().connection
+    with raw_connection.cursor() as cursor:
+        cursor.copy_expert(f"COPY {table} ({columns}) FROM STDIN WITH (FORMAT csv)", buffer)
+
+
+def _insert_frame(db: Session, table, frame: pd.DataFrame) -> None:
+    """Insertion par lots (executemany) pour les drivers sans COPY"""
+    records = frame.astype(object).where(frame.notna(), None).to_dict('records')
+    if records:
+        db.execute(insert(table), records)
+
+
+def _merge_staging(db: Session, columns: list) -> tuple:
+    """Upsert de la table de staging vers dvf_transactions
+
+    Les lignes inchangées (même row_hash) sont ignorées, les autres sont
+    insérées ou mises à jour et leurs clés d'analyse sont marquées à
+    recalculer. Retourne (insérées, mises à jour).
+    """
+    column_list = ', '.join(columns)
+    updates = ', '.join(
+        f"{column} = EXCLUDED.{column}" for column in columns
+        if column not in DVF_CONFLICT_COLUMNS
+    )
+
+    result = db.execute(text(f"""
+        WITH merged AS (
+            INSERT INTO dvf_transactions ({column_list}, created_at)
+            SELECT {column_list}, now() FROM {STAGING_TABLE}
+            ON CONFLICT ({', '.join(DVF_CONFLICT_COLUMNS)}) DO UPDATE SET {updates}
+            WHERE dvf_transactions.row_hash IS DISTINCT FROM EXCLUDED.row_hash
+            RETURNING (xmax = 0) AS inserted, code_departement, code_commune, date_mutation, type_local
+        ),
+        dirty AS (
+            -- Clés (commune, mois, type) à recalculer dans market_analysis
+            INSERT INTO market_analysis_dirty (code_departement, code_commune, period, type_local)
+            SELECT DISTINCT code_departement, code_commune, to_char(date_mutation, 'YYYY-MM'), type_local
+            FROM merged
+            WHERE date_mutation IS NOT NULL
+        )
+        SELECT
+            COUNT(*) FILTER (WHERE inserted),
+            COUNT(*) FILTER (WHERE NOT inserted)
+        FROM merged
+    """))
+    inserted, updated = result.one()
+    return inserted, updated
+
+
+def prepare_dvf_rows(df: pd.DataFrame) -> pd.DataFrame:
+    """Prépare un chunk DVF nettoyé pour l'écriture (colonnes de la table + hashes)"""
+    return add_row_hashes(prepare_dvf_frame(df))
+
+
+def write_dvf_rows(db: Session, frame: pd.DataFrame) -> dict:
+    """Écrit des lignes préparées de façon idempotente et mesure le débit"""
+    start = time.perf_counter()
+
+    # Une même mutation ne peut être upsertée qu'une fois par requête
+    unique_frame = frame.drop_duplicates(subset=DVF_CONFLICT_COLUMNS, keep='last')
+    duplicates = len(frame) - len(unique_frame)
+
+    missing_partition_key = 0
+    if PARTITION_COLUMNS:
+        # Sans clé de partitionnement, une ligne n'a pas de partition cible
+        keyed_frame = unique_frame.dropna(subset=PARTITION_COLUMNS)
+        missing_partition_key = len(unique_frame) - len(keyed_frame)
+        unique_frame = keyed_frame
+        if missing_partition_key:
+            logger.warning(
+                f"{missing_partition_key} lignes sans {' / '.join(PARTITION_COLUMNS)} écartées (aucune partition cible)"
+            )
+        ensure_partitions(db, pd.to_datetime(unique_frame['date_mutation']).dt.year.unique())
+        db.commit()
+
+    # Mêmes colonnes que dvf_transactions, sans contraintes (id NOT NULL)
+    db.execute(text(
+        f"CREATE TEMP TABLE IF NOT EXISTS {STAGING_TABLE} ON COMMIT DELETE ROWS "
+        f"AS SELECT * FROM dvf_transactions WITH NO DATA"
+    ))
+
+    if db.get_bind().dialect.driver == 'psycopg2':
+        _copy_frame(db, STAGING_TABLE, unique_frame)
+    else:
+        staging = table(STAGING_TABLE, *[column(name) for name in unique_frame.columns])
+        _insert_frame(db, staging, unique_frame)
+
+    inserted, updated = _merge_staging(db, list(unique_frame.columns))
+    db.commit()
+
+    elapsed = time.perf_counter() - start
+    rows = len(frame)
+    # skipped : lignes écrites mais inchangées (même row_hash), hors lignes écartées
+    return {
+        'rows': rows,
+        'inserted': inserted,
+        'updated': updated,
+        'skipped': len(unique_frame) - inserted - updated,
+        'duplicates': duplicates,
+        'missing_partition_key': missing_partition_key,
+        'seconds': elapsed,
+        'rows_per_second': rows / elapsed if elapsed > 0 else 0.0,
+    }
+
+
+def bulk_insert_dvf(db: Session, df: pd.DataFrame) -> dict:
+    """Écrit un chunk DVF nettoyé de façon idempotente et mesure le débit"""
+    return write_dvf_rows(db, prepare_dvf_rows(df))
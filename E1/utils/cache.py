@@ -0,0 +1,151 @@
+# utils/cache.py
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from config import Config
+
+try:
+    import redis
+except ImportError:  # backend partagé optionnel
+    redis = None
+
+# Jeu de données dont la version invalide les réponses en cache
+DVF_DATASET = 'dvf'
+# Référentiel des communes (rechargement du registre en mémoire)
+COMMUNES_DATASET = 'communes'
+
+
+class MemoryCache:
+    """Cache LRU en mémoire du processus, avec durée de vie par entrée"""
+
+    blocking = False  # appels instantanés : pas de thread depuis le code async
+
+    def __init__(self, maxsize: int = 1024, ttl: int = 3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value, ttl: int = None) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + (ttl or self.ttl), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class RedisCache:
+    """Cache partagé entre processus (Redis), valeurs sérialisées en JSON
+
+    Client synchrone (utilisable depuis les scripts) : le code async passe
+    par un thread pour ne pas bloquer la boucle d'événements (`blocking`).
+    """
+
+    blocking = True
+
+    def __init__(self, url: str, ttl: int = 3600, prefix: str = 'api:'):
+        if redis is None:
+            raise RuntimeError("CACHE_URL nécessite le paquet redis (pip install redis)")
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, key: str):
+        value = self.client.get(self.prefix + key)
+        return json.loads(value) if value is not None else None
+
+    def set(self, key: str, value, ttl: int = None) -> None:
+        self.client.set(self.prefix + key, json.dumps(value), ex=ttl or self.ttl)
+
+    def delete(self, key: str) -> None:
+        self.client.delete(self.prefix + key)
+
+    def clear(self) -> None:
+        for key in self.client.scan_iter(f"{self.prefix}*"):
+            self.client.delete(key)
+
+
+_cache = None
+_versions = {}  # jeu de données -> (expiration, version)
+
+
+def get_cache():
+    """Backend de cache configuré (Redis si CACHE_URL, sinon mémoire)"""
+    global _cache
+    if _cache is None:
+        if Config.CACHE_URL:
+            _cache = RedisCache(Config.CACHE_URL, ttl=Config.CACHE_TTL)
+        else:
+            _cache = MemoryCache(maxsize=Config.CACHE_MAXSIZE, ttl=Config.CACHE_TTL)
+    return _cache
+
+
+def set_cache(backend) -> None:
+    """Remplace le backend (ex. MemoryCache dans les tests) ; None pour réinitialiser"""
+    global _cache
+    _cache = backend
+    _versions.clear()
+
+
+async def dataset_version(db: AsyncSession, dataset: str = DVF_DATASET) -> int:
+    """Version courante du jeu de données, relue au plus toutes les CACHE_VERSION_TTL secondes"""
+    expires_at, version = _versions.get(dataset, (0, None))
+    if expires_at > time.monotonic():
+        return version
+
+    result = await db.execute(
+        text("SELECT version FROM dataset_versions WHERE name = :name"), {'name': dataset}
+    )
+    version = result.scalar() or 0
+    _versions[dataset] = (time.monotonic() + Config.CACHE_VERSION_TTL, version)
+    return version
+
+
+def bump_dataset_version(db: Session, dataset: str = DVF_DATASET) -> int:
+    """Incrémente la version après un chargement réussi (invalide les caches)"""
+    version = db.execute(text("""
+        INSERT INTO dataset_versions (name, version, updated_at)
+        VALUES (:name, 1, now())
+        ON CONFLICT (name) DO UPDATE
+        SET version = dataset_versions.version + 1, updated_at = now()
+        RETURNING version
+    """), {'name': dataset}).scalar()
+    db.commit()
+    _versions.pop(dataset, None)
+    return version
+
+
+def cache_key(namespace: str, params: dict, version: int) -> str:
+    """Clé normalisée : paramètres non vides triés, version du jeu de données"""
+    normalized = {
+        name: value.strip() if isinstance(value, str) else value
+        for name, value in sorted(params.items())
+        if value is not None and value != ''
+    }
+    payload = json.dumps([namespace, version, normalized], default=str, separators=(',', ':'))
+    return f"{namespace}:{hashlib.sha1(payload.encode()).hexdigest()}"
@@ -0,0 +1,126 @@
+# utils/commune_registry.py
+import bisect
+import re
+import unicodedata
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+from utils.cache import COMMUNES_DATASET, dataset_version
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+COMMUNES_SQL = text("""
+    SELECT code, nom, code_departement, code_region, population, surface, longitude, latitude
+    FROM communes
+    ORDER BY code
+""")
+
+
+def normalize_name(name: str) -> str:
+    """Nom sans accents ni casse, tirets et apostrophes remplacés par des espaces"""
+    decomposed = unicodedata.normalize('NFKD', name or '')
+    stripped = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return re.sub(r"[\s\-'’]+", ' ', stripped).strip().lower()
+
+
+def normalize_departement(code: str) -> str:
+    """Code département au format de l'API Géo ('1' -> '01')"""
+    return str(code).strip().upper().zfill(2)
+
+
+class CommuneRegistry:
+    """Index en mémoire des communes, stocké en colonnes
+
+    Recherche par code en O(1), par préfixe de nom (sans accents) par
+    dichotomie sur les noms normalisés triés, et par département.
+    """
+
+    def __init__(self, rows: list, version: int = 0):
+        self.version = version
+        self.codes = np.array([row[0] for row in rows], dtype='U5')
+        self.names = [row[1] for row in rows]
+        self.departements = np.array([row[2] or '' for row in rows], dtype='U3')
+        self.regions = np.array([row[3] or '' for row in rows], dtype='U3')
+        self.populations = np.array([row[4] if row[4] is not None else -1 for row in rows], dtype=np.int64)
+        self.surfaces = np.array([row[5] for row in rows], dtype=np.float64)
+        self.longitudes = np.array([row[6] for row in rows], dtype=np.float64)
+        self.latitudes = np.array([row[7] for row in rows], dtype=np.float64)
+
+        self._by_code = {code: index for index, code in enumerate(self.codes.tolist())}
+
+        keys = [normalize_name(name) for name in self.names]
+        self._name_order = np.array(sorted(range(len(keys)), key=keys.__getitem__), dtype=np.int64)
+        self._name_keys = [keys[index] for index in self._name_order]
+
+        self._by_departement = {}
+        for departement in np.unique(self.departements):
+            self._by_departement[str(departement)] = np.flatnonzero(self.departements == departement)
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def record(self, index: int) -> dict:
+        def number(values, index):
+            value = values[index]
+            return None if np.isnan(value) else float(value)
+
+        population = int(self.populations[index])
+        return {
+            'code': str(self.codes[index]),
+            'nom': self.names[index],
+            'code_departement': str(self.departements[index]) or None,
+            'code_region': str(self.regions[index]) or None,
+            'population': population if population >= 0 else None,
+            'surface': number(self.surfaces, index),
+            'longitude': number(self.longitudes, index),
+            'latitude': number(self.latitudes, index),
+        }
+
+    def get(self, code: str):
+        """Commune par code INSEE, None si inconnue"""
+        index = self._by_code.get(code)
+        return self.record(index) if index is not None else None
+
+    def departement_indices(self, departement: str) -> np.ndarray:
+        return self._by_departement.get(normalize_departement(departement), np.empty(0, dtype=np.int64))
+
+    def by_departement(self, departement: str = None, limit: int = 100) -> list:
+        """Communes d'un département (toutes si None), par code"""
+        indices = self.departement_indices(departement) if departement else np.arange(len(self))
+        return [self.record(index) for index in indices[:limit]]
+
+    def search(self, query: str, departement: str = None, limit: int = 20) -> list:
+        """Communes dont le nom commence par `query`, les plus peuplées d'abord"""
+        prefix = normalize_name(query)
+        start = bisect.bisect_left(self._name_keys, prefix)
+        end = bisect.bisect_left(self._name_keys, prefix + '\uffff', lo=start)
+        indices = self._name_order[start:end]
+
+        if departement:
+            indices = indices[self.departements[indices] == normalize_departement(departement)]
+
+        ranked = indices[np.argsort(-self.populations[indices], kind='stable')]
+        return [self.record(index) for index in ranked[:limit]]
+
+
+_registry = None
+
+
+async def load_registry(db: AsyncSession, version: int = None) -> CommuneRegistry:
+    """Charge toutes les communes depuis la base"""
+    global _registry
+    if version is None:
+        version = await dataset_version(db, COMMUNES_DATASET)
+    rows = (await db.execute(COMMUNES_SQL)).all()
+    _registry = CommuneRegistry(rows, version)
+    logger.info(f"Registre des communes chargé: {len(_registry)} communes (version {version})")
+    return _registry
+
+
+async def get_registry(db: AsyncSession) -> CommuneRegistry:
+    """Registre courant, rechargé si la version du référentiel des communes a changé"""
+    version = await dataset_version(db, COMMUNES_DATASET)
+    if _registry is None or _registry.version != version:
+        return await load_registry(db, version)
+    return _registry
@@ -0,0 +1,183 @@
+# utils/communes_loader.py
+import json
+import re
+import time
+from itertools import islice
+from urllib.parse import urlencode
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from config import Config
+from utils.cache import COMMUNES_DATASET
+from utils.data_loader import download_file
+from utils.hashing import file_sha256
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+COMMUNES_PAYLOAD_PATH = Config.DATA_DIR / 'communes.json'
+COMMUNES_FIELDS = 'nom,code,codeDepartement,codeRegion,population,surface,centre'
+
+COMMUNES_COLUMNS = ['code', 'nom', 'code_departement', 'code_region',
+                    'population', 'surface', 'longitude', 'latitude']
+
+# Un lot = une requête : colonnes passées en tableaux puis dépliées par unnest ;
+# les communes inchangées ne sont pas réécrites
+COMMUNES_UPSERT_SQL = text("""
+    INSERT INTO communes (code, nom, code_departement, code_region, population, surface, longitude, latitude, created_at)
+    SELECT v.*, now()
+    FROM unnest(
+        CAST(:code AS varchar[]), CAST(:nom AS varchar[]),
+        CAST(:code_departement AS varchar[]), CAST(:code_region AS varchar[]),
+        CAST(:population AS integer[]), CAST(:surface AS float8[]),
+        CAST(:longitude AS float8[]), CAST(:latitude AS float8[])
+    ) AS v(code, nom, code_departement, code_region, population, surface, longitude, latitude)
+    ON CONFLICT (code) DO UPDATE SET
+        nom = EXCLUDED.nom,
+        code_departement = EXCLUDED.code_departement,
+        code_region = EXCLUDED.code_region,
+        population = EXCLUDED.population,
+        surface = EXCLUDED.surface,
+        longitude = EXCLUDED.longitude,
+        latitude = EXCLUDED.latitude
+    WHERE (communes.nom, communes.code_departement, communes.code_region, communes.population,
+           communes.surface, communes.longitude, communes.latitude)
+        IS DISTINCT FROM (EXCLUDED.nom, EXCLUDED.code_departement, EXCLUDED.code_region, EXCLUDED.population,
+                          EXCLUDED.surface, EXCLUDED.longitude, EXCLUDED.latitude)
+    RETURNING (xmax = 0) AS inserted
+""")
+
+_SEPARATORS = re.compile(r'[\s,]*')
+_NUMBER = re.compile(r'[-+0-9.eE]*')
+
+
+def iter_json_array(stream, chunk_size: int = 64 * 1024):
+    """Éléments d'un tableau JSON, décodés un par un au fil de la lecture
+
+    Seul l'élément en cours (et le bloc lu) est en mémoire, jamais le
+    document entier.
+    """
+    decoder = json.JSONDecoder()
+    buffer = stream.read(chunk_size)
+    position = 0
+    started = False
+
+    def refill() -> bool:
+        nonlocal buffer, position
+        block = stream.read(chunk_size)
+        buffer = buffer[position:] + block
+        position = 0
+        return bool(block)
+
+    while True:
+        position = _SEPARATORS.match(buffer, position).end()
+        if position == len(buffer):
+            if not refill():
+                raise ValueError("Tableau JSON incomplet")
+            continue
+
+        if not started:
+            if buffer[position] != '[':
+                raise ValueError("Un tableau JSON est attendu")
+            started = True
+            position += 1
+            continue
+        if buffer[position] == ']':
+            return
+
+        if _NUMBER.match(buffer, position).end() == len(buffer) and refill():
+            # Un nombre en fin de bloc peut continuer dans le suivant
+            continue
+
+        try:
+            item, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            # Élément coupé par la fin du bloc
+            if not refill():
+                raise
+            continue
+
+        position = end
+        yield item
+
+
+def commune_record(item: dict) -> dict:
+    """Ligne de la table communes pour une commune de l'API Géo"""
+    coordinates = (item.get('centre') or {}).get('coordinates') or [None, None]
+    return {
+        'code': item['code'],
+        'nom': item['nom'],
+        'code_departement': item.get('codeDepartement'),
+        'code_region': item.get('codeRegion'),
+        'population': item.get('population'),
+        'surface': item.get('surface'),
+        'longitude': coordinates[0],
+        'latitude': coordinates[1],
+    }
+
+
+def upsert_communes(db: Session, records: list) -> tuple:
+    """Upsert d'un lot de communes ; retourne (insérées, mises à jour)"""
+    # Une même commune ne peut être upsertée qu'une fois par requête
+    unique = {record['code']: record for record in records}
+    params = {column: [record[column] for record in unique.values()] for column in COMMUNES_COLUMNS}
+
+    flags = db.execute(COMMUNES_UPSERT_SQL, params).scalars().all()
+    inserted = sum(flags)
+    return inserted, len(flags) - inserted
+
+
+def stored_payload_hash(db: Session):
+    return db.execute(
+        text("SELECT source_hash FROM dataset_versions WHERE name = :name"), {'name': COMMUNES_DATASET}
+    ).scalar()
+
+
+def _store_payload_hash(db: Session, payload_hash: str) -> None:
+    db.execute(text("""
+        INSERT INTO dataset_versions (name, version, source_hash, updated_at)
+        VALUES (:name, 0, :source_hash, now())
+        ON CONFLICT (name) DO UPDATE SET source_hash = EXCLUDED.source_hash
+    """), {'name': COMMUNES_DATASET, 'source_hash': payload_hash})
+
+
+def load_communes(db: Session, batch_size: int = None, force: bool = False, logger_cron=None) -> dict:
+    """Télécharge les communes de l'API Géo et les upserte par lots
+
+    Le chargement est ignoré si le document téléchargé a le même hash que
+    lors du dernier chargement (sauf `force`). Les lots et le hash sont
+    validés dans une seule transaction.
+    """
+    if not logger_cron:
+        logger_cron = logger
+    batch_size = batch_size or Config.COMMUNES_BATCH_SIZE
+    start = time.perf_counter()
+
+    url = f"{Config.COMMUNES_API_URL}?{urlencode({'fields': COMMUNES_FIELDS, 'format': 'json'})}"
+    COMMUNES_PAYLOAD_PATH.parent.mkdir(parents=True, exist_ok=True)
+    download_file(url, COMMUNES_PAYLOAD_PATH)
+    payload_hash = file_sha256(COMMUNES_PAYLOAD_PATH)
+
+    totals = {'rows': 0, 'inserted': 0, 'updated': 0, 'skipped': 0, 'payload_unchanged': False}
+    if not force and stored_payload_hash(db) == payload_hash:
+        logger_cron.info("Référentiel des communes inchangé depuis le dernier chargement")
+        totals['payload_unchanged'] = True
+        return totals
+
+    try:
+        with open(COMMUNES_PAYLOAD_PATH, encoding='utf-8') as stream:
+            records = (commune_record(item) for item in iter_json_array(stream))
+            while batch := list(islice(records, batch_size)):
+                inserted, updated = upsert_communes(db, batch)
+                totals['rows'] += len(batch)
+                totals['inserted'] += inserted
+                totals['updated'] += updated
+
+        _store_payload_hash(db, payload_hash)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    totals['skipped'] = totals['rows'] - totals['inserted'] - totals['updated']
+    totals['seconds'] = time.perf_counter() - start
+    return totals
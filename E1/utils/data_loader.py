@@ -1,24 +1,188 @@
 # utils/data_loader.py
+import io
+import json
+import os
+from contextlib import contextmanager
 from pathlib import Path
 import zipfile
 import pandas as pd
 import chardet
 import requests
+from config import Config
 from utils.logger import get_logger
 
 logger = get_logger(__name__)
 
+# Emplacements de l'archive DVF et de sa version extraite
+DVF_ARCHIVE_PATH = Config.DATA_DIR / 'dvf.zip'
+DVF_TEXT_PATH = Config.DATA_DIR / 'dvf.txt'
 
-def download_file(url: str, filename: str) -> None:
-    if Path(filename).exists():
-        return filename
 
-    response = requests.get(url)
-    response.raise_for_status()
+# Schéma de lecture du fichier DVF : catégories pour les champs à faible
+# cardinalité, entiers nullables, float32 quand la précision le permet
+DVF_DTYPES = {
+    'Identifiant de document': str,
+    'Reference document': str,
+    '1 Articles CGI': str,
+    '2 Articles CGI': str,
+    '3 Articles CGI': str,
+    '4 Articles CGI': str,
+    '5 Articles CGI': str,
+    'No disposition': str,
+    'Date mutation': str,
+    'Nature mutation': 'category',
+    'Valeur fonciere': 'float64',
+    'No voie': str,
+    'B/T/Q': 'category',
+    'Type de voie': 'category',
+    'Code voie': str,
+    'Voie': str,
+    'Code postal': str,
+    'Commune': str,
+    'Code departement': 'category',
+    'Code commune': str,
+    'Prefixe de section': str,
+    'Section': str,
+    'No plan': str,
+    'No Volume': str,
+    '1er lot': str,
+    'Surface Carrez du 1er lot': 'float32',
+    '2eme lot': str,
+    'Surface Carrez du 2eme lot': 'float32',
+    '3eme lot': str,
+    'Surface Carrez du 3eme lot': 'float32',
+    '4eme lot': str,
+    'Surface Carrez du 4eme lot': 'float32',
+    '5eme lot': str,
+    'Surface Carrez du 5eme lot': 'float32',
+    'Nombre de lots': 'Int16',
+    'Code type local': 'category',
+    'Type local': 'category',
+    'Identifiant local': str,
+    'Surface reelle bati': 'float32',
+    'Nombre pieces principales': 'Int16',
+    'Nature culture': 'category',
+    'Nature culture speciale': 'category',
+    'Surface terrain': 'float32',
+}
 
-    with open(filename, 'wb') as file:
-        file.write(response.content)
-        return filename
+# Types pyarrow équivalents (les autres colonnes sont lues en texte)
+ARROW_DTYPES = {
+    'float64': 'float64',
+    'float32': 'float32',
+    'Int16': 'int16',
+}
+
+# Taille moyenne d'une ligne DVF, pour convertir un nombre de lignes en octets
+CSV_ROW_BYTES = 256
+
+# Taille des blocs écrits sur disque pendant le téléchargement
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+def _metadata_path(filename: Path) -> Path:
+    return filename.with_name(filename.name + '.meta.json')
+
+
+def _read_metadata(filename: Path) -> dict:
+    """Lit les validateurs HTTP (ETag, Last-Modified) du dernier téléchargement"""
+    try:
+        return json.loads(_metadata_path(filename).read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_metadata(filename: Path, metadata: dict) -> None:
+    _metadata_path(filename).write_text(json.dumps(metadata))
+
+
+def _discard_partial(target: Path, metadata: dict) -> None:
+    """Supprime le .part et ses validateurs : le prochain essai repart de zéro"""
+    target.with_name(target.name + '.part').unlink(missing_ok=True)
+    metadata.pop('partial_etag', None)
+    metadata.pop('partial_last_modified', None)
+    _write_metadata(target, metadata)
+
+
+def download_file(url: str, filename: str, chunk_size: int = DOWNLOAD_CHUNK_SIZE, timeout: int = 60) -> str:
+    """Télécharge un fichier en streaming, de façon conditionnelle et reprenable
+
+    - requête conditionnelle (If-None-Match / If-Modified-Since) : un fichier
+      inchangé coûte une réponse 304 ;
+    - reprise d'un transfert interrompu via Range / If-Range sur le fichier .part ;
+    - écriture par blocs de taille fixe puis remplacement atomique du fichier.
+    """
+    target = Path(filename)
+    partial = target.with_name(target.name + '.part')
+    metadata = _read_metadata(target)
+
+    headers = {}
+    if target.exists():
+        if metadata.get('etag'):
+            headers['If-None-Match'] = metadata['etag']
+        if metadata.get('last_modified'):
+            headers['If-Modified-Since'] = metadata['last_modified']
+
+    resume_from = 0
+    partial_validator = metadata.get('partial_etag') or metadata.get('partial_last_modified')
+    if partial.exists() and partial_validator:
+        resume_from = partial.stat().st_size
+        headers['Range'] = f"bytes={resume_from}-"
+        headers['If-Range'] = partial_validator
+
+    try:
+        response = requests.get(url, headers=headers, stream=True, timeout=timeout)
+        if response.status_code == 416 and resume_from:
+            # .part plus long que la version distante : reprise impossible
+            response.close()
+            logger.warning(f"Reprise refusée pour {target.name}, nouveau téléchargement complet")
+            _discard_partial(target, metadata)
+            headers.pop('Range')
+            headers.pop('If-Range')
+            resume_from = 0
+            response = requests.get(url, headers=headers, stream=True, timeout=timeout)
+        response.raise_for_status()
+    except requests.RequestException as e:
+        if target.exists():
+            logger.warning(f"Téléchargement impossible, utilisation de {target}: {e}")
+            return filename
+        raise
+
+    with response:
+        if response.status_code == 304:
+            logger.info(f"{target.name} inchangé depuis le dernier téléchargement")
+            return filename
+
+        content_range = response.headers.get('Content-Range', '')
+        if response.status_code == 206 and content_range.startswith(f"bytes {resume_from}-"):
+            mode = 'ab'
+            logger.info(f"Reprise du téléchargement de {target.name} à l'octet {resume_from}")
+        else:
+            mode = 'wb'
+            resume_from = 0
+
+        # Validateurs de la version en cours de téléchargement, pour la reprise
+        metadata['partial_etag'] = response.headers.get('ETag')
+        metadata['partial_last_modified'] = response.headers.get('Last-Modified')
+        _write_metadata(target, metadata)
+
+        with open(partial, mode) as file:
+            for block in response.iter_content(chunk_size=chunk_size):
+                file.write(block)
+
+        expected = response.headers.get('Content-Length')
+        if expected is not None and 'Content-Encoding' not in response.headers \
+                and partial.stat().st_size != resume_from + int(expected):
+            # Taille incohérente : le .part ne doit pas servir de base à une reprise
+            _discard_partial(target, metadata)
+            raise IOError(f"Téléchargement incomplet de {url}")
+
+    os.replace(partial, target)
+    _write_metadata(target, {
+        'etag': metadata.pop('partial_etag'),
+        'last_modified': metadata.pop('partial_last_modified'),
+    })
+    return filename
 
 
 def unzip_and_rename(zip_path: str, new_name: str, extract_to: str = ".") -> None:
@@ -38,48 +202,103 @@ def unzip_and_rename(zip_path: str, new_name: str, extract_to: str = ".") -> Non
             temp_dir.rmdir()
 
 
+@contextmanager
+def open_zip_member(zip_path, member: str = None, buffer_size: int = DOWNLOAD_CHUNK_SIZE):
+    """Ouvre un fichier de l'archive en lecture binaire, sans extraction sur disque
+
+    Gestionnaire de contexte : le flux et l'archive sont fermés à la sortie
+    du bloc `with`, y compris en cas d'erreur.
+    """
+    with zipfile.ZipFile(zip_path, 'r') as archive:
+        if member is None:
+            member = next((info.filename for info in archive.infolist() if not info.is_dir()), None)
+            if member is None:
+                raise FileNotFoundError(f"Archive vide: {zip_path}")
+
+        with io.BufferedReader(archive.open(member), buffer_size=buffer_size) as stream:
+            yield stream
+
+
 def detect_encoding(file_path):
-    """Détecte l'encodage d'un fichier"""
+    """Détecte l'encodage d'un fichier ou d'un flux binaire bufferisé"""
+    if hasattr(file_path, 'peek'):
+        # Lecture des premiers octets sans consommer le flux
+        raw_data = file_path.peek(10000)[:10000]
+        return chardet.detect(raw_data)['encoding']
+
     with open(file_path, 'rb') as file:
         raw_data = file.read(10000)  # Lire les premiers 10KB
         result = chardet.detect(raw_data)
         return result['encoding']
 
 
-def load_csv_safe(file_path, chunksize=10000, **kwargs):
-    """Charge un CSV en détectant automatiquement l'encodage"""
-    file_path = download_file(file_path, '/app/data/dvf.zip')
-    unzip_and_rename(file_path, 'dvf.txt', '/app/data')
-    file_path = '/app/data/dvf.txt'
+def _arrow_chunks(file_path, encoding, chunksize, dtype, sep=',', decimal='.', **kwargs):
+    """Lecture en streaming avec le parseur CSV multithread de pyarrow"""
+    # Import local : pyarrow n'est requis que pour engine='pyarrow'
+    import pyarrow as pa
+    from pyarrow import csv as pa_csv
+
+    arrow_types = {
+        # Catégories lues en dictionnaire : to_pandas produit directement un Categorical
+        column: pa.dictionary(pa.int32(), pa.string()) if str(column_dtype) == 'category'
+        else pa.type_for_alias(ARROW_DTYPES.get(str(column_dtype), 'string'))
+        for column, column_dtype in (dtype or {}).items()
+    }
+    # Entiers nullables pandas plutôt que float64 quand la colonne a des vides
+    types_mapper = {pa.int16(): pd.Int16Dtype()}.get
+    reader = pa_csv.open_csv(
+        file_path,
+        read_options=pa_csv.ReadOptions(encoding=encoding, block_size=chunksize * CSV_ROW_BYTES),
+        parse_options=pa_csv.ParseOptions(delimiter=sep),
+        convert_options=pa_csv.ConvertOptions(
+            column_types=arrow_types, decimal_point=decimal, strings_can_be_null=True
+        ),
+    )
+
+    # Lots déjà typés : aucune conversion pandas (astype) après la lecture
+    for batch in reader:
+        yield batch.to_pandas(types_mapper=types_mapper)
+
+
+def load_csv_safe(file_path, chunksize=10000, dtype=None, engine='c', **kwargs):
+    """Charge un CSV (chemin ou flux binaire) en détectant automatiquement l'encodage
+
+    `dtype` déclare le type de chaque colonne (voir DVF_DTYPES) ;
+    `engine='pyarrow'` utilise le parseur pyarrow, y compris en streaming.
+    """
     encoding = detect_encoding(file_path)
-    
+
+    if chunksize and engine == 'pyarrow':
+        return _arrow_chunks(file_path, encoding, chunksize, dtype, **kwargs)
+
     if chunksize:
-        return pd.read_csv(file_path, encoding=encoding, chunksize=chunksize, iterator=True, converters={
-            'Nature culture': str,
-            'Nature culture speciale': str,
-            'Type de voie': str,
-            'Code postal': str,
-            '1er lot': str,
-            '2eme lot': str,
-            '3eme lot': str,
-            '4eme lot': str,
-            'Section': str,
-            'Voie': str,
-            'Commune': str,
-            'B/T/Q': str
-        }, **kwargs)
-
-    return pd.read_csv(file_path, encoding=encoding, **kwargs)
-
-
-def load_dvf_data_streaming(file_path, chunksize=10000):
-    """Traite les données DVF en streaming"""
+        return pd.read_csv(file_path, encoding=encoding, chunksize=chunksize, iterator=True,
+                           dtype=dtype, engine=engine, **kwargs)
+
+    return pd.read_csv(file_path, encoding=encoding, dtype=dtype, engine=engine, **kwargs)
+
+
+def load_dvf_data_streaming(url, chunksize=10000, extract=False, engine='pyarrow'):
+    """Traite les données DVF en streaming
+
+    Par défaut le fichier texte est lu directement dans l'archive zip ;
+    `extract=True` conserve l'ancien comportement (extraction dans DATA_DIR).
+    Le parseur pyarrow est le plus rapide avec DVF_DTYPES (voir
+    benchmarks/bench_csv_reader.py) ; `engine='c'` reste disponible.
+    """
     try:
-        chunks = load_csv_safe(file_path, chunksize=chunksize,
-                            sep='|', decimal=',', date_format='%d/%m/%Y', low_memory=False)
+        zip_path = download_file(url, str(DVF_ARCHIVE_PATH))
+        read_options = dict(sep='|', decimal=',', dtype=DVF_DTYPES, engine=engine)
+
+        if extract:
+            unzip_and_rename(zip_path, DVF_TEXT_PATH.name, str(DVF_TEXT_PATH.parent))
+            for chunk in load_csv_safe(str(DVF_TEXT_PATH), chunksize=chunksize, **read_options):
+                yield chunk
+            return
 
-        for i, chunk in enumerate(chunks):
-            yield chunk
+        with open_zip_member(zip_path) as stream:
+            for chunk in load_csv_safe(stream, chunksize=chunksize, **read_options):
+                yield chunk
     except StopIteration:
         print("Fin du fichier atteinte")
     except Exception as e:
@@ -0,0 +1,151 @@
+# utils/geo.py
+"""Recherche géographique des transactions
+
+Deux modes, selon la base :
+- postgis : colonne générée `geom` (geography) et index GiST
+- cell    : colonne `geo_cell` (cellule de la courbe de Morton, type geohash)
+            et B-tree ; une zone est couverte par quelques plages de cellules
+            puis filtrée exactement sur latitude / longitude
+"""
+import math
+import numpy as np
+import pandas as pd
+from sqlalchemy import func, text
+from config import Config
+
+# Bits par axe : ~0,3 m en latitude, ~0,5 m en longitude ; cellule sur 52 bits
+CELL_BITS = 26
+# Nombre maximal de cellules (plages d'index) couvrant une zone de recherche
+MAX_COVER_CELLS = 16
+EARTH_RADIUS_M = 6371008.8
+
+SPATIAL_MODES = ['auto', 'postgis', 'cell']
+
+_backend = None
+
+
+def _spread_bits(values: np.ndarray) -> np.ndarray:
+    """Intercale un bit nul entre chaque bit (entiers < 2**32)"""
+    values = values.astype(np.uint64)
+    values = (values | (values << np.uint64(16))) & np.uint64(0x0000FFFF0000FFFF)
+    values = (values | (values << np.uint64(8))) & np.uint64(0x00FF00FF00FF00FF)
+    values = (values | (values << np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+    values = (values | (values << np.uint64(2))) & np.uint64(0x3333333333333333)
+    values = (values | (values << np.uint64(1))) & np.uint64(0x5555555555555555)
+    return values
+
+
+def _grid(values, low: float, span: float, bits: int) -> np.ndarray:
+    """Indice de la colonne (ou ligne) de la grille 2**bits contenant chaque valeur"""
+    size = 1 << bits
+    scaled = np.floor((np.asarray(values, dtype=np.float64) - low) / span * size)
+    return np.clip(scaled, 0, size - 1).astype(np.int64)
+
+
+def _morton(x: np.ndarray, y: np.ndarray) -> np.ndarray:
+    return ((_spread_bits(x) << np.uint64(1)) | _spread_bits(y)).astype(np.int64)
+
+
+def cell_ids(latitudes, longitudes, bits: int = CELL_BITS) -> np.ndarray:
+    """Cellules de Morton (longitude sur les bits impairs, latitude sur les pairs)"""
+    return _morton(_grid(longitudes, -180.0, 360.0, bits), _grid(latitudes, -90.0, 180.0, bits))
+
+
+def geo_cells(latitudes: pd.Series, longitudes: pd.Series) -> pd.Series:
+    """Colonne geo_cell d'un chunk DVF (NA sans coordonnées valides)"""
+    lat = pd.to_numeric(latitudes, errors='coerce')
+    lon = pd.to_numeric(longitudes, errors='coerce')
+    valid = lat.between(-90, 90) & lon.between(-180, 180)
+
+    cells = pd.Series(pd.NA, index=latitudes.index, dtype='Int64')
+    if valid.any():
+        cells[valid] = cell_ids(lat[valid].to_numpy(), lon[valid].to_numpy())
+    return cells
+
+
+def bbox_around(lat: float, lon: float, radius_m: float) -> tuple:
+    """Rectangle (min_lon, min_lat, max_lon, max_lat) englobant un cercle"""
+    delta_lat = math.degrees(radius_m / EARTH_RADIUS_M)
+    delta_lon = delta_lat / max(math.cos(math.radians(lat)), 1e-6)
+    return (max(lon - delta_lon, -180.0), max(lat - delta_lat, -90.0),
+            min(lon + delta_lon, 180.0), min(lat + delta_lat, 90.0))
+
+
+def cover_ranges(bbox: tuple, max_cells: int = MAX_COVER_CELLS) -> list:
+    """Plages [début, fin) de geo_cell couvrant un rectangle
+
+    Niveau de grille le plus fin tel qu'au plus `max_cells` cellules
+    recouvrent le rectangle ; les cellules contiguës sont fusionnées.
+    """
+    min_lon, min_lat, max_lon, max_lat = bbox
+    for bits in range(CELL_BITS, -1, -1):
+        xs = _grid([min_lon, max_lon], -180.0, 360.0, bits)
+        ys = _grid([min_lat, max_lat], -90.0, 180.0, bits)
+        if (xs[1] - xs[0] + 1) * (ys[1] - ys[0] + 1) <= max_cells:
+            break
+
+    grid_x, grid_y = np.meshgrid(np.arange(xs[0], xs[1] + 1), np.arange(ys[0], ys[1] + 1))
+    shift = 2 * (CELL_BITS - bits)
+    ranges = []
+    for cell in sorted(_morton(grid_x.ravel(), grid_y.ravel()).tolist()):
+        start, end = cell << shift, (cell + 1) << shift
+        if ranges and ranges[-1][1] == start:
+            ranges[-1] = (ranges[-1][0], end)
+        else:
+            ranges.append((start, end))
+    return ranges
+
+
+def haversine_m(lat_column, lon_column, lat: float, lon: float):
+    """Distance en mètres (formule de haversine) entre des colonnes et un point"""
+    half_lat = func.sin(func.radians(lat_column - lat) / 2)
+    half_lon = func.sin(func.radians(lon_column - lon) / 2)
+    a = func.power(half_lat, 2) + math.cos(math.radians(lat)) * func.cos(func.radians(lat_column)) * func.power(half_lon, 2)
+    return 2 * EARTH_RADIUS_M * func.asin(func.sqrt(a))
+
+
+def postgis_available(connection) -> bool:
+    return bool(connection.execute(
+        text("SELECT 1 FROM pg_available_extensions WHERE name = 'postgis'")
+    ).scalar())
+
+
+async def spatial_backend(db) -> str:
+    """'postgis' si la colonne geom existe (et DVF_SPATIAL le permet), sinon 'cell'"""
+    global _backend
+    if _backend is None:
+        _backend = 'cell'
+        if Config.DVF_SPATIAL != 'cell' and db.get_bind().dialect.name == 'postgresql':
+            has_geom = (await db.execute(text("""
+                SELECT 1 FROM information_schema.columns
+                WHERE table_name = 'dvf_transactions' AND column_name = 'geom'
+            """))).scalar()
+            _backend = 'postgis' if has_geom else 'cell'
+    return _backend
+
+
+def backfill_geo_cells(connection, batch_size: int = 50000) -> int:
+    """Calcule geo_cell des lignes chargées avant son introduction, par lots d'id"""
+    total = 0
+    last_id = 0
+    while True:
+        rows = connection.execute(text("""
+            SELECT id, latitude, longitude FROM dvf_transactions
+            WHERE id > :last_id AND geo_cell IS NULL
+              AND latitude BETWEEN -90 AND 90 AND longitude BETWEEN -180 AND 180
+            ORDER BY id
+            LIMIT :batch_size
+        """), {'last_id': last_id, 'batch_size': batch_size}).all()
+        if not rows:
+            return total
+
+        ids = [row[0] for row in rows]
+        cells = cell_ids([row[1] for row in rows], [row[2] for row in rows]).tolist()
+        connection.execute(text("""
+            UPDATE dvf_transactions t SET geo_cell = v.cell
+            FROM unnest(CAST(:ids AS bigint[]), CAST(:cells AS bigint[])) AS v(id, cell)
+            WHERE t.id = v.id
+        """), {'ids': ids, 'cells': cells})
+        connection.commit()
+        total += len(ids)
+        last_id = ids[-1]
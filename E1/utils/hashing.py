@@ -0,0 +1,11 @@
+# utils/hashing.py
+import hashlib
+
+
+def file_sha256(path, block_size: int = 1024 * 1024) -> str:
+    """Hash SHA-256 d'un fichier, lu par blocs"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
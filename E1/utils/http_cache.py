@@ -0,0 +1,55 @@
+# utils/http_cache.py
+import asyncio
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from utils.cache import cache_key, dataset_version, get_cache
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get('if-none-match')
+    if not header:
+        return False
+    candidates = [value.strip().removeprefix('W/') for value in header.split(',')]
+    return '*' in candidates or etag in candidates
+
+
+async def _backend_call(cache, method, *args):
+    """Appel au backend de cache, dans un thread s'il fait des E/S réseau (Redis)"""
+    if cache.blocking:
+        return await asyncio.to_thread(method, *args)
+    return method(*args)
+
+
+async def cached_json(request: Request, db: AsyncSession, namespace: str, params: dict, compute,
+                      stamp=None) -> Response:
+    """Réponse JSON servie depuis le cache, avec ETag et 304 Not Modified
+
+    `compute()` (coroutine) n'est attendu qu'en cas d'absence dans le cache ;
+    l'ETag ne dépend que des paramètres et de la version du jeu de données.
+    `stamp(content)` renvoie la réponse complétée des champs propres à la
+    requête (ex. date), appliqué après le cache pour ne pas les figer.
+    """
+    key = cache_key(namespace, params, await dataset_version(db))
+    etag = f'"{key.split(":", 1)[1]}"'
+    headers = {'ETag': etag, 'Cache-Control': 'private, no-cache'}
+
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    cache = get_cache()
+    content = await _backend_call(cache, cache.get, key)
+    if content is None:
+        content = jsonable_encoder(await compute())
+        await _backend_call(cache, cache.set, key, content)
+    else:
+        logger.debug(f"Cache hit: {namespace}")
+
+    if stamp is not None:
+        content = stamp(content)
+
+    return JSONResponse(content=content, headers=headers)
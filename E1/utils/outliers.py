@@ -0,0 +1,110 @@
+# utils/outliers.py
+import numpy as np
+import pandas as pd
+
+# Histogramme logarithmique des prix au m² : 1 €/m² à 1 M€/m², pas de 0,005
+# en log10 (erreur relative < 0,6 % sur les quantiles)
+LOG_MIN = 0.0
+LOG_MAX = 6.0
+LOG_STEP = 0.005
+NB_BINS = int(round((LOG_MAX - LOG_MIN) / LOG_STEP))
+
+# En dessous de ce nombre de ventes, le groupe utilise les bornes du type de local
+MIN_GROUP_SIZE = 30
+
+GROUP_COLUMNS = ['Code departement', 'Type local']
+
+# Colonnes lues pendant la première passe
+OUTLIER_COLUMNS = GROUP_COLUMNS + ['Valeur fonciere', 'Surface reelle bati']
+
+
+def price_m2(df: pd.DataFrame) -> pd.Series:
+    """Prix au m² d'un chunk DVF (NaN si la surface est nulle)"""
+    return df['Valeur fonciere'] / df['Surface reelle bati'].replace(0, np.nan)
+
+
+def _group_keys(df: pd.DataFrame) -> pd.MultiIndex:
+    return pd.MultiIndex.from_arrays([df[column].astype(str) for column in GROUP_COLUMNS])
+
+
+def _quantiles(counts: np.ndarray, quantiles) -> np.ndarray:
+    """Quantiles (en €/m²) lus sur un histogramme"""
+    cumulative = np.cumsum(counts)
+    positions = np.searchsorted(cumulative, np.asarray(quantiles) * cumulative[-1], side='left')
+    return 10 ** (LOG_MIN + (positions + 0.5) * LOG_STEP)
+
+
+class PriceSketch:
+    """Esquisse streaming des prix au m² par (département, type de local)
+
+    Chaque groupe est un histogramme à pas logarithmique fixe : la mémoire
+    est en O(groupes) et le résultat ne dépend ni de l'ordre des lignes ni
+    du découpage en chunks.
+    """
+
+    def __init__(self):
+        self.groups = {}
+
+    def update(self, df: pd.DataFrame) -> None:
+        """Ajoute un chunk à l'esquisse"""
+        prices = price_m2(df).to_numpy(dtype='float64')
+        valid = np.isfinite(prices) & (prices > 0)
+        if not valid.any():
+            return
+
+        codes, keys = pd.factorize(_group_keys(df)[valid])
+        bins = np.clip(((np.log10(prices[valid]) - LOG_MIN) / LOG_STEP).astype(np.int64), 0, NB_BINS - 1)
+        counts = np.bincount(codes * NB_BINS + bins, minlength=len(keys) * NB_BINS)
+        counts = counts.reshape(len(keys), NB_BINS)
+
+        for key, histogram in zip(keys, counts):
+            if key in self.groups:
+                self.groups[key] += histogram
+            else:
+                self.groups[key] = histogram.copy()
+
+    def bounds(self, min_group_size: int = MIN_GROUP_SIZE) -> 'OutlierBounds':
+        """Bornes Q1 - 1,5 IQR / Q3 + 1,5 IQR par groupe, par type et globales"""
+        def iqr_bounds(histogram):
+            q1, q3 = _quantiles(histogram, [0.25, 0.75])
+            iqr = q3 - q1
+            return q1 - 1.5 * iqr, q3 + 1.5 * iqr
+
+        by_type = {}
+        for (_, type_local), histogram in self.groups.items():
+            by_type[type_local] = by_type.get(type_local, 0) + histogram
+
+        group_bounds = {
+            key: iqr_bounds(histogram) for key, histogram in self.groups.items()
+            if histogram.sum() >= min_group_size
+        }
+        type_bounds = {key: iqr_bounds(histogram) for key, histogram in by_type.items()}
+        global_bounds = iqr_bounds(sum(by_type.values())) if by_type else (-np.inf, np.inf)
+
+        return OutlierBounds(group_bounds, type_bounds, global_bounds)
+
+
+class OutlierBounds:
+    """Bornes de prix au m² appliquées de façon vectorisée à chaque chunk"""
+
+    def __init__(self, group_bounds: dict, type_bounds: dict, global_bounds: tuple):
+        self.group_bounds = pd.DataFrame.from_dict(group_bounds, orient='index', columns=['low', 'high'])
+        if len(self.group_bounds):
+            self.group_bounds.index = pd.MultiIndex.from_tuples(self.group_bounds.index)
+        self.type_bounds = pd.DataFrame.from_dict(type_bounds, orient='index', columns=['low', 'high'])
+        self.global_bounds = global_bounds
+
+    def mask(self, df: pd.DataFrame, prices: pd.Series) -> pd.Series:
+        """Masque des lignes dont le prix au m² est dans les bornes de leur groupe"""
+        if len(self.group_bounds):
+            limits = self.group_bounds.reindex(_group_keys(df))
+        else:
+            limits = pd.DataFrame(np.nan, index=range(len(df)), columns=['low', 'high'])
+        limits = limits.to_numpy()
+
+        by_type = self.type_bounds.reindex(df['Type local'].astype(str)).to_numpy()
+        limits = np.where(np.isnan(limits), by_type, limits)
+        limits = np.where(np.isnan(limits), np.array(self.global_bounds), limits)
+
+        values = prices.to_numpy(dtype='float64')
+        return pd.Series((values >= limits[:, 0]) & (values <= limits[:, 1]), index=df.index)
@@ -0,0 +1,24 @@
+# utils/pagination.py
+import base64
+import binascii
+import json
+from datetime import date
+
+# En-tête portant le curseur de la page suivante
+NEXT_CURSOR_HEADER = 'X-Next-Cursor'
+
+
+def encode_cursor(date_mutation: date, row_id: int) -> str:
+    """Curseur opaque à partir de la clé (date_mutation, id) de la dernière ligne"""
+    payload = json.dumps([date_mutation.isoformat(), row_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """Clé (date_mutation, id) d'un curseur ; ValueError si le curseur est invalide"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        date_value, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        return date.fromisoformat(date_value), int(row_id)
+    except (binascii.Error, TypeError, ValueError) as e:
+        raise ValueError(f"Curseur invalide: {cursor}") from e
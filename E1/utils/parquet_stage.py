@@ -0,0 +1,162 @@
+# utils/parquet_stage.py
+import json
+import shutil
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+from sqlalchemy import Date, Float, Integer
+from config import Config
+from models import DVFTransaction
+from utils.bulk_loader import DVF_COLUMN_MAPPING
+from utils.data_loader import DVF_ARCHIVE_PATH, DVF_DTYPES, download_file, load_csv_safe, open_zip_member
+from utils.hashing import file_sha256
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Jeu de données Parquet partitionné par année de mutation et département
+STAGE_DIR = Config.DATA_DIR / 'dvf_parquet'
+STAGE_METADATA = '_stage.json'  # ignoré par pyarrow (préfixe "_")
+
+PARTITIONING = ds.partitioning(
+    pa.schema([('annee', pa.int16()), ('departement', pa.string())]),
+    flavor='hive'
+)
+
+# Colonnes calculées pendant le nettoyage, absentes du fichier source
+COMPUTED_COLUMNS = ['Prix m2']
+
+# Lecture typée de l'archive ; surfaces en float64 comme dans le stage
+STAGE_READ_DTYPES = {
+    column: 'float64' if dtype == 'float32' else dtype
+    for column, dtype in DVF_DTYPES.items()
+}
+
+
+def _arrow_type(column_type):
+    """Type Arrow correspondant au type SQLAlchemy de la colonne"""
+    if isinstance(column_type, Float):
+        return pa.float64()
+    if isinstance(column_type, Integer):
+        return pa.int64()
+    if isinstance(column_type, Date):
+        return pa.date32()
+    return pa.string()
+
+
+def stage_schema() -> pa.Schema:
+    """Schéma du stage, dérivé de la correspondance DVF -> dvf_transactions"""
+    table = DVFTransaction.__table__
+    fields = [
+        pa.field(source, _arrow_type(table.c[column_name].type))
+        for source, column_name in DVF_COLUMN_MAPPING.items()
+        if source not in COMPUTED_COLUMNS
+    ]
+    return pa.schema(fields + list(PARTITIONING.schema))
+
+
+def _typed_chunk(df: pd.DataFrame, schema: pa.Schema) -> pa.RecordBatch:
+    """Aligne un chunk lu avec DVF_DTYPES sur le schéma du stage"""
+    frame = pd.DataFrame(index=df.index)
+
+    for field in schema:
+        if field.name in ('annee', 'departement'):
+            continue
+        values = df[field.name] if field.name in df else pd.Series(None, index=df.index, dtype=object)
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            values = values.astype(object)
+
+        if pa.types.is_date32(field.type):
+            frame[field.name] = pd.to_datetime(values, format='%d/%m/%Y', errors='coerce')
+        elif pa.types.is_floating(field.type) or pa.types.is_integer(field.type):
+            # Colonnes hors DVF_DTYPES : encore en texte, décimale française
+            if not pd.api.types.is_numeric_dtype(values):
+                values = pd.to_numeric(values.str.replace(',', '.', regex=False), errors='coerce')
+            frame[field.name] = values.round().astype('Int64') if pa.types.is_integer(field.type) \
+                else values.astype('float64')
+        else:
+            frame[field.name] = values
+
+    frame['annee'] = frame['Date mutation'].dt.year.astype('Int16')
+    frame['departement'] = frame['Code departement']
+
+    return pa.RecordBatch.from_pandas(frame, schema=schema, preserve_index=False)
+
+
+def _read_stage_metadata() -> dict:
+    try:
+        return json.loads((STAGE_DIR / STAGE_METADATA).read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+def build_stage(zip_path, chunksize: int = 100000, logger_cron=None) -> bool:
+    """Convertit une fois l'archive DVF en jeu Parquet partitionné
+
+    Le stage est conservé tant que le hash de l'archive ne change pas.
+    Retourne True si le stage a été (re)construit.
+    """
+    if not logger_cron:
+        logger_cron = logger
+
+    archive_hash = file_sha256(zip_path)
+    if _read_stage_metadata().get('archive_sha256') == archive_hash:
+        logger_cron.info("Stage Parquet DVF à jour")
+        return False
+
+    logger_cron.info("Construction du stage Parquet DVF...")
+    schema = stage_schema()
+    tmp_dir = STAGE_DIR.with_name(STAGE_DIR.name + '.tmp')
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    with open_zip_member(zip_path) as stream:
+        chunks = load_csv_safe(stream, chunksize=chunksize, sep='|', decimal=',', dtype=STAGE_READ_DTYPES,
+                               engine='pyarrow')
+        batches = (_typed_chunk(chunk, schema) for chunk in chunks)
+
+        ds.write_dataset(
+            batches, tmp_dir, schema=schema, format='parquet',
+            partitioning=PARTITIONING, max_rows_per_group=chunksize,
+            existing_data_behavior='overwrite_or_ignore'
+        )
+
+    (tmp_dir / STAGE_METADATA).write_text(json.dumps({'archive_sha256': archive_hash}))
+
+    # Remplacement du stage précédent
+    shutil.rmtree(STAGE_DIR, ignore_errors=True)
+    tmp_dir.rename(STAGE_DIR)
+    logger_cron.info("Stage Parquet DVF construit")
+    return True
+
+
+def iter_stage(columns: list = None, years: list = None, departements: list = None,
+               batch_size: int = 100000):
+    """Lit le stage par lots, en ne chargeant que les colonnes et partitions demandées"""
+    dataset = ds.dataset(STAGE_DIR, format='parquet', partitioning=PARTITIONING)
+
+    filter_expression = None
+    if years:
+        filter_expression = ds.field('annee').isin(years)
+    if departements:
+        departement_filter = ds.field('departement').isin([str(d) for d in departements])
+        filter_expression = departement_filter if filter_expression is None \
+            else filter_expression & departement_filter
+
+    for batch in dataset.to_batches(columns=columns, filter=filter_expression, batch_size=batch_size):
+        if batch.num_rows:
+            yield batch.to_pandas(date_as_object=False)
+
+
+def prepare_dvf_stage(url, logger_cron=None) -> str:
+    """Télécharge l'archive DVF si besoin et met le stage à jour"""
+    zip_path = download_file(url, str(DVF_ARCHIVE_PATH))
+    build_stage(zip_path, logger_cron=logger_cron)
+    return zip_path
+
+
+def load_dvf_data_staged(url, chunksize=10000, logger_cron=None, **filters):
+    """Traite les données DVF en streaming depuis le stage Parquet"""
+    prepare_dvf_stage(url, logger_cron=logger_cron)
+
+    for chunk in iter_stage(batch_size=chunksize, **filters):
+        yield chunk
@@ -0,0 +1,180 @@
+# utils/partitioning.py
+"""Partitionnement de dvf_transactions par année de mutation (et département)
+
+Usage : python -m utils.partitioning list
+        python -m utils.partitioning create 2024
+        python -m utils.partitioning detach 2019    # la table reste, hors de dvf_transactions
+        python -m utils.partitioning attach 2019 [--table dvf_transactions_y2019]
+        python -m utils.partitioning drop 2019      # avant une réimport complète de l'année
+"""
+import argparse
+from sqlalchemy import text
+from config import Config
+
+PARENT_TABLE = 'dvf_transactions'
+
+# Colonnes de partitionnement selon le mode (membres de la clé primaire)
+PARTITION_MODES = {
+    '': [],
+    'year': ['date_mutation'],
+    'year_departement': ['date_mutation', 'code_departement'],
+}
+
+if Config.DVF_PARTITIONING not in PARTITION_MODES:
+    raise ValueError(f"DVF_PARTITIONING invalide: {Config.DVF_PARTITIONING} "
+                     f"(valeurs possibles: {', '.join(repr(mode) for mode in PARTITION_MODES)})")
+
+PARTITION_COLUMNS = PARTITION_MODES[Config.DVF_PARTITIONING]
+
+# Années dont la partition existe déjà (cache par processus)
+_known_years = set()
+
+
+def partition_by() -> str:
+    """Clause PARTITION BY de la table parente"""
+    return 'RANGE (date_mutation)'
+
+
+def partition_name(year: int) -> str:
+    return f"{PARENT_TABLE}_y{year}"
+
+
+def _bounds(year: int) -> str:
+    return f"FROM ('{year}-01-01') TO ('{year + 1}-01-01')"
+
+
+def _year_ddl(table_name: str, year: int = None) -> list:
+    """DDL d'une table annuelle (partition attachée si `year` est donné)"""
+    if year is not None:
+        statement = f"CREATE TABLE IF NOT EXISTS {table_name} PARTITION OF {PARENT_TABLE} FOR VALUES {_bounds(year)}"
+    else:
+        statement = f"CREATE TABLE IF NOT EXISTS {table_name} (LIKE {PARENT_TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+
+    if 'code_departement' not in PARTITION_COLUMNS:
+        return [statement]
+
+    # Sous-partitions par hash du département (codes avec ou sans zéro initial)
+    modulus = Config.DVF_DEPARTEMENT_PARTITIONS
+    return [f"{statement} PARTITION BY HASH (code_departement)"] + [
+        f"CREATE TABLE IF NOT EXISTS {table_name}_h{remainder} PARTITION OF {table_name} "
+        f"FOR VALUES WITH (MODULUS {modulus}, REMAINDER {remainder})"
+        for remainder in range(modulus)
+    ]
+
+
+def is_partitioned(connection) -> bool:
+    """True si dvf_transactions existe en tant que table partitionnée"""
+    return bool(connection.execute(text("""
+        SELECT 1 FROM pg_partitioned_table p
+        JOIN pg_class c ON c.oid = p.partrelid
+        WHERE c.relname = :table
+    """), {'table': PARENT_TABLE}).scalar())
+
+
+def list_partitions(connection) -> list:
+    """Partitions annuelles attachées : (nom, bornes)"""
+    result = connection.execute(text("""
+        SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_class p ON p.oid = i.inhparent
+        WHERE p.relname = :table
+        ORDER BY c.relname
+    """), {'table': PARENT_TABLE})
+    return [tuple(row) for row in result]
+
+
+def create_year_partition(connection, year: int) -> None:
+    """Crée la partition d'une année (et ses sous-partitions) si besoin"""
+    for statement in _year_ddl(partition_name(year), year):
+        connection.execute(text(statement))
+
+
+def ensure_partitions(connection, years) -> None:
+    """Crée les partitions manquantes avant une écriture
+
+    Un verrou consultatif sérialise les créations entre writers concurrents.
+    """
+    missing = sorted(set(int(year) for year in years) - _known_years)
+    if not PARTITION_COLUMNS or not missing:
+        return
+
+    connection.execute(text("SELECT pg_advisory_xact_lock(hashtext(:table))"), {'table': PARENT_TABLE})
+    for year in missing:
+        create_year_partition(connection, year)
+    _known_years.update(missing)
+
+
+def detach_year(connection, year: int) -> str:
+    """Détache la partition d'une année ; ses données restent dans la table retournée"""
+    table_name = partition_name(year)
+    connection.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {table_name}"))
+    _known_years.discard(year)
+    return table_name
+
+
+def attach_year(connection, year: int, table_name: str = None) -> str:
+    """Attache une table (ex. année détachée ou rechargée à part) comme partition
+
+    Une contrainte CHECK sur les bornes évite le parcours de validation.
+    """
+    table_name = table_name or partition_name(year)
+    constraint = f"{table_name}_bounds"
+    connection.execute(text(f"""
+        ALTER TABLE {table_name} ADD CONSTRAINT {constraint}
+        CHECK (date_mutation >= DATE '{year}-01-01' AND date_mutation < DATE '{year + 1}-01-01')
+    """))
+    connection.execute(text(f"ALTER TABLE {PARENT_TABLE} ATTACH PARTITION {table_name} FOR VALUES {_bounds(year)}"))
+    connection.execute(text(f"ALTER TABLE {table_name} DROP CONSTRAINT {constraint}"))
+    _known_years.add(year)
+    return table_name
+
+
+def drop_year(connection, year: int) -> None:
+    """Supprime une année entière (bien moins coûteux qu'un DELETE)"""
+    detach_year(connection, year)
+    connection.execute(text(f"DROP TABLE {partition_name(year)}"))
+
+
+def create_year_table(connection, table_name: str) -> None:
+    """Crée une table annuelle détachée, à charger puis attacher avec attach_year"""
+    for statement in _year_ddl(table_name):
+        connection.execute(text(statement))
+
+
+def main():
+    from database import bulk_engine
+
+    parser = argparse.ArgumentParser(description="Gestion des partitions de dvf_transactions")
+    parser.add_argument('action', choices=['list', 'create', 'detach', 'attach', 'drop'])
+    parser.add_argument('year', type=int, nargs='?')
+    parser.add_argument('--table', help="Table à attacher (par défaut la partition de l'année)")
+    args = parser.parse_args()
+
+    if args.action != 'list' and args.year is None:
+        parser.error("année requise")
+
+    with bulk_engine.connect() as connection:
+        if not is_partitioned(connection):
+            print(f"❌ {PARENT_TABLE} n'est pas partitionnée (voir DVF_PARTITIONING)")
+            return
+
+        if args.action == 'list':
+            for name, bounds in list_partitions(connection):
+                print(f"   - {name}: {bounds}")
+        elif args.action == 'create':
+            create_year_partition(connection, args.year)
+        elif args.action == 'detach':
+            print(f"📦 Table détachée: {detach_year(connection, args.year)}")
+        elif args.action == 'attach':
+            attach_year(connection, args.year, args.table)
+        elif args.action == 'drop':
+            drop_year(connection, args.year)
+
+        connection.commit()
+        if args.action != 'list':
+            print(f"✅ {args.action} {args.year} terminé")
+
+
+if __name__ == '__main__':
+    main()
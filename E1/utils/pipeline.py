@@ -0,0 +1,171 @@
+# utils/pipeline.py
+import multiprocessing as mp
+import queue
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+from utils.bulk_loader import DVF_CONFLICT_COLUMNS, prepare_dvf_rows, write_dvf_rows
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+STAT_KEYS = ['rows', 'inserted', 'updated', 'skipped', 'duplicates', 'missing_partition_key']
+
+# Paramètres du processus de nettoyage (fixés une fois par worker)
+_clean_func = None
+_bounds = None
+_nb_writers = 1
+
+
+def _init_cleaner(clean_func, bounds, nb_writers):
+    global _clean_func, _bounds, _nb_writers
+    _clean_func, _bounds, _nb_writers = clean_func, bounds, nb_writers
+
+
+def _clean_and_split(df: pd.DataFrame) -> list:
+    """Nettoie un chunk, le prépare et le répartit entre les writers
+
+    Une mutation est toujours envoyée au même writer (clé modulo N), ce qui
+    évite que deux connexions upsertent la même ligne en même temps.
+    """
+    frame = prepare_dvf_rows(_clean_func(df, _bounds))
+    if _nb_writers == 1:
+        return [frame]
+
+    slot = frame[DVF_CONFLICT_COLUMNS[0]].map(lambda key: int(key, 16) % _nb_writers)
+    return [frame[slot == writer] for writer in range(_nb_writers)]
+
+
+def _writer(inbox: mp.Queue, results: mp.Queue) -> None:
+    """Processus d'écriture : une connexion dédiée, upserts en bloc"""
+    from database import BulkSessionLocal, bulk_engine
+
+    # Ne pas réutiliser les connexions héritées du processus parent
+    bulk_engine.dispose(close=False)
+    db = BulkSessionLocal()
+    totals = dict.fromkeys(STAT_KEYS, 0)
+
+    try:
+        while True:
+            frame = inbox.get()
+            if frame is None:
+                break
+            if frame.empty:
+                continue
+            stats = write_dvf_rows(db, frame)
+            for key in STAT_KEYS:
+                totals[key] += stats[key]
+            results.put(('chunk', stats))
+        results.put(('done', totals))
+    except Exception as e:
+        results.put(('error', str(e)))
+    finally:
+        db.close()
+
+
+class IngestionPipeline:
+    """Pipeline lecture -> nettoyage (pool de processus) -> écriture (N writers)
+
+    Les étapes sont reliées par des files bornées : le lecteur attend quand
+    les cleaners ou les writers sont saturés.
+    """
+
+    def __init__(self, clean_func, bounds=None, workers: int = 2, writers: int = 2,
+                 queue_size: int = 4, logger_cron=None):
+        self.clean_func = clean_func
+        self.bounds = bounds
+        self.workers = max(1, workers)
+        self.writers = max(1, writers)
+        self.queue_size = max(1, queue_size)
+        self.logger = logger_cron or logger
+        self.finished_writers = 0
+
+    def _report(self, results: mp.Queue, totals: dict, block: bool = False) -> bool:
+        """Traite un message des writers ; retourne True pour un writer terminé
+
+        Les writers terminés sont comptés dans `finished_writers`, quel que
+        soit l'appelant (boucle principale ou envoi bloquant).
+        """
+        try:
+            kind, payload = results.get(timeout=1) if block else results.get_nowait()
+        except queue.Empty:
+            return False
+
+        if kind == 'error':
+            raise RuntimeError(f"Erreur d'un writer DVF: {payload}")
+        if kind == 'chunk':
+            self.logger.info(
+                f"Traitement en cours: {payload['rows']} transactions "
+                f"({payload['inserted']} insérées, {payload['updated']} mises à jour, "
+                f"{payload['skipped']} inchangées, {payload['duplicates']} doublons, "
+                f"{payload['missing_partition_key']} sans partition, {payload['rows_per_second']:.0f} lignes/s)"
+            )
+            return False
+        for key in STAT_KEYS:
+            totals[key] += payload[key]
+        self.finished_writers += 1
+        return True
+
+    def _put(self, inbox: mp.Queue, frame, process, results: mp.Queue, totals: dict) -> None:
+        """Envoi bloquant vers le writer `process`, en traitant ses messages et ceux des autres"""
+        while True:
+            try:
+                inbox.put(frame, timeout=1)
+                return
+            except queue.Full:
+                self._report(results, totals)
+                if not process.is_alive():
+                    raise RuntimeError("Un writer DVF s'est arrêté prématurément")
+
+    def run(self, chunks) -> dict:
+        """Exécute le pipeline sur un itérable de chunks et retourne les compteurs"""
+        totals = dict.fromkeys(STAT_KEYS, 0)
+        self.finished_writers = 0
+        context = mp.get_context()
+        results = context.Queue()
+        inboxes = [context.Queue(maxsize=self.queue_size) for _ in range(self.writers)]
+        processes = [
+            context.Process(target=_writer, args=(inbox, results), daemon=True)
+            for inbox in inboxes
+        ]
+        for process in processes:
+            process.start()
+
+        try:
+            with ProcessPoolExecutor(
+                max_workers=self.workers, initializer=_init_cleaner,
+                initargs=(self.clean_func, self.bounds, self.writers)
+            ) as executor:
+                pending = deque()
+
+                def dispatch(future):
+                    for inbox, process, frame in zip(inboxes, processes, future.result()):
+                        self._put(inbox, frame, process, results, totals)
+
+                for df in chunks:
+                    pending.append(executor.submit(_clean_and_split, df))
+                    # Au plus `workers + queue_size` chunks en cours de nettoyage
+                    if len(pending) >= self.workers + self.queue_size:
+                        dispatch(pending.popleft())
+                    self._report(results, totals)
+
+                while pending:
+                    dispatch(pending.popleft())
+
+            for inbox, process in zip(inboxes, processes):
+                self._put(inbox, None, process, results, totals)
+
+            while self.finished_writers < len(processes):
+                if not self._report(results, totals, block=True) \
+                        and not any(process.is_alive() for process in processes) and results.empty():
+                    raise RuntimeError("Les writers DVF se sont arrêtés sans rapport")
+        finally:
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
+                process.join()
+            # Les chunks non lus par un writer arrêté ne doivent pas bloquer la sortie
+            for inbox in inboxes:
+                inbox.cancel_join_thread()
+
+        return totals
@@ -0,0 +1,79 @@
+# utils/pool_metrics.py
+import threading
+import time
+from collections import deque
+from sqlalchemy import exc
+from sqlalchemy.pool import QueuePool
+
+
+class PoolMetrics:
+    """Temps d'attente au checkout d'un pool de connexions (échantillons récents)"""
+
+    def __init__(self, samples: int = 1000):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self._recent = deque(maxlen=samples)
+        self._lock = threading.Lock()
+
+    def record(self, wait_ms: float, timed_out: bool = False) -> None:
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+                self.total_ms += wait_ms
+            self.max_ms = max(self.max_ms, wait_ms)
+            self._recent.append(wait_ms)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            recent = sorted(self._recent)
+            checkouts, timeouts, total_ms, max_ms = self.checkouts, self.timeouts, self.total_ms, self.max_ms
+
+        def percentile(rank: float):
+            return round(recent[min(len(recent) - 1, int(len(recent) * rank))], 3) if recent else None
+
+        return {
+            'checkouts': checkouts,
+            'timeouts': timeouts,
+            'wait_ms_avg': round(total_ms / checkouts, 3) if checkouts else None,
+            'wait_ms_max': round(max_ms, 3),
+            'wait_ms_p50': percentile(0.50),
+            'wait_ms_p95': percentile(0.95),
+            'wait_ms_p99': percentile(0.99),
+        }
+
+
+class TimedPoolMixin:
+    """Mesure l'attente de chaque checkout (connexion libre ou ouverture d'une nouvelle)"""
+
+    metrics: PoolMetrics = None
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            self.metrics.record((time.perf_counter() - start) * 1000, timed_out=True)
+            raise
+        self.metrics.record((time.perf_counter() - start) * 1000)
+        return connection
+
+
+def timed_pool_class(pool_class, metrics: PoolMetrics):
+    """Classe de pool instrumentée ; conservée par engine.dispose() (recreate)"""
+    return type(f"Timed{pool_class.__name__}", (TimedPoolMixin, pool_class), {'metrics': metrics})
+
+
+def pool_status(pool) -> dict:
+    """Occupation courante d'un pool à file (QueuePool et variantes)"""
+    if not isinstance(pool, QueuePool):
+        return {}
+    return {
+        'pool_size': pool.size(),
+        'checked_out': pool.checkedout(),
+        'overflow': max(pool.overflow(), 0),
+        'idle': pool.checkedin(),
+    }
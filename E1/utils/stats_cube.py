@@ -0,0 +1,126 @@
+# utils/stats_cube.py
+
+# Plafonds de budget du cube commune_stats_cube : un budget égal à un plafond
+# est servi par le cube, les autres par une requête directe sur les ventes
+BUDGET_CAPS = [
+    25000, 50000, 75000, 100000, 125000, 150000, 175000, 200000, 250000, 300000,
+    350000, 400000, 500000, 600000, 750000, 1000000, 1500000, 2000000, 5000000
+]
+
+# Nombre minimal de ventes pour qu'une commune figure dans le cube
+CUBE_MIN_TRANSACTIONS = 5
+
+# Statistiques par commune lues dans le cube, pour un plafond
+CUBE_COMMUNE_STATS_SQL = """
+    SELECT cs.code_insee, cs.prix_m2_moyen, cs.nb_transactions,
+           cs.prix_median, cs.prix_m2_median, cs.budget_max
+    FROM commune_stats_cube cs
+    WHERE cs.type_local = :type_local
+    AND cs.budget_max = :budget_palier
+    AND cs.nb_transactions >= :min_transactions
+"""
+
+# Mêmes statistiques calculées sur les ventes, pour un budget quelconque
+LIVE_COMMUNE_STATS_SQL = """
+    SELECT
+        t.code_insee,
+        AVG(t.prix_m2) AS prix_m2_moyen,
+        COUNT(*) AS nb_transactions,
+        PERCENTILE_CONT(0.5) WITHIN GROUP (ORDER BY t.valeur_fonciere) AS prix_median,
+        PERCENTILE_CONT(0.5) WITHIN GROUP (ORDER BY t.prix_m2) AS prix_m2_median,
+        CAST(NULL AS double precision) AS budget_max
+    FROM dvf_transactions t
+    WHERE t.type_local = :type_local
+    AND t.valeur_fonciere > 0
+    AND t.valeur_fonciere <= :budget_max
+    AND t.surface_reelle_bati > 0
+    AND t.code_insee IS NOT NULL
+    GROUP BY t.code_insee
+    HAVING COUNT(*) >= :min_transactions
+"""
+
+
+def budget_cap(budget_max: float):
+    """Plafond du cube égal au budget, None sinon (requête directe)
+
+    Un budget entre deux plafonds n'est pas arrondi : les statistiques
+    servies portent toujours exactement sur les ventes <= budget.
+    """
+    return int(budget_max) if budget_max in BUDGET_CAPS else None
+
+
+def commune_stats_cube_sql(caps: list = BUDGET_CAPS) -> str:
+    """Reconstruction du cube en une passe, sans dupliquer les ventes par plafond
+
+    Chaque vente reçoit l'indice du plus petit plafond qui la couvre ; les
+    ventes sous le plafond k sont celles d'indice <= k. Par (commune, type) :
+    - effectifs et moyennes par agrégats filtrés ;
+    - médiane des prix : les ventes sous un plafond sont un préfixe de l'ordre
+      des prix, la médiane est lue aux rangs (n+1)/2 et (n+2)/2 ;
+    - médiane du prix au m² : rang cumulé, par plafond, dans l'ordre des prix
+      au m² (COUNT ... FILTER en fenêtre), lu aux mêmes positions parmi les
+      m ventes dont le prix au m² est connu.
+    Les médianes sont exactes (même résultat que PERCENTILE_CONT(0.5)).
+    """
+    levels = range(1, len(caps) + 1)
+    palier = '\n'.join(f"WHEN t.valeur_fonciere <= {cap} THEN {level}" for level, cap in zip(levels, caps))
+    counts = ',\n'.join(
+        f"COUNT(*) FILTER (WHERE palier <= {k}) AS n_{k}, COUNT(prix_m2) FILTER (WHERE palier <= {k}) AS m_{k}"
+        for k in levels
+    )
+    count_columns = ', '.join(f"c.n_{k}, c.m_{k}" for k in levels)
+    ranks = ',\n'.join(f"COUNT(*) FILTER (WHERE s.palier <= {k}) OVER m2 AS rang_m2_{k}" for k in levels)
+    aggregates = ',\n'.join(
+        f"MAX(n_{k}) AS n_{k}, MAX(m_{k}) AS m_{k}, "
+        f"AVG(prix_m2) FILTER (WHERE palier <= {k}) AS moyenne_m2_{k}, "
+        f"AVG(valeur_fonciere) FILTER (WHERE rang_valeur IN ((n_{k} + 1) / 2, (n_{k} + 2) / 2)) AS mediane_{k}, "
+        f"AVG(prix_m2) FILTER (WHERE palier <= {k} AND rang_m2_{k} IN ((m_{k} + 1) / 2, (m_{k} + 2) / 2)) AS mediane_m2_{k}"
+        for k in levels
+    )
+    per_cap = ',\n'.join(
+        f"({cap}, g.n_{k}, g.moyenne_m2_{k}, g.mediane_{k}, g.mediane_m2_{k})" for k, cap in zip(levels, caps)
+    )
+
+    return f"""
+        WITH sales AS (
+            SELECT
+                t.code_insee, t.type_local, t.valeur_fonciere, t.prix_m2,
+                CASE {palier} END AS palier
+            FROM dvf_transactions t
+            WHERE t.surface_reelle_bati > 0
+              AND t.valeur_fonciere > 0
+              AND t.valeur_fonciere <= {caps[-1]}
+              AND t.type_local IS NOT NULL
+              AND t.code_insee IS NOT NULL
+        ),
+        counts AS (
+            -- Ventes sous chaque plafond ; moins de :min_transactions au total : aucun plafond retenu
+            SELECT code_insee, type_local, {counts}
+            FROM sales
+            GROUP BY code_insee, type_local
+            HAVING COUNT(*) >= :min_transactions
+        ),
+        ranked AS (
+            SELECT
+                s.*, {count_columns},
+                ROW_NUMBER() OVER (PARTITION BY s.code_insee, s.type_local ORDER BY s.valeur_fonciere) AS rang_valeur,
+                {ranks}
+            FROM sales s
+            JOIN counts c USING (code_insee, type_local)
+            WINDOW m2 AS (PARTITION BY s.code_insee, s.type_local ORDER BY s.prix_m2 NULLS LAST
+                          ROWS BETWEEN UNBOUNDED PRECEDING AND CURRENT ROW)
+        ),
+        grouped AS (
+            SELECT code_insee, type_local, {aggregates}
+            FROM ranked
+            GROUP BY code_insee, type_local
+        )
+        INSERT INTO commune_stats_cube (
+            code_insee, type_local, budget_max, nb_transactions,
+            prix_m2_moyen, prix_median, prix_m2_median, created_at
+        )
+        SELECT g.code_insee, g.type_local, v.budget_max, v.nb, v.prix_m2_moyen, v.prix_median, v.prix_m2_median, now()
+        FROM grouped g
+        CROSS JOIN LATERAL (VALUES {per_cap}) AS v(budget_max, nb, prix_m2_moyen, prix_median, prix_m2_median)
+        WHERE v.nb >= :min_transactions
+    """